@@ -16,6 +16,115 @@ class Settings(BaseSettings):
     # Timer entre requests
     REQUEST_DELAY: int = 3
 
+    # Cola diferida de actualizar_precio (batch)
+    PRECIOS_CONCURRENCIA: int = 4
+    PRECIOS_DRENAJE_TIMEOUT: float = 300.0
+
+    # Pool HTTP AVAX (cliente compartido, se abre/cierra en el lifespan)
+    AVAX_TIMEOUT: float = 30.0
+    AVAX_MAX_CONNECTIONS: int = 20
+    AVAX_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    AVAX_KEEPALIVE_EXPIRY: float = 30.0
+    AVAX_HTTP2: bool = False
+
+    # Pool HTTP ZAP
+    ZAP_TIMEOUT: float = 60.0
+    ZAP_MAX_CONNECTIONS: int = 4
+    ZAP_MAX_KEEPALIVE_CONNECTIONS: int = 2
+    ZAP_KEEPALIVE_EXPIRY: float = 30.0
+    ZAP_HTTP2: bool = False
+
+    # Limitador adaptativo (AIMD) de llamadas a AVAX, en req/s
+    AVAX_RATE_LECTURA_INICIAL: float = 10.0
+    AVAX_RATE_LECTURA_MAX: float = 50.0
+    AVAX_RATE_ESCRITURA_INICIAL: float = 5.0
+    AVAX_RATE_ESCRITURA_MAX: float = 20.0
+    AVAX_RATE_MIN: float = 0.5
+    AVAX_RATE_RAFAGA: int = 5
+    AVAX_RATE_INCREMENTO: float = 1.0
+    AVAX_RATE_FACTOR_REDUCCION: float = 0.5
+    AVAX_LATENCIA_OBJETIVO: float = 2.0
+
+    # Reintentos (solo llamadas idempotentes) y circuit breakers por upstream
+    AVAX_REINTENTOS: int = 3
+    AVAX_DEADLINE: float = 60.0
+    ZAP_REINTENTOS: int = 2
+    ZAP_DEADLINE: float = 180.0
+    REINTENTO_BACKOFF_BASE: float = 0.5
+    REINTENTO_BACKOFF_MAX: float = 10.0
+    CIRCUITO_UMBRAL_FALLAS: int = 5
+    CIRCUITO_APERTURA: float = 30.0
+
+    # Cache de productos AVAX (segundos, 0 = desactivado)
+    AVAX_CACHE_TTL: int = 300
+    AVAX_CACHE_TTL_404: int = 60
+    AVAX_CACHE_MAX: int = 20000
+
+    # Cache del churn de ZAP (segundos, 0 = desactivado)
+    ZAP_CHURN_CACHE_TTL: int = 900
+    # Parsear aging_products en streaming (solo campos usados por las reglas)
+    ZAP_CHURN_STREAMING: bool = True
+
+    # Procesamiento batch: SKUs procesados en paralelo. Solo rige con
+    # PIPELINE_ACTIVO=false y al ejecutar un plan (el pipeline usa sus workers).
+    BATCH_CONCURRENCIA: int = 8
+
+    # Pipeline batch: lectura AVAX -> evaluacion -> escritura AVAX, cada etapa
+    # con sus workers y una cola acotada (False = un SKU completo por tarea)
+    PIPELINE_ACTIVO: bool = True
+    PIPELINE_LECTORES: int = 8
+    PIPELINE_EVALUADORES: int = 1
+    PIPELINE_ESCRITORES: int = 4
+    PIPELINE_COLA: int = 32
+    # Con al menos tantos SKUs esperando evaluacion se evaluan juntos con
+    # numpy (descuento_vectorizado); por debajo de ~200 el escalar es mas
+    # rapido. Solo se alcanza con PIPELINE_COLA >= este valor.
+    PIPELINE_LOTE_VECTORIZADO: int = 256
+
+    # ConfiguracionGeneral persistida (compartida por todos los workers)
+    CONFIG_PATH: str = "data/configuracion.json"
+
+    # Coordinacion entre workers (locks en archivos locales)
+    LOCKS_DIR: str = "data/locks"
+    LIDER_REINTENTO_SEGUNDOS: float = 30.0
+    SKU_LOCK_TIMEOUT: float = 30.0
+
+    # Logging estructurado (JSON por defecto)
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    # Fraccion de SKUs cuyos logs por SKU (bajo ERROR) se escriben
+    LOG_MUESTREO_SKU: float = 0.05
+    # Cada cuanto se loguea el progreso de una corrida batch
+    LOG_PROGRESO_SEGUNDOS: float = 30.0
+
+    # Descartar con datos de ZAP antes de leer AVAX
+    PREFILTRO_ZAP_ACTIVO: bool = True
+
+    # Planes (modo plan / dry-run): los ultimos PLANES_MAX, en memoria y en
+    # SQLite para que cualquier worker los pueda consultar y ejecutar
+    PLANES_MAX: int = 20
+    PLANES_PATH: str = "data/planes.sqlite3"
+
+    # Corridas en segundo plano: cuantas se guardan para consulta
+    EJECUCIONES_HISTORIAL: int = 20
+    # Detalles por SKU de cada corrida (NDJSON en disco, paginables)
+    RESULTADOS_DIR: str = "data/resultados"
+    RESULTADOS_RETENCION_HORAS: float = 48
+
+    # Bitacora de corridas (para retomar tras un reinicio)
+    JOURNAL_PATH: str = "data/journal.sqlite3"
+    JOURNAL_RETENCION_DIAS: int = 7
+    # SKUs terminados se escriben en lotes (por tamano o cada N segundos)
+    JOURNAL_LOTE: int = 500
+    JOURNAL_INTERVALO_SEGUNDOS: float = 1.0
+    APAGADO_DRENAJE_TIMEOUT: float = 30.0
+
+    # Historial de resultados por SKU (consultable por SKU, status, corrida y fecha)
+    HISTORIAL_PATH: str = "data/historial.sqlite3"
+    HISTORIAL_RETENCION_DIAS: int = 30
+    HISTORIAL_LOTE: int = 500
+    HISTORIAL_INTERVALO_SEGUNDOS: float = 2.0
+
     # Scheduler
     SCHEDULER_HOUR: int = 5
     SCHEDULER_MINUTE: int = 0
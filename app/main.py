@@ -1,18 +1,41 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
 
 from app.routes.descuento_auto_routes import router as descuento_router
-from app.scheduler.jobs import scheduler, setup_scheduler
+from app.config import get_settings
+from app.scheduler.jobs import gestor_ejecuciones, iniciar_scheduler, scheduler
+from app.services.avax_client import avax_client
+from app.services.coordinacion import eleccion_lider
+from app.services.historial import historial_resultados
+from app.services.journal import journal_ejecuciones
+from app.services.logs import configurar_logging, detener_logging
+from app.services.metricas import marcar_proceso_terminado
+from app.services.zap_client import zap_client
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    setup_scheduler()
-    scheduler.start()
-    print("Gaaa")
+    configurar_logging()
+    await avax_client.iniciar()
+    await zap_client.iniciar()
+    # Solo el worker lider programa el job de las 5 AM.
+    await eleccion_lider.iniciar(iniciar_scheduler)
+    logger.info("Servicio iniciado")
     yield
-    scheduler.shutdown()
-    print("ZZzz")
+    if scheduler.running:
+        scheduler.shutdown()
+    await eleccion_lider.detener()
+    await gestor_ejecuciones.detener(get_settings().APAGADO_DRENAJE_TIMEOUT)
+    await historial_resultados.cerrar()
+    await journal_ejecuciones.cerrar()
+    await avax_client.cerrar()
+    await zap_client.cerrar()
+    marcar_proceso_terminado()
+    logger.info("Servicio detenido")
+    detener_logging()
 
 
 app = FastAPI(
@@ -28,7 +51,24 @@ app.include_router(descuento_router)
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check del servicio"""
-    return {"status": "ok", "scheduler_running": scheduler.running}
+    return {
+        "status": "ok",
+        "scheduler_running": scheduler.running,
+        "lider_scheduler": eleccion_lider.es_lider,
+        "circuitos": {
+            "avax": avax_client.circuito.stats(),
+            "zap": zap_client.circuito.stats(),
+        },
+    }
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Metricas en formato Prometheus"""
+    from prometheus_client import CONTENT_TYPE_LATEST
+    from app.services.metricas import exportar
+
+    return Response(exportar(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/", tags=["Health"])
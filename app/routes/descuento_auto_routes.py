@@ -1,34 +1,45 @@
-﻿import httpx
-from fastapi import APIRouter, HTTPException, Path, Query
-from typing import Optional
+﻿import asyncio
+import json
+import logging
+import uuid
+import httpx
+from datetime import date, datetime
+from fastapi import APIRouter, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Literal, Optional, Union
 from app.schemas.descuento_auto import (
     ConfiguracionGeneral,
     ConfiguracionPatch,
     EstadoLogica,
     ProcesarProductosRequest,
 )
+from app.schemas.ejecuciones import RespEjecucion, RespPaginaDetalles
+from app.schemas.historial import RegistroHistorial, RespAgregadosEjecucion
 from app.schemas.respuestas_descuento import (
     RespAplicado,
     RespErrorValidacion,
     RespExcluido,
     RespNoApto,
     RespNoEncontrado,
+    RespPlan,
+    RespPlanificado,
     RespProcesarProductos,
 )
 
+logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Entregables"])
 
-# Estado en memoria 
-configuracion_actual = ConfiguracionGeneral()
-
-
 @router.get(
     "/config/estado-logica",
     response_model=ConfiguracionGeneral,
     summary="Obtener configuración de umbrales"
 )
-async def get_configuracion():
-    return configuracion_actual
+async def get_configuracion(response: Response):
+    from app.services.config_store import config_store
+
+    snapshot = config_store.snapshot()
+    response.headers["X-Config-Version"] = str(snapshot.version)
+    return snapshot.configuracion
 
 
 @router.patch(
@@ -36,36 +47,179 @@ async def get_configuracion():
     response_model=ConfiguracionGeneral,
     summary="Modificar configuración de umbrales"
 )
-async def patch_configuracion(updates: ConfiguracionPatch):
-    global configuracion_actual
+async def patch_configuracion(updates: ConfiguracionPatch, response: Response):
+    from app.services.config_store import config_store
+
+    # Las corridas en curso siguen con la version que tomaron al iniciar.
+    snapshot = await asyncio.to_thread(config_store.actualizar, updates)
+    response.headers["X-Config-Version"] = str(snapshot.version)
+    return snapshot.configuracion
 
-    if updates.estado_logica_activo is not None:
-        configuracion_actual.estado_logica_activo = updates.estado_logica_activo
 
-    if updates.regular is not None:
-        configuracion_actual.regular = updates.regular
+@router.post(
+    "/ejecutar-proceso",
+    summary="Ejecutar proceso batch manualmente",
+    response_model=RespEjecucion | RespProcesarProductos,
+)
+async def ejecutar_proceso_manual(
+    response: Response,
+    modo_plan: bool = Query(
+        default=False,
+        description="Solo evaluar y devolver un plan, sin escribir en AVAX.",
+    ),
+    stream: bool = Query(
+        default=False,
+        description="Enviar cada resultado como NDJSON apenas este listo.",
+    ),
+    esperar: bool = Query(
+        default=False,
+        description="Esperar el resultado completo en vez de devolver el ID de la corrida.",
+    ),
+    si_hay_activa: Literal["unirse", "rechazar"] = Query(
+        default="unirse",
+        description=(
+            "Si ya hay una corrida escribiendo en AVAX: unirse a ella "
+            "(devuelve su progreso o su resultado) o responder 409."
+        ),
+    ),
+    solo_resumen: bool = Query(
+        default=False,
+        description=(
+            "Con esperar=true, devolver solo los contadores; los detalles se "
+            "consultan en /ejecuciones/{id}/detalles."
+        ),
+    ),
+):
+    from app.scheduler.ejecuciones import EjecucionEnCurso
+    from app.scheduler.jobs import gestor_ejecuciones
+
+    try:
+        if stream:
+            ejecucion, detalles = gestor_ejecuciones.transmitir("manual", modo_plan)
+            return respuesta_ndjson(
+                ejecucion.resultado,
+                detalles,
+                headers={"X-Ejecucion-Id": ejecucion.ejecucion_id},
+            )
+        ejecucion = gestor_ejecuciones.iniciar("manual", modo_plan)
+    except EjecucionEnCurso as e:
+        ejecucion = e.ejecucion
+        # No se puede unir: otro worker, se pidio rechazar o se pidio stream.
+        if ejecucion is None or si_hay_activa == "rechazar" or stream:
+            raise HTTPException(status_code=409, detail=str(e)) from e
+        response.headers["X-Ejecucion-Existente"] = ejecucion.ejecucion_id
 
-    if updates.liquidacion_todo_stock is not None:
-        configuracion_actual.liquidacion_todo_stock = updates.liquidacion_todo_stock
+    if esperar:
+        await asyncio.shield(ejecucion.tarea)
+        return respuesta_resultado(ejecucion, solo_resumen)
 
-    if updates.liquidacion_agresiva is not None:
-        configuracion_actual.liquidacion_agresiva = updates.liquidacion_agresiva
+    response.status_code = 202
+    return ejecucion.progreso()
 
-    if updates.liquidacion_suave is not None:
-        configuracion_actual.liquidacion_suave = updates.liquidacion_suave
 
-    return configuracion_actual
+@router.get(
+    "/ejecuciones",
+    summary="Ultimas corridas del proceso batch",
+    response_model=list[RespEjecucion],
+)
+async def listar_ejecuciones():
+    from app.scheduler.jobs import gestor_ejecuciones
 
+    return [ejecucion.progreso() for ejecucion in gestor_ejecuciones.listar()]
 
-@router.post(
-    "/ejecutar-proceso",
-    summary="Ejecutar proceso batch manualmente",
+
+@router.get(
+    "/ejecuciones/{ejecucion_id}",
+    summary="Progreso de una corrida",
+    response_model=RespEjecucion,
+)
+async def get_ejecucion(ejecucion_id: str):
+    return _obtener_ejecucion(ejecucion_id).progreso()
+
+
+@router.get(
+    "/ejecuciones/{ejecucion_id}/resultado",
+    summary="Resultado (parcial o final) de una corrida",
     response_model=RespProcesarProductos,
 )
-async def ejecutar_proceso_manual():
-    from app.scheduler.jobs import procesar_descuentos_automaticos
-    resultado = await procesar_descuentos_automaticos()
-    return resultado
+async def get_resultado_ejecucion(
+    ejecucion_id: str,
+    solo_resumen: bool = Query(
+        default=False,
+        description="Solo los contadores, sin detalle_resultados.",
+    ),
+):
+    return respuesta_resultado(_obtener_ejecucion(ejecucion_id), solo_resumen)
+
+
+@router.get(
+    "/ejecuciones/{ejecucion_id}/detalles",
+    summary="Detalles por SKU de una corrida, paginados",
+    response_model=RespPaginaDetalles,
+)
+async def get_detalles_ejecucion(
+    ejecucion_id: str,
+    status: Optional[str] = Query(
+        default=None,
+        description="Solo este status (aplicado, no_apto, planificado, error, ...).",
+    ),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="siguiente_cursor de la pagina anterior.",
+    ),
+    limite: int = Query(default=100, ge=1, le=1000),
+):
+    ejecucion = _obtener_ejecucion(ejecucion_id)
+    if ejecucion.resultados is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"La ejecucion {ejecucion_id} no guarda detalles paginables",
+        )
+    try:
+        desde = int(cursor) if cursor else 0
+    except ValueError:
+        desde = -1
+    if desde < 0:
+        raise HTTPException(status_code=400, detail=f"Cursor invalido: {cursor}")
+
+    lineas, siguiente = await ejecucion.resultados.pagina(status, desde, limite)
+    total = ejecucion.resultados.total(status)
+    # Mientras la corrida sigue activa pueden llegar mas detalles.
+    hay_mas = siguiente < total or ejecucion.activa
+    encabezado = json.dumps(
+        {
+            "ejecucion_id": ejecucion_id,
+            "status": status,
+            "total": total,
+            "siguiente_cursor": str(siguiente) if hay_mas else None,
+        }
+    )
+    # Las lineas ya son JSON de cada detalle: se insertan sin re-validar.
+    cuerpo = encabezado[:-1].encode() + b',"detalles":[' + b",".join(lineas) + b"]}"
+    return Response(cuerpo, media_type="application/json")
+
+
+@router.post(
+    "/ejecuciones/{ejecucion_id}/cancelar",
+    summary="Cancelar una corrida (los SKUs en vuelo terminan)",
+    response_model=RespEjecucion,
+)
+async def cancelar_ejecucion(ejecucion_id: str):
+    ejecucion = _obtener_ejecucion(ejecucion_id)
+    if ejecucion.activa:
+        ejecucion.cancelar()
+    return ejecucion.progreso()
+
+
+def _obtener_ejecucion(ejecucion_id: str):
+    from app.scheduler.jobs import gestor_ejecuciones
+
+    ejecucion = gestor_ejecuciones.obtener(ejecucion_id)
+    if ejecucion is None:
+        raise HTTPException(
+            status_code=404, detail=f"Ejecucion {ejecucion_id} no encontrada"
+        )
+    return ejecucion
 
 
 @router.post(
@@ -73,13 +227,53 @@ async def ejecutar_proceso_manual():
     summary="Procesar multiples productos",
     response_model=RespProcesarProductos,
 )
-async def procesar_productos(payload: ProcesarProductosRequest):
+async def procesar_productos(
+    payload: ProcesarProductosRequest,
+    response: Response,
+    modo_plan: bool = Query(
+        default=False,
+        description="Solo evaluar y devolver un plan, sin escribir en AVAX.",
+    ),
+    stream: bool = Query(
+        default=False,
+        description="Enviar cada resultado como NDJSON apenas este listo.",
+    ),
+    solo_resumen: bool = Query(
+        default=False,
+        description="Devolver solo los contadores, sin detalle_resultados.",
+    ),
+):
     from app.services.descuento_auto.descuento_auto import (
+        iterar_productos,
+        normalizar_codigos,
         procesar_productos as procesar_productos_service,
     )
 
+    # X-Ejecucion-Id: para consultar /historial/ejecuciones/{id}
     try:
-        return await procesar_productos_service(payload.productos, payload.estado)
+        if stream:
+            codigos = normalizar_codigos(payload.productos)
+            resultado = RespProcesarProductos(ejecucion_id=uuid.uuid4().hex)
+            return respuesta_ndjson(
+                resultado,
+                iterar_productos(
+                    resultado,
+                    codigos,
+                    payload.estado,
+                    modo_plan,
+                    guardar_detalle=False,
+                ),
+                headers={"X-Ejecucion-Id": resultado.ejecucion_id},
+            )
+
+        resultado = await procesar_productos_service(
+            payload.productos,
+            payload.estado,
+            modo_plan=modo_plan,
+            solo_resumen=solo_resumen,
+        )
+        response.headers["X-Ejecucion-Id"] = resultado.ejecucion_id
+        return resultado
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
@@ -87,19 +281,26 @@ async def procesar_productos(payload: ProcesarProductosRequest):
 @router.post(
     "/procesar/{cod_prod}",
     summary="Procesar un producto individual",
-    response_model=RespAplicado | RespNoApto | RespErrorValidacion | RespExcluido | RespNoEncontrado,
+    response_model=RespAplicado | RespPlanificado | RespNoApto | RespErrorValidacion | RespExcluido | RespNoEncontrado,
 )
 async def procesar_producto(
     cod_prod: str = Path(description="Código del producto (IF6463)"),
     estado: Optional[EstadoLogica] = Query(
         default=None,
         description="Estado logico a usar."
-    )
+    ),
+    modo_plan: bool = Query(
+        default=False,
+        description="Solo evaluar y devolver un plan, sin escribir en AVAX.",
+    ),
 ):
 
+    from app.services.coordinacion import RecursoOcupado
     from app.services.descuento_auto.descuento_auto import procesar_producto as procesar_producto_service
     try:
-        return await procesar_producto_service(cod_prod, estado)
+        return await procesar_producto_service(cod_prod, estado, modo_plan=modo_plan)
+    except RecursoOcupado as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
     except httpx.HTTPStatusError as e:
         raise HTTPException(
             status_code=e.response.status_code,
@@ -117,6 +318,236 @@ async def procesar_producto(
         ) from e
 
 
+@router.get(
+    "/planes/{plan_id}",
+    summary="Ver un plan de cambios",
+    response_model=RespPlan,
+)
+async def get_plan(plan_id: str):
+    from app.services.descuento_auto.descuento_plan import planes_store
+
+    plan = await planes_store.obtener(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=plan_no_encontrado(plan_id))
+    return plan.resumen()
+
+
+@router.post(
+    "/planes/{plan_id}/ejecutar",
+    summary="Ejecutar exactamente los cambios de un plan",
+    response_model=RespProcesarProductos,
+)
+async def ejecutar_plan(
+    plan_id: str,
+    solo_resumen: bool = Query(
+        default=False,
+        description=(
+            "Devolver solo los contadores; los detalles se consultan en "
+            "/ejecuciones/{plan_id}/detalles."
+        ),
+    ),
+):
+    from app.scheduler.ejecuciones import EjecucionEnCurso
+    from app.scheduler.jobs import gestor_ejecuciones
+    from app.services.descuento_auto.descuento_auto import iterar_plan
+    from app.services.descuento_auto.descuento_plan import planes_store
+
+    plan = await planes_store.obtener(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=plan_no_encontrado(plan_id))
+
+    # Escribe en AVAX: misma exclusion que el batch (corrida "plan" con el
+    # plan_id como ejecucion_id).
+    try:
+        gestor_ejecuciones.verificar_exclusion()
+        await planes_store.marcar_ejecutado(plan)
+        try:
+            ejecucion = gestor_ejecuciones.iniciar(
+                "plan", iterar=iterar_plan(plan), ejecucion_id=plan.plan_id
+            )
+        except EjecucionEnCurso:
+            await planes_store.marcar_ejecutado(plan, False)
+            raise
+    except (ValueError, EjecucionEnCurso) as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+
+    await asyncio.shield(ejecucion.tarea)
+    return respuesta_resultado(ejecucion, solo_resumen)
+
+
+@router.get(
+    "/historial/productos/{cod_prod}",
+    summary="Historial de resultados de un producto",
+    response_model=list[RegistroHistorial],
+)
+async def get_historial_producto(
+    cod_prod: str = Path(description="Código del producto (IF6463)"),
+    status: Optional[str] = Query(default=None, description="Solo este status."),
+    descuento_nuevo: Optional[str] = Query(
+        default=None,
+        description="Solo cambios a este descuento (ej. PUSH2).",
+    ),
+    limite: int = Query(default=50, ge=1, le=1000),
+):
+    from app.services.historial import historial_resultados
+
+    return await historial_resultados.historial_producto(
+        cod_prod, status=status, descuento_nuevo=descuento_nuevo, limite=limite
+    )
+
+
+@router.get(
+    "/historial/resultados",
+    summary="Resultados por status y rango de fechas",
+    response_model=list[RegistroHistorial],
+)
+async def get_historial_resultados(
+    status: Optional[str] = Query(default=None, description="Solo este status."),
+    desde: Union[datetime, date, None] = Query(
+        default=None, description="Fecha minima (incluida)."
+    ),
+    hasta: Union[datetime, date, None] = Query(
+        default=None, description="Fecha maxima (excluida)."
+    ),
+    limite: int = Query(default=100, ge=1, le=1000),
+):
+    from app.services.historial import historial_resultados
+
+    return await historial_resultados.buscar(
+        status=status, desde=desde, hasta=hasta, limite=limite
+    )
+
+
+@router.get(
+    "/historial/ejecuciones/{ejecucion_id}",
+    summary="Totales de una corrida (o plan ejecutado) guardados en el historial",
+    response_model=RespAgregadosEjecucion,
+)
+async def get_historial_ejecucion(ejecucion_id: str):
+    from app.services.historial import historial_resultados
+
+    agregados = await historial_resultados.agregados_ejecucion(ejecucion_id)
+    if agregados is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Ejecucion {ejecucion_id} sin resultados en el historial",
+        )
+    return agregados
+
+
+@router.get(
+    "/cache/zap/product-churn",
+    summary="Estadisticas del cache de churn de ZAP",
+)
+async def get_cache_churn():
+    from app.services.zap_client import zap_client
+
+    return zap_client.stats_cache_churn()
+
+
+@router.delete(
+    "/cache/zap/product-churn",
+    summary="Invalidar cache de churn de ZAP",
+)
+async def invalidar_cache_churn():
+    from app.services.zap_client import zap_client
+
+    return {"entradas_invalidadas": zap_client.invalidar_cache_churn()}
+
+
+@router.get(
+    "/limitador/avax",
+    summary="Tasa actual y esperas del limitador de AVAX",
+)
+async def get_limitador_avax():
+    from app.services.avax_client import avax_client
+
+    return avax_client.stats_limitadores()
+
+
+@router.get(
+    "/cache/avax/productos",
+    summary="Estadisticas del cache de productos AVAX",
+)
+async def get_cache_productos_avax():
+    from app.services.avax_client import avax_client
+
+    return avax_client.stats_cache_productos()
+
+
+@router.delete(
+    "/cache/avax/productos",
+    summary="Invalidar cache de productos AVAX",
+)
+async def invalidar_cache_productos_avax(
+    cod_prod: Optional[str] = Query(
+        default=None,
+        description="Invalidar solo este producto (por defecto, todo el cache).",
+    ),
+):
+    from app.services.avax_client import avax_client
+
+    if cod_prod:
+        avax_client.invalidar_producto(cod_prod)
+        return {"entradas_invalidadas": 1}
+    return {"entradas_invalidadas": avax_client.invalidar_cache_productos()}
+
+
+def respuesta_ndjson(
+    resultado: RespProcesarProductos,
+    detalles: AsyncIterator,
+    headers: Optional[dict] = None,
+) -> StreamingResponse:
+    """Una linea JSON por producto (tipo=detalle) y al final una linea con
+    los contadores (tipo=resumen). El resumen se envia siempre: si la
+    corrida falla a mitad de camino, con el error en error_general."""
+
+    async def _lineas():
+        try:
+            async for detalle in detalles:
+                yield json.dumps({"tipo": "detalle", **detalle.model_dump(mode="json")}) + "\n"
+        except Exception as e:
+            # Ya se enviaron el status 200 y parte del cuerpo.
+            logger.exception("Error en respuesta NDJSON")
+            resultado.error_general = str(e)
+        resumen = resultado.model_dump(mode="json", exclude={"detalle_resultados"})
+        yield json.dumps({"tipo": "resumen", **resumen}) + "\n"
+
+    return StreamingResponse(_lineas(), media_type="application/x-ndjson", headers=headers)
+
+
+def plan_no_encontrado(plan_id: str) -> str:
+    from app.config import get_settings
+
+    return (
+        f"Plan {plan_id} no encontrado: no existe, sigue generandose en otro "
+        f"worker o ya se descarto (se guardan los ultimos {get_settings().PLANES_MAX})."
+    )
+
+
+def respuesta_resultado(ejecucion, solo_resumen: bool = False):
+    """Resultado de una corrida. Si sus detalles estan en disco se envian en
+    streaming desde el NDJSON, sin armarlos en memoria."""
+    resultado = ejecucion.resultado
+    if solo_resumen:
+        return resultado.model_copy(update={"detalle_resultados": []})
+    if ejecucion.resultados is None:
+        return resultado
+
+    resumen = resultado.model_dump_json(exclude={"detalle_resultados"})
+    bloques = ejecucion.resultados.array_json()
+
+    def _cuerpo():
+        yield resumen[:-1].encode() + b',"detalle_resultados":'
+        yield from bloques
+        yield b"}"
+
+    return StreamingResponse(_cuerpo(), media_type="application/json")
+
+
 def get_configuracion_actual() -> ConfiguracionGeneral:
-    """Helper para obtener configuración desde otros módulos"""
-    return configuracion_actual
+    """Helper para obtener configuración desde otros módulos (copia: el
+    snapshot del store lo comparten las corridas en curso)"""
+    from app.services.config_store import config_store
+
+    return config_store.obtener()
@@ -0,0 +1,339 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional
+
+from app.schemas.ejecuciones import RespEjecucion
+from app.schemas.respuestas_descuento import DetalleError, RespProcesarProductos
+from app.services import metricas
+from app.services.coordinacion import LockArchivo
+from app.services.historial import HistorialResultados
+from app.services.logs import ejecucion_id_var
+from app.services.resultados_store import ResultadosCorrida, ResultadosStore
+
+# iterar(resultado, modo_plan, guardar_detalle, cancelacion) -> detalles
+IterarLote = Callable[..., AsyncIterator[object]]
+
+# Detalles en espera de un cliente de streaming (backpressure sobre la corrida)
+CAPACIDAD_TRANSMISION = 256
+_FIN = object()
+
+
+class EjecucionEnCurso(Exception):
+    """Ya hay una corrida que escribe en AVAX. `ejecucion` es None si la
+    corrida es de otro worker (no se puede seguir desde aca)."""
+
+    def __init__(self, ejecucion: Optional["Ejecucion"] = None):
+        self.ejecucion = ejecucion
+        donde = f" ({ejecucion.ejecucion_id})" if ejecucion else " en otro worker"
+        super().__init__(f"Ya hay una ejecucion en curso{donde}")
+
+
+class Ejecucion:
+    """Una corrida del proceso batch con su progreso y su resultado."""
+
+    def __init__(
+        self,
+        tipo: str,
+        modo_plan: bool = False,
+        iterar: Optional[IterarLote] = None,
+        ejecucion_id: Optional[str] = None,
+    ):
+        self.ejecucion_id = ejecucion_id or uuid.uuid4().hex
+        self.tipo = tipo
+        self.modo_plan = modo_plan
+        # Lote de la corrida; None = el del gestor (batch sobre el churn)
+        self.iterar = iterar
+        self.estado = "en_curso"
+        self.inicio = datetime.now()
+        self.fin: Optional[datetime] = None
+        self.procesados = 0
+        self.por_status: dict[str, int] = {}
+        self.resultado = RespProcesarProductos(ejecucion_id=self.ejecucion_id)
+        self.cancelacion = asyncio.Event()
+        self.tarea: Optional[asyncio.Task] = None
+        self._inicio_monotonic = time.monotonic()
+        self._fin_monotonic: Optional[float] = None
+        self.al_terminar: Optional[Callable[[], None]] = None
+        # Detalles por SKU en disco; sin store quedan en resultado.detalle_resultados
+        self.resultados: Optional[ResultadosCorrida] = None
+        self.historial: Optional[HistorialResultados] = None
+        # Cola hacia el cliente de streaming (None si no hay o ya se fue)
+        self.transmision: Optional[asyncio.Queue] = None
+
+    @property
+    def activa(self) -> bool:
+        return self.estado == "en_curso"
+
+    def cancelar(self) -> None:
+        self.cancelacion.set()
+
+    async def recibir(self) -> AsyncIterator[object]:
+        """Detalles de la transmision hasta que termina la corrida. Si el
+        cliente se va, la corrida sigue en segundo plano sin el."""
+        cola = self.transmision
+        try:
+            while True:
+                try:
+                    detalle = await asyncio.wait_for(cola.get(), timeout=1)
+                except asyncio.TimeoutError:
+                    # El aviso de fin se pierde si la cola estaba llena al cancelar.
+                    if self.tarea.done() and cola.empty():
+                        return
+                    continue
+                if detalle is _FIN:
+                    return
+                yield detalle
+        finally:
+            self.transmision = None
+            # Destraba a la corrida si estaba esperando lugar en la cola.
+            while not cola.empty():
+                cola.get_nowait()
+
+    async def seguir(self, detalles: AsyncIterator[object]) -> AsyncIterator[object]:
+        """Reenvia los detalles del lote registrando el progreso."""
+        # Las tareas por SKU heredan el contexto: sus logs llevan ejecucion_id.
+        ejecucion_id_var.set(self.ejecucion_id)
+        metricas.EJECUCIONES_ACTIVAS.inc()
+        try:
+            async for detalle in detalles:
+                status = (
+                    "error"
+                    if isinstance(detalle, DetalleError)
+                    else getattr(detalle, "status", "error")
+                )
+                self.procesados += 1
+                self.por_status[status] = self.por_status.get(status, 0) + 1
+                metricas.registrar_producto(self.tipo, status)
+                if self.resultados is not None:
+                    self.resultados.agregar(detalle, status)
+                if self.historial is not None:
+                    self.historial.registrar(
+                        detalle, self.ejecucion_id, self.tipo, self.modo_plan
+                    )
+                yield detalle
+        except BaseException:
+            self.estado = "error"
+            raise
+        finally:
+            if self.estado == "en_curso":
+                if self.resultado.error_general:
+                    self.estado = "error"
+                elif self.cancelacion.is_set():
+                    self.estado = "cancelada"
+                else:
+                    self.estado = "completada"
+            self.fin = datetime.now()
+            self._fin_monotonic = time.monotonic()
+            if self.resultados is not None:
+                self.resultados.cerrar()
+            if self.al_terminar is not None:
+                self.al_terminar()
+            metricas.EJECUCIONES_ACTIVAS.dec()
+            metricas.registrar_fin_ejecucion(
+                self.tipo,
+                self.estado,
+                self._fin_monotonic - self._inicio_monotonic,
+                self.por_status,
+            )
+
+    def progreso(self) -> RespEjecucion:
+        transcurrido = (self._fin_monotonic or time.monotonic()) - self._inicio_monotonic
+        throughput = self.procesados / transcurrido if transcurrido > 0 else 0.0
+        # En el batch, productos_evaluados crece mientras se descarga el churn
+        # de ZAP (menos los SKUs ya hechos si se retomo una corrida): el total
+        # y el ETA se estabilizan cuando termina la descarga.
+        total = (
+            self.resultado.productos_evaluados - self.resultado.productos_reanudados
+        ) or None
+        eta = None
+        if self.activa and total and throughput > 0:
+            eta = round(max(total - self.procesados, 0) / throughput, 1)
+
+        return RespEjecucion(
+            ejecucion_id=self.ejecucion_id,
+            tipo=self.tipo,
+            modo_plan=self.modo_plan,
+            estado=self.estado,
+            inicio=self.inicio.isoformat(),
+            fin=self.fin.isoformat() if self.fin else None,
+            total=total,
+            procesados=self.procesados,
+            por_status=dict(self.por_status),
+            throughput_por_segundo=round(throughput, 2),
+            eta_segundos=eta,
+            cancelacion_solicitada=self.cancelacion.is_set(),
+            plan_id=self.resultado.plan_id,
+            error_general=self.resultado.error_general,
+            etapas=self.resultado.etapas,
+        )
+
+
+class GestorEjecuciones:
+    """Lanza corridas en segundo plano y guarda las ultimas N."""
+
+    def __init__(
+        self,
+        iterar: IterarLote,
+        historial: int = 20,
+        lock: Optional[LockArchivo] = None,
+        resultados: Optional[ResultadosStore] = None,
+        historial_resultados: Optional[HistorialResultados] = None,
+    ):
+        self._iterar = iterar
+        self.historial = historial
+        # Exclusion entre workers de las corridas que escriben (no modo plan)
+        self._lock = lock
+        self._resultados = resultados
+        self._historial_resultados = historial_resultados
+        self._ejecuciones: OrderedDict[str, Ejecucion] = OrderedDict()
+
+    def _registrar(self, ejecucion: Ejecucion) -> None:
+        self._ejecuciones[ejecucion.ejecucion_id] = ejecucion
+        # Se descartan las mas antiguas ya terminadas.
+        terminadas = [e for e in self._ejecuciones.values() if not e.activa]
+        sobrantes = len(self._ejecuciones) - self.historial
+        for vieja in terminadas[: max(sobrantes, 0)]:
+            del self._ejecuciones[vieja.ejecucion_id]
+            if vieja.resultados is not None:
+                vieja.resultados.eliminar()
+
+    def detalles(
+        self,
+        ejecucion: Ejecucion,
+        guardar_detalle: bool = True,
+    ) -> AsyncIterator[object]:
+        # Con store, los detalles van a disco y no se acumulan en memoria.
+        iterar = ejecucion.iterar or self._iterar
+        return ejecucion.seguir(
+            iterar(
+                ejecucion.resultado,
+                ejecucion.modo_plan,
+                guardar_detalle and ejecucion.resultados is None,
+                ejecucion.cancelacion,
+            )
+        )
+
+    def crear(self, tipo: str, modo_plan: bool = False) -> Ejecucion:
+        """Registra una corrida nueva (ver _registrar_corrida)."""
+        return self._registrar_corrida(Ejecucion(tipo, modo_plan))
+
+    def _registrar_corrida(self, ejecucion: Ejecucion) -> Ejecucion:
+        """Solo puede haber una corrida que escriba en AVAX a la vez; si ya
+        hay una, lanza EjecucionEnCurso. Las de modo plan no escriben y no se
+        bloquean.
+        """
+        if not ejecucion.modo_plan:
+            self._tomar_exclusion(ejecucion)
+        if self._resultados is not None:
+            ejecucion.resultados = self._resultados.crear(ejecucion.ejecucion_id)
+        ejecucion.historial = self._historial_resultados
+        self._registrar(ejecucion)
+        return ejecucion
+
+    def _tomar_exclusion(self, ejecucion: Ejecucion) -> None:
+        activa = self.activa_con_escritura()
+        if activa is not None:
+            raise EjecucionEnCurso(activa)
+        if self._lock is None:
+            return
+        if not self._lock.intentar():
+            raise EjecucionEnCurso(None)
+        ejecucion.al_terminar = self._lock.liberar
+
+    def verificar_exclusion(self) -> None:
+        """Chequeo previo (sin tomar nada) de que se puede lanzar una corrida
+        que escribe: lanza EjecucionEnCurso si no."""
+        activa = self.activa_con_escritura()
+        if activa is not None:
+            raise EjecucionEnCurso(activa)
+        if self._lock is not None and not self._lock.tomado:
+            if not self._lock.intentar():
+                raise EjecucionEnCurso(None)
+            self._lock.liberar()
+
+    def activa_con_escritura(self) -> Optional[Ejecucion]:
+        return next((e for e in self.activas() if not e.modo_plan), None)
+
+    def iniciar(
+        self,
+        tipo: str,
+        modo_plan: bool = False,
+        iterar: Optional[IterarLote] = None,
+        ejecucion_id: Optional[str] = None,
+    ) -> Ejecucion:
+        """Lanza la corrida en segundo plano y la devuelve de inmediato.
+        `iterar` reemplaza al lote del gestor (ej. ejecutar un plan)."""
+        return self._lanzar(
+            self._registrar_corrida(Ejecucion(tipo, modo_plan, iterar, ejecucion_id))
+        )
+
+    def _lanzar(self, ejecucion: Ejecucion) -> Ejecucion:
+        async def _consumir() -> RespProcesarProductos:
+            try:
+                async for detalle in self.detalles(
+                    ejecucion, guardar_detalle=ejecucion.transmision is None
+                ):
+                    if ejecucion.transmision is not None:
+                        await ejecucion.transmision.put(detalle)
+                return ejecucion.resultado
+            finally:
+                if ejecucion.transmision is not None:
+                    try:
+                        ejecucion.transmision.put_nowait(_FIN)
+                    except asyncio.QueueFull:
+                        pass
+
+        ejecucion.tarea = asyncio.ensure_future(_consumir())
+        return ejecucion
+
+    def transmitir(
+        self, tipo: str, modo_plan: bool = False
+    ) -> tuple[Ejecucion, AsyncIterator[object]]:
+        """Corrida para una respuesta en streaming: (ejecucion, detalles).
+
+        La corrida se registra y toma la exclusion recien cuando el cliente
+        empieza a leer los detalles: si la respuesta nunca se envia no queda
+        un lock tomado ni una corrida en_curso. Corre en su propia tarea (que
+        detener() espera) aunque el cliente se desconecte.
+        """
+        if not modo_plan:
+            self.verificar_exclusion()
+        ejecucion = Ejecucion(tipo, modo_plan)
+
+        async def _detalles() -> AsyncIterator[object]:
+            ejecucion.transmision = asyncio.Queue(CAPACIDAD_TRANSMISION)
+            try:
+                self._lanzar(self._registrar_corrida(ejecucion))
+            except BaseException:
+                ejecucion.transmision = None
+                raise
+            async for detalle in ejecucion.recibir():
+                yield detalle
+
+        return ejecucion, _detalles()
+
+    def obtener(self, ejecucion_id: str) -> Optional[Ejecucion]:
+        return self._ejecuciones.get(ejecucion_id)
+
+    def listar(self) -> list[Ejecucion]:
+        return list(reversed(self._ejecuciones.values()))
+
+    def activas(self) -> list[Ejecucion]:
+        return [e for e in self._ejecuciones.values() if e.activa]
+
+    async def detener(self, timeout: float) -> None:
+        """Apagado ordenado: deja de tomar SKUs nuevos y espera a que
+        terminen los que estan en vuelo (hasta `timeout`)."""
+        activas = self.activas()
+        for ejecucion in activas:
+            ejecucion.cancelar()
+
+        tareas = [e.tarea for e in activas if e.tarea is not None]
+        if not tareas:
+            return
+        _, pendientes = await asyncio.wait(tareas, timeout=timeout)
+        for tarea in pendientes:
+            tarea.cancel()
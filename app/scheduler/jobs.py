@@ -1,102 +1,258 @@
-from datetime import datetime
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from app.config import get_settings
-from app.routes.descuento_auto_routes import get_configuracion_actual
-from app.schemas.respuestas_descuento import RespProcesarProductos
+from app.scheduler.ejecuciones import EjecucionEnCurso, GestorEjecuciones
+from app.schemas.respuestas_descuento import DetalleError, RespProcesarProductos
 from app.services.descuento_auto.descuento_auto import (
     acumular_resultado_lote,
-    procesar_producto_con_contexto,
-)
-from app.services.descuento_auto.descuento_helpers import (
-    armar_detalle_error,
-    build_umbrales,
+    crear_cola_precios,
+    crear_pipeline_si_activo,
+    drenar_cola_precios,
+    procesar_lote,
 )
+from app.services.descuento_auto.descuento_helpers import build_umbrales
+from app.services.descuento_auto.descuento_lote import hasta_cancelar
+from app.services.descuento_auto.descuento_plan import planes_store
+from app.services.churn_index import ChurnIndex
+from app.services.config_store import config_store
+from app.services.coordinacion import lock_corrida_batch
+from app.services.historial import historial_resultados
+from app.services.journal import clave_corrida, journal_ejecuciones
+from app.services.metricas import DURACION_ETAPA
+from app.services.resultados_store import resultados_store
 from app.services.zap_client import zap_client
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 scheduler = AsyncIOScheduler()
 
 
-async def procesar_descuentos_automaticos() -> RespProcesarProductos:
-    print(f"[{datetime.now()}] Descuentos Automaticos")
-
-    resultado = RespProcesarProductos()
+async def iterar_descuentos_automaticos(
+    resultado: RespProcesarProductos,
+    modo_plan: bool = False,
+    guardar_detalle: bool = True,
+    cancelacion: Optional[asyncio.Event] = None,
+) -> AsyncIterator[object]:
+    """Proceso batch sobre todo el churn de ZAP. Entrega cada detalle apenas
+    esta listo y acumula los contadores en `resultado`."""
+    logger.info("Descuentos automaticos: inicio", extra={"modo_plan": modo_plan})
 
     try:
-        productos_churn = await zap_client.get_product_churn()
-        resultado.productos_evaluados = len(productos_churn)
-        print(f"Obtenidos {len(productos_churn)} productos de ZAP")
-
-        configuracion = get_configuracion_actual()
+        # Snapshot: un PATCH durante la corrida no cambia sus umbrales.
+        snapshot_config = config_store.snapshot()
+        configuracion = snapshot_config.configuracion
         estado_activo = configuracion.estado_logica_activo
         config_estado = getattr(configuracion, estado_activo.value)
 
         resultado.estado_ejecutado = estado_activo.value
         resultado.umbrales_usados = build_umbrales(config_estado)
 
-        print(f"Estado logico activo: {estado_activo.value}")
-        print(
-            "Umbrales: "
-            f"last_import_age_max > {config_estado.last_import_age_max}, "
-            f"days_since_last_sale_min > {config_estado.days_since_last_sale_min}"
+        plan = planes_store.crear(estado_activo, config_estado) if modo_plan else None
+        if plan is not None:
+            resultado.plan_id = plan.plan_id
+
+        logger.info(
+            "Configuracion de la corrida",
+            extra={
+                "estado_logica": estado_activo.value,
+                "umbrales": config_estado.model_dump(),
+                "config_version": snapshot_config.version,
+            },
         )
 
-        for producto in productos_churn:
-            cod_prod = producto.get("cod_prod") or producto.get("sku")
-            if not cod_prod:
-                continue
+        # Bitacora: si una corrida de hoy quedo a medias, se retoma sin
+        # repetir los SKUs que ya tienen resultado final.
+        corrida_id, terminados = None, set()
+        if not modo_plan:
+            with DURACION_ETAPA.labels("journal").time():
+                corrida_id, terminados = await journal_ejecuciones.iniciar_corrida(
+                    clave_corrida(estado_activo.value)
+                )
+        if terminados:
+            logger.info(
+                "Retomando corrida interrumpida",
+                extra={"corrida_id": corrida_id, "terminados": len(terminados)},
+            )
+
+        # El churn se procesa mientras se descarga: productos_evaluados crece
+        # hasta el total de ZAP. Si la descarga falla, se termina lo que ya
+        # esta en vuelo y luego se reporta el error.
+        errores_churn: list[Exception] = []
 
+        async def _items_churn():
+            inicio = time.perf_counter()
             try:
-                detalle = await procesar_producto_con_contexto(
-                    cod_prod=cod_prod,
-                    producto_zap=producto,
-                    estado_activo=estado_activo,
-                    config_estado=config_estado,
+                async for producto in zap_client.iterar_churn():
+                    if resultado.productos_evaluados == 0:
+                        DURACION_ETAPA.labels("churn_primer_sku").observe(
+                            time.perf_counter() - inicio
+                        )
+                    resultado.productos_evaluados += 1
+                    cod_prod = ChurnIndex.codigo(producto)
+                    if not cod_prod:
+                        continue
+                    if cod_prod in terminados:
+                        resultado.productos_reanudados += 1
+                        continue
+                    yield cod_prod, producto
+            except Exception as e:
+                errores_churn.append(e)
+                return
+            DURACION_ETAPA.labels("churn").observe(time.perf_counter() - inicio)
+            logger.info(
+                "Productos obtenidos de ZAP",
+                extra={"productos_zap": resultado.productos_evaluados},
+            )
+
+        cola_precios = crear_cola_precios()
+        pipeline = crear_pipeline_si_activo(estado_activo, config_estado, cola_precios, plan)
+        inicio_lote = time.perf_counter()
+        ultimo_progreso = ultimas_etapas = inicio_lote
+        try:
+            async for cod_prod, detalle in procesar_lote(
+                hasta_cancelar(_items_churn(), cancelacion),
+                estado_activo,
+                config_estado,
+                cola_precios=cola_precios,
+                plan=plan,
+                pipeline=pipeline,
+            ):
+                detalle = acumular_resultado_lote(
+                    resultado, detalle, cod_prod, guardar_detalle
                 )
-                acumular_resultado_lote(resultado, detalle, cod_prod)
 
-                if getattr(detalle, "status", None) == "aplicado":
-                    cambio_esq = (
-                        f" + esq_costo: {detalle.esq_costo_nuevo}"
-                        if getattr(detalle, "esq_costo_nuevo", None)
-                        else ""
+                # Logs por SKU: se muestrean (LOG_MUESTREO_SKU); el total va en el progreso.
+                # Los errores van en ERROR, que el muestreo no filtra.
+                if isinstance(detalle, DetalleError):
+                    logger.error(
+                        "Error procesando SKU",
+                        extra={"cod_prod": cod_prod, "error": detalle.error},
                     )
-                    print(
-                        f"COD_PROD {cod_prod}: "
-                        f"{detalle.descuento_anterior} -> {detalle.descuento_nuevo}"
-                        f"{cambio_esq}"
+                elif getattr(detalle, "status", None) == "aplicado":
+                    logger.info(
+                        "Descuento aplicado",
+                        extra={
+                            "cod_prod": cod_prod,
+                            "descuento_anterior": detalle.descuento_anterior,
+                            "descuento_nuevo": detalle.descuento_nuevo,
+                            "esq_costo_nuevo": detalle.esq_costo_nuevo,
+                        },
                     )
 
-            except Exception as e:
-                resultado.errores += 1
-                resultado.detalle_resultados.append(
-                    armar_detalle_error(cod_prod=cod_prod, error=str(e))
-                )
-                print(f"Error procesando COD_PROD {cod_prod}: {e}")
+                ahora = time.perf_counter()
+                # Throughput y colas por etapa para /ejecuciones/{id}
+                if pipeline is not None and ahora - ultimas_etapas >= 1:
+                    ultimas_etapas = ahora
+                    resultado.etapas = pipeline.stats()
+                if ahora - ultimo_progreso >= settings.LOG_PROGRESO_SEGUNDOS:
+                    ultimo_progreso = ahora
+                    logger.info("Progreso de la corrida", extra=_resumen_log(resultado))
+
+                if corrida_id is not None:
+                    journal_ejecuciones.registrar(
+                        corrida_id, cod_prod, getattr(detalle, "status", "error")
+                    )
+
+                yield detalle
+        finally:
+            if corrida_id is not None:
+                # Lo ya procesado queda en la bitacora aunque la corrida se corte.
+                await journal_ejecuciones.volcar()
+            if pipeline is not None:
+                resultado.etapas = pipeline.stats()
+            DURACION_ETAPA.labels("procesamiento").observe(time.perf_counter() - inicio_lote)
+            with DURACION_ETAPA.labels("drenaje_precios").time():
+                await drenar_cola_precios(resultado, cola_precios)
+            if plan is not None:
+                await planes_store.guardar(plan)
+
+        if errores_churn:
+            raise errores_churn[0]
 
-        print(f"[{datetime.now()}] Proceso completado.")
-        print(f"  - Productos modificados: {resultado.productos_modificados}")
-        print(f"  - Errores: {resultado.errores}")
+        cancelada = cancelacion is not None and cancelacion.is_set()
+        if corrida_id is not None and not cancelada:
+            await journal_ejecuciones.finalizar(corrida_id)
+
+        logger.info(
+            "Proceso cancelado (se retomara en la proxima corrida)"
+            if cancelada
+            else "Proceso completado",
+            extra=_resumen_log(resultado),
+        )
 
     except Exception as e:
-        print(f"[{datetime.now()}] Error en proceso: {e}")
+        logger.exception("Error en proceso")
         resultado.error_general = str(e)
 
+
+def _resumen_log(resultado: RespProcesarProductos) -> dict:
+    return {
+        "evaluados": resultado.productos_evaluados,
+        "modificados": resultado.productos_modificados,
+        "no_aptos": resultado.productos_no_aptos,
+        "excluidos": resultado.productos_excluidos,
+        "no_encontrados": resultado.productos_no_encontrados,
+        "planificados": resultado.productos_planificados,
+        "reanudados": resultado.productos_reanudados,
+        "errores": resultado.errores,
+        "precios_actualizados": resultado.precios_actualizados,
+        "precios_pendientes": len(resultado.precios_pendientes),
+        "precios_fallidos": len(resultado.precios_fallidos),
+        "plan_id": resultado.plan_id,
+        "etapas": {
+            nombre: etapa.model_dump() for nombre, etapa in resultado.etapas.items()
+        }
+        if resultado.etapas
+        else None,
+    }
+
+
+async def procesar_descuentos_automaticos(modo_plan: bool = False) -> RespProcesarProductos:
+    resultado = RespProcesarProductos()
+    async for _ in iterar_descuentos_automaticos(resultado, modo_plan):
+        pass
     return resultado
 
 
+gestor_ejecuciones = GestorEjecuciones(
+    iterar_descuentos_automaticos,
+    historial=settings.EJECUCIONES_HISTORIAL,
+    lock=lock_corrida_batch,
+    resultados=resultados_store,
+    historial_resultados=historial_resultados,
+)
+
+
+async def ejecutar_proceso_programado() -> Optional[RespProcesarProductos]:
+    try:
+        ejecucion = gestor_ejecuciones.iniciar("programada")
+    except EjecucionEnCurso as e:
+        logger.warning("Corrida programada omitida", extra={"motivo": str(e)})
+        return None
+    return await ejecucion.tarea
+
+
 def setup_scheduler():
     """Scheduler 5 AM"""
     scheduler.add_job(
-        procesar_descuentos_automaticos,
+        ejecutar_proceso_programado,
         CronTrigger(hour=settings.SCHEDULER_HOUR, minute=settings.SCHEDULER_MINUTE),
         id="proceso_descuentos",
         name="Proceso de descuentos automaticos",
         replace_existing=True,
     )
-    print(
-        "GO Descuentos Automaticos - "
-        f"Zz {settings.SCHEDULER_HOUR}:{settings.SCHEDULER_MINUTE:02d}"
+    logger.info(
+        "Scheduler configurado",
+        extra={"hora": f"{settings.SCHEDULER_HOUR}:{settings.SCHEDULER_MINUTE:02d}"},
     )
+
+
+def iniciar_scheduler():
+    """Se llama solo en el worker lider (ver coordinacion.EleccionLider)."""
+    setup_scheduler()
+    scheduler.start()
@@ -0,0 +1,51 @@
+from typing import Optional, Union
+from pydantic import BaseModel
+
+from app.schemas.respuestas_descuento import (
+    DetalleError,
+    EstadisticasEtapa,
+    RespAplicado,
+    RespErrorValidacion,
+    RespExcluido,
+    RespNoApto,
+    RespNoEncontrado,
+    RespPlanificado,
+)
+
+
+class RespEjecucion(BaseModel):
+    ejecucion_id: str
+    tipo: str
+    modo_plan: bool = False
+    estado: str
+    inicio: str
+    fin: Optional[str] = None
+    total: Optional[int] = None
+    procesados: int = 0
+    por_status: dict[str, int] = {}
+    throughput_por_segundo: float = 0.0
+    eta_segundos: Optional[float] = None
+    cancelacion_solicitada: bool = False
+    plan_id: Optional[str] = None
+    error_general: Optional[str] = None
+    # Pipeline batch: throughput y profundidad de cola por etapa
+    etapas: Optional[dict[str, EstadisticasEtapa]] = None
+
+
+class RespPaginaDetalles(BaseModel):
+    ejecucion_id: str
+    status: Optional[str] = None
+    total: int = 0
+    # None cuando la corrida termino y no quedan mas detalles
+    siguiente_cursor: Optional[str] = None
+    detalles: list[
+        Union[
+            RespAplicado,
+            RespPlanificado,
+            RespNoApto,
+            RespErrorValidacion,
+            RespExcluido,
+            RespNoEncontrado,
+            DetalleError,
+        ]
+    ] = []
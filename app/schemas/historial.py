@@ -0,0 +1,29 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class RegistroHistorial(BaseModel):
+    fecha: str
+    ejecucion_id: Optional[str] = None
+    tipo: str
+    modo_plan: bool = False
+    cod_prod: Optional[str] = None
+    status: str
+    estado_usado: Optional[str] = None
+    ruta: Optional[str] = None
+    descuento_anterior: Optional[str] = None
+    descuento_nuevo: Optional[str] = None
+    esq_costo_nuevo: Optional[str] = None
+    mensaje: Optional[str] = None
+
+
+class RespAgregadosEjecucion(BaseModel):
+    ejecucion_id: str
+    tipo: str
+    modo_plan: bool = False
+    primer_resultado: str
+    ultimo_resultado: str
+    total: int
+    por_status: dict[str, int] = {}
+    # Solo aplicados/planificados
+    por_descuento_nuevo: dict[str, int] = {}
@@ -39,7 +39,8 @@ class RespNoApto(BaseModel):
     estado_usado: str
     ruta_evaluada: str
     umbrales_usados: Umbrales
-    descuento_actual: str
+    # None cuando se descarta solo con datos de ZAP (sin leer AVAX)
+    descuento_actual: Optional[str] = None
     datos_zap: DatosZap
     datos_avax: DatosAvax
     mensaje: str
@@ -67,6 +68,25 @@ class RespAplicado(BaseModel):
     descuento_nuevo: str
     esq_costo_nuevo: Optional[str] = None
     categoria_liquidacion_agregada: bool = False
+    actualizacion_precio: Optional[str] = None
+    datos_zap: DatosZap
+    datos_avax: DatosAvax
+    mensaje: str
+
+
+class RespPlanificado(BaseModel):
+    status: str = "planificado"
+    plan_id: str
+    cod_prod: str
+    estado_usado: str
+    ruta_usada: str
+    umbrales_usados: Umbrales
+    descuento_actual: str
+    nuevo_descuento: str
+    esq_costo_actual: Optional[str] = None
+    nuevo_esq_costo: Optional[str] = None
+    agregaria_categoria_liquidacion: bool = False
+    actualizaria_precio: bool = False
     datos_zap: DatosZap
     datos_avax: DatosAvax
     mensaje: str
@@ -77,6 +97,17 @@ class DetalleError(BaseModel):
     error: str
 
 
+class EstadisticasEtapa(BaseModel):
+    workers: int
+    capacidad_cola: int
+    en_cola: int = 0
+    ocupados: int = 0
+    procesados: int = 0
+    throughput_por_segundo: float = 0.0
+    # Fraccion del tiempo en que los workers estuvieron ocupados
+    utilizacion: float = 0.0
+
+
 class RespProcesarProductos(BaseModel):
     estado_ejecutado: Optional[str] = None
     umbrales_usados: Optional[Umbrales] = None
@@ -85,11 +116,22 @@ class RespProcesarProductos(BaseModel):
     productos_no_aptos: int = 0
     productos_excluidos: int = 0
     productos_no_encontrados: int = 0
+    productos_planificados: int = 0
+    productos_reanudados: int = 0
     errores: int = 0
     error_general: Optional[str] = None
+    # Id de la corrida (o de la llamada a /procesar/productos) en el historial
+    ejecucion_id: Optional[str] = None
+    precios_actualizados: int = 0
+    precios_pendientes: list[str] = []
+    precios_fallidos: list[DetalleError] = []
+    plan_id: Optional[str] = None
+    # Pipeline batch (lectura -> evaluacion -> escritura) por etapa
+    etapas: Optional[dict[str, EstadisticasEtapa]] = None
     detalle_resultados: list[
         Union[
             RespAplicado,
+            RespPlanificado,
             RespNoApto,
             RespErrorValidacion,
             RespExcluido,
@@ -97,3 +139,13 @@ class RespProcesarProductos(BaseModel):
             DetalleError,
         ]
     ] = []
+
+
+class RespPlan(BaseModel):
+    plan_id: str
+    creado: str
+    estado_usado: str
+    umbrales_usados: Umbrales
+    ejecutado: bool = False
+    total_cambios: int = 0
+    cambios: list[RespPlanificado] = []
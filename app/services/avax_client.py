@@ -1,10 +1,31 @@
 import asyncio
+import logging
+import time
 from datetime import date
 from typing import List, Optional
 
 import httpx
 
 from app.config import get_settings
+from app.services.cache import CacheTTL
+from app.services.cola_precios import ColaActualizacionPrecios
+from app.services.http_pool import crear_cliente_http
+from app.services.metricas import MedicionRequest
+from app.services.rate_limiter import LimitadorAdaptativo
+from app.services.resiliencia import (
+    CircuitBreaker,
+    PoliticaReintentos,
+    enviar_con_resiliencia,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _ProductoNoEncontrado:
+    """Marca de 404 en el cache negativo (guarda la respuesta original)."""
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
 
 
 class AvaxClient:
@@ -15,55 +36,184 @@ class AvaxClient:
     def __init__(self):
         self.settings = get_settings()
         self.base_url = self.settings.AVAX_BASE_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache_productos = CacheTTL(
+            ttl=self.settings.AVAX_CACHE_TTL,
+            max_items=self.settings.AVAX_CACHE_MAX,
+        )
+        # Presupuestos separados: GET vs PATCH/PUT/POST
+        self.limitador_lectura = self._crear_limitador(
+            "lectura",
+            self.settings.AVAX_RATE_LECTURA_INICIAL,
+            self.settings.AVAX_RATE_LECTURA_MAX,
+        )
+        self.limitador_escritura = self._crear_limitador(
+            "escritura",
+            self.settings.AVAX_RATE_ESCRITURA_INICIAL,
+            self.settings.AVAX_RATE_ESCRITURA_MAX,
+        )
+        self.circuito = CircuitBreaker(
+            "avax",
+            umbral_fallas=self.settings.CIRCUITO_UMBRAL_FALLAS,
+            tiempo_apertura=self.settings.CIRCUITO_APERTURA,
+        )
+        self._politica_idempotente = PoliticaReintentos(
+            intentos=self.settings.AVAX_REINTENTOS + 1,
+            timeout=self.settings.AVAX_TIMEOUT,
+            deadline=self.settings.AVAX_DEADLINE,
+            backoff_base=self.settings.REINTENTO_BACKOFF_BASE,
+            backoff_max=self.settings.REINTENTO_BACKOFF_MAX,
+        )
+        self._politica_sin_reintentos = PoliticaReintentos.sin_reintentos(
+            self.settings.AVAX_TIMEOUT
+        )
+
+    def _crear_limitador(
+        self, nombre: str, tasa_inicial: float, tasa_max: float
+    ) -> LimitadorAdaptativo:
+        return LimitadorAdaptativo(
+            nombre=nombre,
+            tasa_inicial=tasa_inicial,
+            tasa_min=self.settings.AVAX_RATE_MIN,
+            tasa_max=tasa_max,
+            rafaga=self.settings.AVAX_RATE_RAFAGA,
+            incremento=self.settings.AVAX_RATE_INCREMENTO,
+            factor_reduccion=self.settings.AVAX_RATE_FACTOR_REDUCCION,
+            latencia_objetivo=self.settings.AVAX_LATENCIA_OBJETIVO,
+        )
+
+    def _crear_cliente(self) -> httpx.AsyncClient:
+        return crear_cliente_http(
+            timeout=self.settings.AVAX_TIMEOUT,
+            max_connections=self.settings.AVAX_MAX_CONNECTIONS,
+            max_keepalive_connections=self.settings.AVAX_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=self.settings.AVAX_KEEPALIVE_EXPIRY,
+            http2=self.settings.AVAX_HTTP2,
+            headers={"token": self.settings.AVAX_TOKEN},
+        )
+
+    async def iniciar(self) -> None:
+        if self._client is None:
+            self._client = self._crear_cliente()
+
+    async def cerrar(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Fuera del lifespan (scripts, consola) el pool se crea bajo demanda.
+        if self._client is None:
+            self._client = self._crear_cliente()
+        return self._client
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        operacion: str,
+        idempotente: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        limitador = (
+            self.limitador_lectura if method == "GET" else self.limitador_escritura
+        )
+
+        async def _enviar(timeout: float) -> httpx.Response:
+            await limitador.adquirir()
+            with MedicionRequest("avax", operacion) as medicion:
+                self.circuito.rechazar_si_abierto()
+                inicio = time.monotonic()
+                try:
+                    response = await self._get_client().request(
+                        method, url, timeout=timeout, **kwargs
+                    )
+                except httpx.RequestError:
+                    limitador.registrar(None, time.monotonic() - inicio)
+                    raise
+                medicion.status(response.status_code)
+            limitador.registrar(
+                response.status_code,
+                time.monotonic() - inicio,
+                response.headers.get("Retry-After"),
+            )
+            return response
+
+        politica = (
+            self._politica_idempotente if idempotente else self._politica_sin_reintentos
+        )
+        return await enviar_con_resiliencia(_enviar, self.circuito, politica)
+
+    def stats_limitadores(self) -> dict:
+        return {
+            "lectura": self.limitador_lectura.stats(),
+            "escritura": self.limitador_escritura.stats(),
+            "circuito": self.circuito.stats(),
+        }
+
+    async def get_producto(self, cod_prod: str, usar_cache: bool = True) -> dict:
+        if usar_cache:
+            cacheado = self._cache_productos.get(cod_prod)
+            if isinstance(cacheado, _ProductoNoEncontrado):
+                cacheado.response.raise_for_status()
+            if cacheado is not None:
+                return cacheado
 
-    async def get_producto(self, cod_prod: str) -> dict:
         url = f"{self.base_url}/empleados/productos/{cod_prod}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                headers={"token": self.settings.AVAX_TOKEN},
-                timeout=30.0,
+        response = await self._request("GET", url, "get_producto", idempotente=True)
+        if response.status_code == 404:
+            self._cache_productos.set(
+                cod_prod,
+                _ProductoNoEncontrado(response),
+                ttl=self.settings.AVAX_CACHE_TTL_404,
             )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("data", data)
+        response.raise_for_status()
+        data = response.json()
+        producto = data.get("data", data)
+        self._cache_productos.set(cod_prod, producto)
+        return producto
+
+    def invalidar_producto(self, cod_prod: str) -> None:
+        self._cache_productos.invalidar(cod_prod)
+
+    def invalidar_cache_productos(self) -> int:
+        return self._cache_productos.limpiar()
+
+    def stats_cache_productos(self) -> dict:
+        return self._cache_productos.stats()
 
     async def actualizar_precio(self, cod_prod: str) -> dict:
         url = f"{self.base_url}/empleados/productos/{cod_prod}/actions/actualizar_precio"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url,
-                headers={"token": self.settings.AVAX_TOKEN},
-                timeout=30.0,
-            )
-            response.raise_for_status()
-            return response.json()
+        try:
+            response = await self._request("POST", url, "actualizar_precio", idempotente=True)
+        finally:
+            self.invalidar_producto(cod_prod)
+        response.raise_for_status()
+        return response.json()
 
     async def actualizar_categorias(self, cod_prod: str, categorias: List[str]) -> dict:
         url = f"{self.base_url}/empleados/categorias_productos/{cod_prod}"
 
         payload = {"id_categorias": categorias}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.put(
-                url,
-                json=payload,
-                headers={"token": self.settings.AVAX_TOKEN},
-                timeout=30.0,
-            )
-            response.raise_for_status()
-            return response.json()
+        try:
+            response = await self._request("PUT", url, "actualizar_categorias", json=payload)
+        finally:
+            self.invalidar_producto(cod_prod)
+        response.raise_for_status()
+        return response.json()
 
     async def _esperar_con_timer_actualizar_precio(self, cod_prod: str, segundos: int) -> None:
         if segundos <= 0:
             return
 
-        print(f"[{cod_prod}] Esperando {segundos}s antes de actualizar precio...")
-        for restante in range(segundos, 0, -1):
-            print(f"[{cod_prod}] actualizar_precio en {restante}s")
-            await asyncio.sleep(1)
+        logger.debug(
+            "Esperando antes de actualizar precio",
+            extra={"cod_prod": cod_prod, "segundos": segundos},
+        )
+        await asyncio.sleep(segundos)
 
     def _extraer_lista_strings(self, datos: list, campo: str) -> List[str]:
         if not datos:
@@ -127,15 +277,13 @@ class AvaxClient:
         # Si ya tiene la categoria Liquidacion, mantenerla.
         return categorias, categoria_agregada_ahora
 
-    async def actualizar_descuento(
+    def preparar_actualizacion(
         self,
-        cod_prod: str,
+        producto: dict,
         nuevo_descuento: str,
         nuevo_esq_costo: Optional[str] = None,
-        producto_actual: Optional[dict] = None,
     ) -> dict:
-        # 1. Obtener producto actual (si no nos lo pasaron)
-        producto = producto_actual or await self.get_producto(cod_prod)
+        """Arma el PATCH y los efectos secundarios sin llamar a AVAX."""
         esq_costo_actual = producto.get("id_esq_costo")
         descuento_actual = producto.get("id_descuento")
 
@@ -191,35 +339,69 @@ class AvaxClient:
             # Se toca fecha si cambia a esquema LIQ o si cambia descuento a PUSH/LIQUIDACION.
             payload["ult_actualizacion_descuento_automatico"] = date.today().isoformat()
 
+        return {
+            "payload": payload,
+            "categorias_actuales": categorias_actuales,
+            "categorias_nuevas": categorias_nuevas,
+            "categoria_agregada": categoria_agregada,
+            "actualiza_precio": bool(
+                nuevo_esq_costo and nuevo_esq_costo != esq_costo_actual
+            ),
+        }
+
+    async def actualizar_descuento(
+        self,
+        cod_prod: str,
+        nuevo_descuento: str,
+        nuevo_esq_costo: Optional[str] = None,
+        producto_actual: Optional[dict] = None,
+        cola_precios: Optional[ColaActualizacionPrecios] = None,
+    ) -> dict:
+        # 1. Obtener producto actual (si no nos lo pasaron)
+        producto = producto_actual or await self.get_producto(cod_prod)
+
+        # 2-5. Payload, categorias y cambio de esquema
+        cambios = self.preparar_actualizacion(producto, nuevo_descuento, nuevo_esq_costo)
+        payload = cambios["payload"]
+        categorias_actuales = cambios["categorias_actuales"]
+        categorias_nuevas = cambios["categorias_nuevas"]
+        categoria_agregada = cambios["categoria_agregada"]
+
         # 6. Enviar PATCH al producto
         url = f"{self.base_url}/empleados/productos/{cod_prod}"
 
-        async with httpx.AsyncClient() as client:
-            response = await client.patch(
-                url,
-                json=payload,
-                headers={"token": self.settings.AVAX_TOKEN},
-                timeout=30.0,
-            )
-            response.raise_for_status()
-            result = response.json()
+        try:
+            response = await self._request("PATCH", url, "actualizar_descuento", json=payload)
+        finally:
+            # Aunque falle, el documento cacheado ya no es confiable.
+            self.invalidar_producto(cod_prod)
+        response.raise_for_status()
+        result = response.json()
 
         # 7. Actualizar categorias
         if categorias_nuevas != categorias_actuales:
             await self.actualizar_categorias(cod_prod, categorias_nuevas)
 
         # 8. Si cambio id_esq_costo, gatillar actualizacion de precios
-        if nuevo_esq_costo and nuevo_esq_costo != esq_costo_actual:
-            await self._esperar_con_timer_actualizar_precio(
-                cod_prod, self.settings.REQUEST_DELAY
-            )
-            await self.actualizar_precio(cod_prod)
+        #    (en lote se difiere a la cola para no bloquear a los demas SKUs)
+        actualizacion_precio = None
+        if cambios["actualiza_precio"]:
+            if cola_precios is not None:
+                cola_precios.programar(cod_prod, self.settings.REQUEST_DELAY)
+                actualizacion_precio = "programada"
+            else:
+                await self._esperar_con_timer_actualizar_precio(
+                    cod_prod, self.settings.REQUEST_DELAY
+                )
+                await self.actualizar_precio(cod_prod)
+                actualizacion_precio = "aplicada"
 
         # 9. Retornar resultado con info adicional
         return {
             "response": result,
             "categoria_liquidacion_agregada": categoria_agregada,
             "categorias_finales": categorias_nuevas,
+            "actualizacion_precio": actualizacion_precio,
         }
 
 
@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class CacheTTL:
+    """Cache LRU en memoria con expiracion por entrada."""
+
+    def __init__(self, ttl: float, max_items: int = 1024):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._datos: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, clave: Hashable, default: Any = None) -> Any:
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            self.misses += 1
+            return default
+
+        expira, valor = entrada
+        if expira <= time.monotonic():
+            del self._datos[clave]
+            self.misses += 1
+            return default
+
+        self._datos.move_to_end(clave)
+        self.hits += 1
+        return valor
+
+    def set(self, clave: Hashable, valor: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_items <= 0:
+            return
+        self._datos[clave] = (time.monotonic() + ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_items:
+            self._datos.popitem(last=False)
+
+    def invalidar(self, clave: Hashable) -> bool:
+        return self._datos.pop(clave, None) is not None
+
+    def limpiar(self) -> int:
+        cantidad = len(self._datos)
+        self._datos.clear()
+        return cantidad
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entradas": len(self._datos),
+            "max_items": self.max_items,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,97 @@
+from typing import Any, Iterable, Iterator, Optional, Union
+
+
+class RegistroChurn:
+    """Producto del churn de ZAP con solo los campos que usan el indice y las
+    reglas. Con __slots__ ocupa una fraccion de un dict por SKU, asi el churn
+    completo puede quedar en cache todo el dia.
+
+    Expone .get() como un dict para que las reglas acepten ambos.
+    """
+
+    __slots__ = ("sku", "cod_prod", "last_import_age_max", "days_since_last_sale_min")
+
+    def __init__(
+        self,
+        sku: Optional[str] = None,
+        cod_prod: Optional[str] = None,
+        last_import_age_max: Optional[float] = None,
+        days_since_last_sale_min: Optional[float] = None,
+    ):
+        self.sku = sku
+        # Suelen coincidir: se comparte el mismo str.
+        self.cod_prod = sku if cod_prod is not None and cod_prod == sku else cod_prod
+        self.last_import_age_max = last_import_age_max
+        self.days_since_last_sale_min = days_since_last_sale_min
+
+    @classmethod
+    def desde_dict(cls, producto: dict) -> "RegistroChurn":
+        return cls(
+            producto.get("sku"),
+            producto.get("cod_prod"),
+            producto.get("last_import_age_max"),
+            producto.get("days_since_last_sale_min"),
+        )
+
+    def get(self, campo: str, default: Any = None) -> Any:
+        # Un campo que ZAP no envio queda en None, igual que la clave ausente.
+        valor = getattr(self, campo, None) if campo in self.__slots__ else None
+        return default if valor is None else valor
+
+    def a_dict(self) -> dict:
+        return {
+            campo: getattr(self, campo)
+            for campo in self.__slots__
+            if getattr(self, campo) is not None
+        }
+
+    def __repr__(self) -> str:
+        return f"RegistroChurn({self.a_dict()!r})"
+
+
+# Las reglas aceptan el registro compacto o el dict crudo de ZAP.
+ProductoZap = Union[RegistroChurn, dict]
+
+
+class ChurnIndex:
+    """Indice del churn de ZAP con busqueda O(1) por sku y por cod_prod."""
+
+    def __init__(self, productos: list[ProductoZap]):
+        self.productos = productos
+        self._por_codigo: dict[str, ProductoZap] = {}
+
+        for producto in productos:
+            sku = producto.get("sku")
+            if sku:
+                self._por_codigo.setdefault(sku, producto)
+
+        # cod_prod es un alias: no pisa un sku existente.
+        for producto in productos:
+            cod_prod = producto.get("cod_prod")
+            if cod_prod:
+                self._por_codigo.setdefault(cod_prod, producto)
+
+    def get(self, codigo: str) -> Optional[ProductoZap]:
+        return self._por_codigo.get(codigo)
+
+    def buscar_muchos(self, codigos: Iterable[str]) -> list[tuple[str, Optional[ProductoZap]]]:
+        por_codigo = self._por_codigo
+        return [(codigo, por_codigo.get(codigo)) for codigo in codigos]
+
+    @staticmethod
+    def codigo(producto: ProductoZap) -> Optional[str]:
+        """Codigo con el que el batch procesa el producto."""
+        return producto.get("cod_prod") or producto.get("sku")
+
+    def items(self) -> Iterator[tuple[str, ProductoZap]]:
+        """Pares (cod_prod, producto) en el orden de ZAP, para el batch."""
+        for producto in self.productos:
+            cod_prod = self.codigo(producto)
+            if cod_prod:
+                yield cod_prod, producto
+
+    def __contains__(self, codigo: str) -> bool:
+        return codigo in self._por_codigo
+
+    def __len__(self) -> int:
+        return len(self.productos)
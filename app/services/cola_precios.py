@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import itertools
+from typing import Awaitable, Callable, Optional
+
+
+class ColaActualizacionPrecios:
+    """Cola diferida de actualizar_precio.
+
+    Cada SKU se programa con un retraso; un worker lo dispara cuando vence,
+    sin bloquear al lote que sigue evaluando y parchando otros productos.
+    Al final del lote se llama a `drenar` para esperar lo pendiente.
+    """
+
+    def __init__(
+        self,
+        actualizar: Callable[[str], Awaitable[dict]],
+        concurrencia: int = 4,
+    ):
+        self._actualizar = actualizar
+        self._semaforo = asyncio.Semaphore(max(concurrencia, 1))
+        self._heap: list[tuple[float, int, str]] = []
+        self._secuencia = itertools.count()
+        self._despertar = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._disparos: dict[asyncio.Task, str] = {}
+        self._cerrando = False
+        self.completadas: list[str] = []
+        self.fallidas: dict[str, str] = {}
+
+    def programar(self, cod_prod: str, retraso: float) -> None:
+        if self._cerrando:
+            raise RuntimeError("La cola de precios ya fue drenada")
+
+        loop = asyncio.get_running_loop()
+        heapq.heappush(
+            self._heap, (loop.time() + max(retraso, 0), next(self._secuencia), cod_prod)
+        )
+        if self._worker is None:
+            self._worker = asyncio.ensure_future(self._ejecutar())
+        self._despertar.set()
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._heap) + len(self._disparos)
+
+    async def _ejecutar(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                if self._cerrando:
+                    return
+                self._despertar.clear()
+                await self._despertar.wait()
+                continue
+
+            vence, _, cod_prod = self._heap[0]
+            espera = vence - loop.time()
+            if espera > 0:
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            disparo = asyncio.ensure_future(self._disparar(cod_prod))
+            self._disparos[disparo] = cod_prod
+            disparo.add_done_callback(self._disparos.pop)
+
+    async def _disparar(self, cod_prod: str) -> None:
+        async with self._semaforo:
+            try:
+                await self._actualizar(cod_prod)
+                self.completadas.append(cod_prod)
+            except Exception as e:
+                self.fallidas[cod_prod] = str(e)
+
+    async def drenar(self, timeout: Optional[float] = None) -> dict:
+        """Espera a que se disparen todas las actualizaciones programadas.
+
+        Lo que no alcanza a ejecutarse antes de `timeout` se cancela y se
+        reporta como pendiente.
+        """
+        self._cerrando = True
+        self._despertar.set()
+
+        # asyncio.wait no cancela al vencer: los disparos en vuelo siguen en
+        # self._disparos y se pueden reportar antes de cancelarlos.
+        loop = asyncio.get_running_loop()
+        limite = None if timeout is None else loop.time() + timeout
+
+        def _restante() -> Optional[float]:
+            return None if limite is None else max(limite - loop.time(), 0)
+
+        vencido = False
+        if self._worker is not None:
+            _, sin_terminar = await asyncio.wait([self._worker], timeout=_restante())
+            vencido = bool(sin_terminar)
+        while not vencido and self._disparos:
+            _, sin_terminar = await asyncio.wait(list(self._disparos), timeout=_restante())
+            vencido = bool(sin_terminar)
+
+        pendientes: list[str] = []
+        if vencido:
+            pendientes = [cod for _, _, cod in sorted(self._heap)]
+            pendientes.extend(self._disparos.values())
+            if self._worker is not None:
+                self._worker.cancel()
+            for disparo in list(self._disparos):
+                disparo.cancel()
+            self._heap.clear()
+
+        return {
+            "completadas": list(self.completadas),
+            "pendientes": pendientes,
+            "fallidas": dict(self.fallidas),
+        }
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from app.config import get_settings
+from app.schemas.descuento_auto import ConfiguracionGeneral, ConfiguracionPatch
+
+try:
+    import fcntl
+except ImportError:  # Windows: el lock queda solo dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SnapshotConfiguracion:
+    """Copia fija de la configuracion para una corrida: un PATCH posterior
+    no cambia los umbrales de una corrida ya iniciada."""
+
+    version: int
+    configuracion: ConfiguracionGeneral
+
+
+class ConfigStore:
+    """ConfiguracionGeneral persistida en un JSON compartido por los workers.
+
+    Cada escritura es atomica (archivo temporal + os.replace) y sube la
+    version. Cada worker guarda una copia y solo relee el archivo cuando
+    cambia su (mtime, tamano), asi que leer la configuracion cuesta un stat.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._firma: Optional[tuple] = None
+        self._snapshot = SnapshotConfiguracion(0, ConfiguracionGeneral())
+
+    def _firma_archivo(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.ruta)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _leer(self) -> SnapshotConfiguracion:
+        with open(self.ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        return SnapshotConfiguracion(
+            version=int(datos.get("version", 0)),
+            configuracion=ConfiguracionGeneral.model_validate(datos["configuracion"]),
+        )
+
+    def _refrescar(self) -> None:
+        firma = self._firma_archivo()
+        if firma == self._firma:
+            return
+        if firma is None:
+            # Sin archivo: valores por defecto (aun no hubo PATCH).
+            self._snapshot = SnapshotConfiguracion(0, ConfiguracionGeneral())
+        else:
+            try:
+                self._snapshot = self._leer()
+            except (OSError, ValueError, KeyError) as e:
+                # Se conserva la ultima copia valida.
+                logger.error(
+                    "No se pudo leer la configuracion",
+                    extra={"ruta": self.ruta, "error": str(e)},
+                )
+                return
+        self._firma = firma
+
+    def snapshot(self) -> SnapshotConfiguracion:
+        with self._lock:
+            self._refrescar()
+            return self._snapshot
+
+    def obtener(self) -> ConfiguracionGeneral:
+        # Copia: quien la reciba puede modificarla sin tocar la del store.
+        return self.snapshot().configuracion.model_copy(deep=True)
+
+    def actualizar(self, updates: ConfiguracionPatch) -> SnapshotConfiguracion:
+        """Aplica un PATCH sobre la version mas reciente en disco (bloqueante:
+        desde async llamar con asyncio.to_thread)."""
+        with self._lock, self._lock_archivo():
+            self._firma = None
+            self._refrescar()
+            actual = self._snapshot.configuracion
+            nueva = ConfiguracionGeneral.model_validate(
+                {**actual.model_dump(), **updates.model_dump(exclude_none=True)}
+            )
+            snapshot = SnapshotConfiguracion(self._snapshot.version + 1, nueva)
+            self._escribir(snapshot)
+            self._snapshot = snapshot
+            self._firma = self._firma_archivo()
+            return snapshot
+
+    def _escribir(self, snapshot: SnapshotConfiguracion) -> None:
+        directorio = os.path.dirname(self.ruta) or "."
+        os.makedirs(directorio, exist_ok=True)
+        contenido = {
+            "version": snapshot.version,
+            "actualizado": datetime.now().isoformat(),
+            "configuracion": snapshot.configuracion.model_dump(mode="json"),
+        }
+        fd, temporal = tempfile.mkstemp(dir=directorio, prefix=".config-", suffix=".tmp")
+        try:
+            os.chmod(temporal, 0o644)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(contenido, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.unlink(temporal)
+            raise
+
+    @contextmanager
+    def _lock_archivo(self):
+        """Serializa las escrituras entre procesos (workers de uvicorn)."""
+        if fcntl is None:
+            yield
+            return
+        directorio = os.path.dirname(self.ruta) or "."
+        os.makedirs(directorio, exist_ok=True)
+        with open(f"{self.ruta}.lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+config_store = ConfigStore(get_settings().CONFIG_PATH)
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from app.config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: la coordinacion queda solo dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RecursoOcupado(Exception):
+    """Otro worker (o esta misma app) ya tiene el lock."""
+
+
+def _abrir_lock(ruta: str) -> int:
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    return os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+class LockArchivo:
+    """flock exclusivo y no bloqueante sobre un archivo.
+
+    El sistema operativo lo libera si el proceso muere, asi que no quedan
+    locks huerfanos. flock es por descriptor: dos LockArchivo sobre la misma
+    ruta se excluyen aun dentro del mismo proceso.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._fd: Optional[int] = None
+
+    @property
+    def tomado(self) -> bool:
+        return self._fd is not None
+
+    def intentar(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = _abrir_lock(self.ruta)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def liberar(self) -> None:
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+class EleccionLider:
+    """Un solo worker corre el scheduler: el que tome el lock de lider.
+
+    Los demas reintentan cada `reintento` segundos y toman el relevo si el
+    lider se cae (el SO libera su flock).
+    """
+
+    def __init__(self, ruta: str, reintento: float = 30.0):
+        self._lock = LockArchivo(ruta)
+        self.reintento = reintento
+        self._tarea: Optional[asyncio.Task] = None
+
+    @property
+    def es_lider(self) -> bool:
+        return self._lock.tomado
+
+    async def iniciar(self, al_ganar: Callable[[], None]) -> None:
+        if self._intentar(al_ganar):
+            return
+        self._tarea = asyncio.ensure_future(self._esperar_turno(al_ganar))
+
+    def _intentar(self, al_ganar: Callable[[], None]) -> bool:
+        if not self._lock.intentar():
+            return False
+        logger.info("Worker elegido lider del scheduler", extra={"pid": os.getpid()})
+        al_ganar()
+        return True
+
+    async def _esperar_turno(self, al_ganar: Callable[[], None]) -> None:
+        while True:
+            await asyncio.sleep(self.reintento)
+            if self._intentar(al_ganar):
+                return
+
+    async def detener(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        self._lock.liberar()
+
+
+class LocksSku:
+    """Exclusion por SKU: asyncio.Lock dentro del proceso + lockf de rango
+    (un byte por slot, crc32 del SKU) entre procesos.
+
+    Los locks de lockf son por proceso, por eso el asyncio.Lock ordena a las
+    tareas locales y un contador evita soltar un slot que otra tarea local
+    (con un SKU que cae en el mismo slot) todavia usa.
+    """
+
+    SLOTS = 1 << 20
+
+    def __init__(self, ruta: str, timeout: float = 30.0, espera: float = 0.05):
+        self.ruta = ruta
+        self.timeout = timeout
+        self.espera = espera
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._usuarios: dict[str, int] = {}
+        self._slots: dict[int, int] = {}
+        self._fd: Optional[int] = None
+
+    def _descriptor(self) -> int:
+        if self._fd is None:
+            self._fd = _abrir_lock(self.ruta)
+        return self._fd
+
+    def _slot(self, cod_prod: str) -> int:
+        return zlib.crc32(cod_prod.encode()) % self.SLOTS
+
+    def _tomar_slot(self, slot: int) -> bool:
+        if self._slots.get(slot):
+            self._slots[slot] += 1
+            return True
+        if fcntl is not None:
+            try:
+                fcntl.lockf(self._descriptor(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+            except OSError:
+                return False
+        self._slots[slot] = 1
+        return True
+
+    def _soltar_slot(self, slot: int) -> None:
+        self._slots[slot] -= 1
+        if self._slots[slot] == 0:
+            del self._slots[slot]
+            if fcntl is not None:
+                fcntl.lockf(self._descriptor(), fcntl.LOCK_UN, 1, slot)
+
+    @asynccontextmanager
+    async def bloquear(self, cod_prod: str):
+        limite = time.monotonic() + self.timeout
+        lock = self._locks.setdefault(cod_prod, asyncio.Lock())
+        self._usuarios[cod_prod] = self._usuarios.get(cod_prod, 0) + 1
+        try:
+            try:
+                await asyncio.wait_for(lock.acquire(), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise RecursoOcupado(f"SKU {cod_prod} en proceso por otra solicitud") from None
+            try:
+                slot = self._slot(cod_prod)
+                # lockf no bloqueante + reintento: no se bloquea el event loop.
+                while not self._tomar_slot(slot):
+                    if time.monotonic() >= limite:
+                        raise RecursoOcupado(f"SKU {cod_prod} en proceso en otro worker")
+                    await asyncio.sleep(self.espera)
+                try:
+                    yield
+                finally:
+                    self._soltar_slot(slot)
+            finally:
+                lock.release()
+        finally:
+            self._usuarios[cod_prod] -= 1
+            if self._usuarios[cod_prod] == 0:
+                del self._usuarios[cod_prod]
+                self._locks.pop(cod_prod, None)
+
+
+_settings = get_settings()
+eleccion_lider = EleccionLider(
+    os.path.join(_settings.LOCKS_DIR, "scheduler.lock"),
+    reintento=_settings.LIDER_REINTENTO_SEGUNDOS,
+)
+lock_corrida_batch = LockArchivo(os.path.join(_settings.LOCKS_DIR, "batch.lock"))
+locks_sku = LocksSku(
+    os.path.join(_settings.LOCKS_DIR, "skus.lock"),
+    timeout=_settings.SKU_LOCK_TIMEOUT,
+)
@@ -1,8 +1,17 @@
+import asyncio
+import uuid
+
 import httpx
-from typing import Optional
+from typing import AsyncIterator, Optional
 
+from app.config import get_settings
 from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
-from app.schemas.respuestas_descuento import RespProcesarProductos
+from app.schemas.respuestas_descuento import DetalleError, RespProcesarProductos
+from app.services.cola_precios import ColaActualizacionPrecios
+from app.services.churn_index import ProductoZap
+from app.services.coordinacion import locks_sku
+from app.services.historial import historial_resultados
+from app.services.logs import cod_prod_var
 from .descuento_helpers import (
     armar_resp_aplicado,
     armar_detalle_error,
@@ -10,12 +19,16 @@ from .descuento_helpers import (
     armar_resp_excluido,
     armar_resp_no_encontrado,
     armar_resp_no_apto,
+    armar_resp_no_apto_prefiltro,
+    armar_resp_planificado,
     build_umbrales,
     buscar_en_zap,
     cargar_producto_avax,
     obtener_config_estado,
 )
+from .descuento_lote import Items, ejecutar_en_paralelo, hasta_cancelar
 from .descuento_logic import DescuentosService
+from .descuento_plan import CambioPlanificado, PlanDescuentos, planes_store
 
 descuentos_service = DescuentosService()
 
@@ -24,66 +37,143 @@ def acumular_resultado_lote(
     resultado: RespProcesarProductos,
     detalle,
     cod_prod: str,
-) -> None:
+    guardar_detalle: bool = True,
+):
+    """Suma el detalle a los contadores del lote y devuelve el detalle
+    registrado. Con guardar_detalle=False solo se actualizan contadores
+    (modo streaming)."""
     status = getattr(detalle, "status", None)
 
-    if status == "aplicado":
+    if isinstance(detalle, DetalleError):
+        resultado.errores += 1
+    elif status == "aplicado":
         resultado.productos_modificados += 1
-        resultado.detalle_resultados.append(detalle)
-        return
-
-    if status in {"no_apto", "error_validacion"}:
+    elif status in {"no_apto", "error_validacion"}:
         resultado.productos_no_aptos += 1
-        resultado.detalle_resultados.append(detalle)
-        return
-
-    if status == "excluido":
+    elif status == "excluido":
         resultado.productos_excluidos += 1
-        resultado.detalle_resultados.append(detalle)
-        return
-
-    if status == "no_encontrado":
+    elif status == "no_encontrado":
         resultado.productos_no_encontrados += 1
-        resultado.detalle_resultados.append(detalle)
-        return
-
-    resultado.errores += 1
-    resultado.detalle_resultados.append(
-        armar_detalle_error(
+    elif status == "planificado":
+        resultado.productos_planificados += 1
+    else:
+        resultado.errores += 1
+        detalle = armar_detalle_error(
             cod_prod=cod_prod,
             error=f"Estado de respuesta no reconocido: {status}",
         )
-    )
+
+    if guardar_detalle:
+        resultado.detalle_resultados.append(detalle)
+    return detalle
 
 # Evalua reglas y devuelve la respuesta final }
 async def procesar_producto_con_contexto(
     cod_prod: str,
-    producto_zap: Optional[dict],
+    producto_zap: Optional[ProductoZap],
     estado_activo: EstadoLogica,
     config_estado: ConfigEstadoLogica,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
 ):
-    from app.services.avax_client import avax_client
+    respuesta = respuesta_sin_avax(cod_prod, producto_zap, estado_activo, config_estado)
+    if respuesta is not None:
+        return respuesta
 
+    if plan is not None:
+        return await evaluar_y_aplicar(
+            cod_prod, producto_zap, estado_activo, config_estado, cola_precios, plan
+        )
+
+    # Un /procesar/{cod_prod} y el batch (aun en otro worker) no leen y
+    # escriben el mismo SKU a la vez.
+    async with locks_sku.bloquear(cod_prod):
+        return await evaluar_y_aplicar(
+            cod_prod, producto_zap, estado_activo, config_estado, cola_precios, plan
+        )
+
+
+def respuesta_sin_avax(
+    cod_prod: str,
+    producto_zap: Optional[ProductoZap],
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+):
+    """Respuesta final si alcanza con ZAP (no encontrado o prefiltro); None
+    si hay que leer AVAX."""
     if not producto_zap:
         return armar_resp_no_encontrado(
             cod_prod=cod_prod,
         )
 
+    # Prefiltro: si ZAP ya descarta ambas rutas, no se lee AVAX.
+    if get_settings().PREFILTRO_ZAP_ACTIVO and not descuentos_service.puede_calificar_por_zap(
+        producto_zap, config_estado
+    ):
+        return armar_resp_no_apto_prefiltro(
+            cod_prod, estado_activo, producto_zap, config_estado
+        )
+    return None
+
+
+async def evaluar_y_aplicar(
+    cod_prod: str,
+    producto_zap: ProductoZap,
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
+):
     producto_avax = await cargar_producto_avax(cod_prod)
+    respuesta, evaluacion = evaluar_sin_escribir(
+        cod_prod, producto_zap, producto_avax, estado_activo, config_estado, plan
+    )
+    if respuesta is not None:
+        return respuesta
+
+    return await aplicar_cambio(
+        cod_prod,
+        estado_activo,
+        config_estado,
+        evaluacion,
+        producto_avax,
+        cola_precios,
+    )
+
+
+def evaluar_sin_escribir(
+    cod_prod: str,
+    producto_zap: ProductoZap,
+    producto_avax: dict,
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    plan: Optional[PlanDescuentos] = None,
+    evaluacion: Optional[dict] = None,
+) -> tuple[Optional[object], Optional[dict]]:
+    """Aplica las reglas con el documento de AVAX ya leido.
+
+    Devuelve (respuesta, None) si no hay que escribir en AVAX (excluido,
+    no apto, error de validacion o planificado) y (None, evaluacion) si hay
+    que aplicar el cambio. `evaluacion` permite pasar la de evaluar_producto
+    ya calculada en lote (ver descuento_vectorizado).
+    """
+    from app.services.avax_client import avax_client
+
     if not producto_avax.get("descuentos_automaticos", False):
         return armar_resp_excluido(
             cod_prod=cod_prod,
             descuentos_automaticos=False,
-        )
+        ), None
 
-    evaluacion = descuentos_service.evaluar_producto(
-        producto_zap, producto_avax, config_estado, estado_activo
-    )
+    if evaluacion is None:
+        evaluacion = descuentos_service.evaluar_producto(
+            producto_zap, producto_avax, config_estado, estado_activo
+        )
 
     if evaluacion["razon"] == "no_cumple_condiciones":
         return armar_resp_no_apto(
             cod_prod, estado_activo, evaluacion, config_estado, producto_avax
-        )
+        ), None
 
     if evaluacion["razon"] == "sin_cambios":
         return armar_resp_no_apto(
@@ -93,18 +183,56 @@ async def procesar_producto_con_contexto(
             config_estado,
             producto_avax,
             mensaje="No hay cambios para aplicar",
-        )
+        ), None
 
     if evaluacion["razon"] == "viola_regla_liquidacion":
         return armar_resp_error_validacion(
             cod_prod, estado_activo, evaluacion, config_estado, producto_avax
+        ), None
+
+    if plan is not None:
+        # Modo plan: se registra el cambio y no se escribe en AVAX.
+        cambios_avax = avax_client.preparar_actualizacion(
+            producto_avax, evaluacion["nuevo_descuento"], evaluacion["nuevo_esq_costo"]
         )
+        respuesta = armar_resp_planificado(
+            plan.plan_id,
+            cod_prod,
+            estado_activo,
+            evaluacion,
+            config_estado,
+            producto_avax,
+            cambios_avax,
+        )
+        plan.agregar(
+            CambioPlanificado(
+                cod_prod=cod_prod,
+                evaluacion=evaluacion,
+                producto_avax=producto_avax,
+                respuesta=respuesta,
+            )
+        )
+        return respuesta, None
+
+    return None, evaluacion
+
+
+async def aplicar_cambio(
+    cod_prod: str,
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    evaluacion: dict,
+    producto_avax: dict,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+):
+    from app.services.avax_client import avax_client
 
     resultado_avax = await avax_client.actualizar_descuento(
         cod_prod=cod_prod,
         nuevo_descuento=evaluacion["nuevo_descuento"],
         nuevo_esq_costo=evaluacion["nuevo_esq_costo"],
         producto_actual=producto_avax,
+        cola_precios=cola_precios,
     )
 
     return armar_resp_aplicado(
@@ -117,74 +245,261 @@ async def procesar_producto_con_contexto(
     )
 
 
-async def procesar_productos(
-    productos: list[str],
-    estado_override: EstadoLogica = None,
-) -> RespProcesarProductos:
+def armar_detalle_excepcion(cod_prod: str, e: Exception):
+    if isinstance(e, httpx.HTTPStatusError):
+        return armar_detalle_error(
+            cod_prod=cod_prod,
+            error=f"AVAX devolvio {e.response.status_code}: {e.response.text}",
+        )
+    if isinstance(e, httpx.RequestError):
+        return armar_detalle_error(
+            cod_prod=cod_prod,
+            error=f"No se pudo conectar con AVAX: {str(e)}",
+        )
+    return armar_detalle_error(
+        cod_prod=cod_prod,
+        error=f"Error procesando producto {cod_prod}: {str(e)}",
+    )
+
+
+async def procesar_producto_seguro(
+    cod_prod: str,
+    producto_zap: Optional[ProductoZap],
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
+):
+    """Igual que procesar_producto_con_contexto, pero los errores del SKU se
+    devuelven como DetalleError para no cortar el lote."""
+    token = cod_prod_var.set(cod_prod)
+    try:
+        return await procesar_producto_con_contexto(
+            cod_prod=cod_prod,
+            producto_zap=producto_zap,
+            estado_activo=estado_activo,
+            config_estado=config_estado,
+            cola_precios=cola_precios,
+            plan=plan,
+        )
+    except Exception as e:
+        return armar_detalle_excepcion(cod_prod, e)
+    finally:
+        cod_prod_var.reset(token)
+
+
+async def procesar_lote(
+    items: Items,
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    concurrencia: Optional[int] = None,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
+    pipeline=None,
+) -> AsyncIterator[tuple[str, object]]:
+    """Procesa pares (cod_prod, producto_zap) en paralelo y entrega
+    (cod_prod, detalle) en el orden de entrada.
+
+    Con `pipeline` (ver descuento_pipeline) lectura, evaluacion y escritura
+    corren en etapas separadas; si no, cada tarea procesa un SKU completo.
+    """
+    if pipeline is not None:
+        async for cod_prod, detalle in pipeline.procesar(items):
+            yield cod_prod, detalle
+        return
+
+    if concurrencia is None:
+        concurrencia = get_settings().BATCH_CONCURRENCIA
+
+    async def _procesar(item: tuple[str, Optional[dict]]):
+        cod_prod, producto_zap = item
+        return await procesar_producto_seguro(
+            cod_prod, producto_zap, estado_activo, config_estado, cola_precios, plan
+        )
+
+    async for (cod_prod, _), detalle in ejecutar_en_paralelo(items, _procesar, concurrencia):
+        yield cod_prod, detalle
+
+
+def crear_pipeline_si_activo(
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
+):
+    if not get_settings().PIPELINE_ACTIVO:
+        return None
+    from .descuento_pipeline import crear_pipeline
+
+    return crear_pipeline(estado_activo, config_estado, cola_precios, plan)
+
+
+def crear_cola_precios() -> ColaActualizacionPrecios:
+    from app.services.avax_client import avax_client
+
+    return ColaActualizacionPrecios(
+        avax_client.actualizar_precio,
+        concurrencia=get_settings().PRECIOS_CONCURRENCIA,
+    )
+
+
+async def drenar_cola_precios(
+    resultado: RespProcesarProductos,
+    cola_precios: ColaActualizacionPrecios,
+) -> None:
+    """Espera las actualizaciones de precio diferidas y las agrega al reporte."""
+    reporte = await cola_precios.drenar(get_settings().PRECIOS_DRENAJE_TIMEOUT)
+    resultado.precios_actualizados = len(reporte["completadas"])
+    resultado.precios_pendientes = reporte["pendientes"]
+    resultado.precios_fallidos = [
+        armar_detalle_error(
+            cod_prod=cod_prod,
+            error=f"actualizar_precio fallo: {error}",
+        )
+        for cod_prod, error in reporte["fallidas"].items()
+    ]
+
+
+def normalizar_codigos(productos: list[str]) -> list[str]:
     codigos = [cod_prod.strip() for cod_prod in productos if cod_prod and cod_prod.strip()]
     if not codigos:
         raise ValueError("Debes enviar al menos un cod_prod valido en 'productos'.")
+    return codigos
+
+
+async def iterar_productos(
+    resultado: RespProcesarProductos,
+    codigos: list[str],
+    estado_override: EstadoLogica = None,
+    modo_plan: bool = False,
+    guardar_detalle: bool = True,
+) -> AsyncIterator[object]:
+    """Procesa una lista de cod_prod entregando cada detalle apenas esta
+    listo; los contadores se acumulan en `resultado`.
 
+    Cada llamada es una corrida propia en el historial (resultado.ejecucion_id).
+    """
     from app.services.zap_client import zap_client
 
-    productos_churn = await zap_client.get_product_churn()
-    churn_por_sku = {
-        p.get("sku"): p
-        for p in productos_churn
-        if p.get("sku")
-    }
+    if resultado.ejecucion_id is None:
+        resultado.ejecucion_id = uuid.uuid4().hex
 
-    estado_activo, config_estado = await obtener_config_estado(estado_override)
-    resultado = RespProcesarProductos(
-        estado_ejecutado=estado_activo.value,
-        umbrales_usados=build_umbrales(config_estado),
-    )
+    indice_churn = await zap_client.get_churn_index()
 
-    for cod_prod in codigos:
-        resultado.productos_evaluados += 1
+    estado_activo, config_estado = await obtener_config_estado(estado_override)
+    resultado.estado_ejecutado = estado_activo.value
+    resultado.umbrales_usados = build_umbrales(config_estado)
+    plan = planes_store.crear(estado_activo, config_estado) if modo_plan else None
+    if plan is not None:
+        resultado.plan_id = plan.plan_id
 
-        try:
-            detalle = await procesar_producto_con_contexto(
-                cod_prod=cod_prod,
-                producto_zap=churn_por_sku.get(cod_prod),
-                estado_activo=estado_activo,
-                config_estado=config_estado,
-            )
-            acumular_resultado_lote(resultado, detalle, cod_prod)
-        except httpx.HTTPStatusError as e:
-            resultado.errores += 1
-            resultado.detalle_resultados.append(
-                armar_detalle_error(
-                    cod_prod=cod_prod,
-                    error=f"AVAX devolvio {e.response.status_code}: {e.response.text}",
-                )
-            )
-        except httpx.RequestError as e:
-            resultado.errores += 1
-            resultado.detalle_resultados.append(
-                armar_detalle_error(
-                    cod_prod=cod_prod,
-                    error=f"No se pudo conectar con AVAX: {str(e)}",
-                )
-            )
-        except Exception as e:
-            resultado.errores += 1
-            resultado.detalle_resultados.append(
-                armar_detalle_error(
-                    cod_prod=cod_prod,
-                    error=f"Error procesando producto {cod_prod}: {str(e)}",
-                )
+    items = indice_churn.buscar_muchos(codigos)
+    cola_precios = crear_cola_precios()
+    pipeline = crear_pipeline_si_activo(estado_activo, config_estado, cola_precios, plan)
+    try:
+        async for cod_prod, detalle in procesar_lote(
+            items,
+            estado_activo,
+            config_estado,
+            cola_precios=cola_precios,
+            plan=plan,
+            pipeline=pipeline,
+        ):
+            resultado.productos_evaluados += 1
+            detalle = acumular_resultado_lote(resultado, detalle, cod_prod, guardar_detalle)
+            historial_resultados.registrar(
+                detalle, resultado.ejecucion_id, tipo="productos", modo_plan=modo_plan
             )
+            yield detalle
+    finally:
+        if pipeline is not None:
+            resultado.etapas = pipeline.stats()
+        await drenar_cola_precios(resultado, cola_precios)
+        if plan is not None:
+            await planes_store.guardar(plan)
 
+
+async def procesar_productos(
+    productos: list[str],
+    estado_override: EstadoLogica = None,
+    modo_plan: bool = False,
+    solo_resumen: bool = False,
+) -> RespProcesarProductos:
+    codigos = normalizar_codigos(productos)
+    resultado = RespProcesarProductos()
+    async for _ in iterar_productos(
+        resultado,
+        codigos,
+        estado_override,
+        modo_plan,
+        guardar_detalle=not solo_resumen,
+    ):
+        pass
     return resultado
 
 
-async def procesar_producto(cod_prod: str, estado_override: EstadoLogica = None):
+async def procesar_producto(
+    cod_prod: str,
+    estado_override: EstadoLogica = None,
+    modo_plan: bool = False,
+):
     estado_activo, config_estado = await obtener_config_estado(estado_override)
+    plan = planes_store.crear(estado_activo, config_estado) if modo_plan else None
     producto_zap = await buscar_en_zap(cod_prod)
-    return await procesar_producto_con_contexto(
+    detalle = await procesar_producto_con_contexto(
         cod_prod=cod_prod,
         producto_zap=producto_zap,
         estado_activo=estado_activo,
         config_estado=config_estado,
+        plan=plan,
     )
+    if plan is not None:
+        await planes_store.guardar(plan)
+    historial_resultados.registrar(detalle, tipo="producto", modo_plan=modo_plan)
+    return detalle
+
+
+def iterar_plan(plan: PlanDescuentos):
+    """Corrida (para GestorEjecuciones) que aplica exactamente los cambios
+    de un plan: solo escrituras en AVAX, con el documento y la evaluacion
+    guardados al planificar."""
+
+    async def _iterar(
+        resultado: RespProcesarProductos,
+        modo_plan: bool = False,
+        guardar_detalle: bool = True,
+        cancelacion: Optional[asyncio.Event] = None,
+    ) -> AsyncIterator[object]:
+        resultado.estado_ejecutado = plan.estado_activo.value
+        resultado.umbrales_usados = build_umbrales(plan.config_estado)
+        resultado.plan_id = plan.plan_id
+        cola_precios = crear_cola_precios()
+
+        async def _aplicar(cambio: CambioPlanificado):
+            try:
+                async with locks_sku.bloquear(cambio.cod_prod):
+                    return await aplicar_cambio(
+                        cambio.cod_prod,
+                        plan.estado_activo,
+                        plan.config_estado,
+                        cambio.evaluacion,
+                        cambio.producto_avax,
+                        cola_precios,
+                    )
+            except Exception as e:
+                return armar_detalle_excepcion(cambio.cod_prod, e)
+
+        try:
+            async for cambio, detalle in ejecutar_en_paralelo(
+                hasta_cancelar(list(plan.cambios.values()), cancelacion),
+                _aplicar,
+                get_settings().BATCH_CONCURRENCIA,
+            ):
+                resultado.productos_evaluados += 1
+                yield acumular_resultado_lote(
+                    resultado, detalle, cambio.cod_prod, guardar_detalle
+                )
+        finally:
+            await drenar_cola_precios(resultado, cola_precios)
+
+    return _iterar
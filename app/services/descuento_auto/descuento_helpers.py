@@ -10,8 +10,10 @@ from app.schemas.respuestas_descuento import (
     RespExcluido,
     RespNoApto,
     RespNoEncontrado,
+    RespPlanificado,
     Umbrales,
 )
+from app.services.churn_index import ProductoZap
 
 
 def build_umbrales(config_estado: ConfigEstadoLogica) -> Umbrales:
@@ -84,6 +86,33 @@ def armar_resp_no_apto(
     )
 
 
+def armar_resp_no_apto_prefiltro(
+    cod_prod: str,
+    estado_activo: EstadoLogica,
+    producto_zap: ProductoZap,
+    config_estado: ConfigEstadoLogica,
+) -> RespNoApto:
+    from .descuento_logic import DescuentosService
+
+    return RespNoApto(
+        cod_prod=cod_prod,
+        estado_usado=estado_activo.value,
+        ruta_evaluada="prefiltro_zap",
+        umbrales_usados=build_umbrales(config_estado),
+        datos_zap=DatosZap(
+            last_import_age_max=producto_zap.get("last_import_age_max") or 0,
+            days_since_last_sale_min=DescuentosService.formatear_days_since_sale(
+                producto_zap.get("days_since_last_sale_min")
+            ),
+        ),
+        datos_avax=DatosAvax(),
+        mensaje=(
+            "Descartado con datos de ZAP: dias sin venta no superan "
+            f"{config_estado.days_since_last_sale_min}"
+        ),
+    )
+
+
 def armar_resp_error_validacion(
     cod_prod: str,
     estado_activo: EstadoLogica,
@@ -124,6 +153,7 @@ def armar_resp_aplicado(
         categoria_liquidacion_agregada=resultado_avax.get(
             "categoria_liquidacion_agregada", False
         ),
+        actualizacion_precio=resultado_avax.get("actualizacion_precio"),
         datos_zap=DatosZap(
             last_import_age_max=evaluacion["last_import"],
             days_since_last_sale_min=evaluacion["days_since_sale"],
@@ -140,6 +170,43 @@ def armar_resp_aplicado(
     )
 
 
+def armar_resp_planificado(
+    plan_id: str,
+    cod_prod: str,
+    estado_activo: EstadoLogica,
+    evaluacion: dict,
+    config_estado: ConfigEstadoLogica,
+    producto_avax: dict,
+    cambios_avax: dict,
+) -> RespPlanificado:
+    return RespPlanificado(
+        plan_id=plan_id,
+        cod_prod=cod_prod,
+        estado_usado=estado_activo.value,
+        ruta_usada=evaluacion["ruta_usada"],
+        umbrales_usados=build_umbrales(config_estado),
+        descuento_actual=evaluacion["id_descuento_actual"],
+        nuevo_descuento=evaluacion["nuevo_descuento"],
+        esq_costo_actual=evaluacion["id_esq_costo_actual"],
+        nuevo_esq_costo=evaluacion["nuevo_esq_costo"],
+        agregaria_categoria_liquidacion=cambios_avax["categoria_agregada"],
+        actualizaria_precio=cambios_avax["actualiza_precio"],
+        datos_zap=DatosZap(
+            last_import_age_max=evaluacion["last_import"],
+            days_since_last_sale_min=evaluacion["days_since_sale"],
+        ),
+        datos_avax=DatosAvax(
+            ult_actualizacion_descuento=str(evaluacion["ult_actualizacion"])
+            if evaluacion["ult_actualizacion"]
+            else None,
+            dias_desde_modificacion=evaluacion["dias_desde_mod"],
+            descuentos_automaticos=producto_avax.get("descuentos_automaticos"),
+            esq_costo_actual=evaluacion["id_esq_costo_actual"],
+        ),
+        mensaje="Cambio planificado (sin escribir en AVAX)",
+    )
+
+
 async def obtener_config_estado(estado_override: EstadoLogica):
     from app.routes.descuento_auto_routes import get_configuracion_actual
 
@@ -152,8 +219,8 @@ async def obtener_config_estado(estado_override: EstadoLogica):
 async def buscar_en_zap(cod_prod: str):
     from app.services.zap_client import zap_client
 
-    productos_churn = await zap_client.get_product_churn()
-    return next((p for p in productos_churn if p.get("sku") == cod_prod), None)
+    indice = await zap_client.get_churn_index()
+    return indice.get(cod_prod)
 
 
 async def cargar_producto_avax(cod_prod: str):
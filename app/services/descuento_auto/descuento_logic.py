@@ -1,5 +1,6 @@
 from datetime import date, datetime
 from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.services.churn_index import ProductoZap
 
 
 class DescuentosService:
@@ -39,9 +40,10 @@ class DescuentosService:
 
     @staticmethod
     def debe_subir_descuento_last_import(
-        producto: dict,
+        producto: ProductoZap,
         config: ConfigEstadoLogica,
         ult_actualizacion_descuento: date = None,
+        hoy: date = None,
     ) -> bool:
         last_import_age = producto.get("last_import_age_max", 0) or 0
         cumple_last_import = last_import_age > config.last_import_age_max
@@ -50,23 +52,41 @@ class DescuentosService:
 
         # Ruta 1 tambien exige filtros de fechas (igual que ruta 2).
         return DescuentosService.debe_subir_descuento_normal(
-            producto, config, ult_actualizacion_descuento
+            producto, config, ult_actualizacion_descuento, hoy
+        )
+
+    @staticmethod
+    def dias_sin_venta_efectivos(producto: ProductoZap):
+        days_since_sale = producto.get("days_since_last_sale_min")
+        # Solo para ruta 2: si no hay ventas reportadas, usar last_import_age_max.
+        if days_since_sale is None or days_since_sale == 0:
+            days_since_sale = producto.get("last_import_age_max", 0) or 0
+        return days_since_sale
+
+    @staticmethod
+    def puede_calificar_por_zap(producto_zap: ProductoZap, config: ConfigEstadoLogica) -> bool:
+        """Chequeo previo solo con datos de ZAP (sin leer AVAX).
+
+        Ruta 1 exige los mismos filtros que ruta 2, y ruta 2 exige
+        dias sin venta efectivos > days_since_last_sale_min: si eso no se
+        cumple, el producto no puede calificar por ninguna ruta.
+        """
+        return (
+            DescuentosService.dias_sin_venta_efectivos(producto_zap)
+            > config.days_since_last_sale_min
         )
 
     @staticmethod
     def debe_subir_descuento_normal(
-        producto: dict,
+        producto: ProductoZap,
         config: ConfigEstadoLogica,
         ult_actualizacion_descuento: date = None,
+        hoy: date = None,
     ) -> bool:
-        days_since_sale = producto.get("days_since_last_sale_min")
-        last_import_age = producto.get("last_import_age_max", 0) or 0
-        # Solo para ruta 2: si no hay ventas reportadas, usar last_import_age_max.
-        if days_since_sale is None or days_since_sale == 0:
-            days_since_sale = last_import_age
+        days_since_sale = DescuentosService.dias_sin_venta_efectivos(producto)
         # Si no hay fecha de ultima actualizacion, se considera 0 dias.
         if ult_actualizacion_descuento:
-            dias_desde_modificacion = (date.today() - ult_actualizacion_descuento).days
+            dias_desde_modificacion = ((hoy or date.today()) - ult_actualizacion_descuento).days
         else:
             dias_desde_modificacion = 0
         cumple_days_sale = days_since_sale > config.days_since_last_sale_min
@@ -121,10 +141,10 @@ class DescuentosService:
         return None
 
     @staticmethod
-    def calcular_dias_desde_modificacion(ult_actualizacion: date) -> int:
+    def calcular_dias_desde_modificacion(ult_actualizacion: date, hoy: date = None) -> int:
         if not ult_actualizacion:
             return 0
-        return (date.today() - ult_actualizacion).days
+        return ((hoy or date.today()) - ult_actualizacion).days
 
     @staticmethod
     def formatear_days_since_sale(days_since_sale) -> str:
@@ -134,16 +154,18 @@ class DescuentosService:
 
     @staticmethod
     def evaluar_producto(
-        producto_zap: dict,
+        producto_zap: ProductoZap,
         producto_avax: dict,
         config_estado: ConfigEstadoLogica,
         estado_logica: EstadoLogica,
+        hoy: date = None,
     ) -> dict:
+        hoy = hoy or date.today()
         id_descuento_actual = producto_avax.get("id_descuento", "Sin descuento")
         id_esq_costo_actual = producto_avax.get("id_esq_costo", "")
         ult_actualizacion_str = producto_avax.get("ult_actualizacion_descuento_automatico")
         ult_actualizacion = DescuentosService.parse_fecha_modificacion(ult_actualizacion_str)
-        dias_desde_mod = DescuentosService.calcular_dias_desde_modificacion(ult_actualizacion)
+        dias_desde_mod = DescuentosService.calcular_dias_desde_modificacion(ult_actualizacion, hoy)
         last_import = producto_zap.get("last_import_age_max") or 0
         days_since_sale = producto_zap.get("days_since_last_sale_min")
         days_since_sale_display = DescuentosService.formatear_days_since_sale(days_since_sale)
@@ -160,12 +182,12 @@ class DescuentosService:
             "razon": None,
             "ruta_usada": None,
         }
-        cumple_ruta1 = DescuentosService.debe_subir_descuento_last_import(
-            producto_zap, config_estado, ult_actualizacion
-        )
+        # Ruta 1 = last_import + los mismos filtros de ruta 2: se evalua ruta 2 una sola vez.
         cumple_ruta2 = DescuentosService.debe_subir_descuento_normal(
-            producto_zap, config_estado, ult_actualizacion
+            producto_zap, config_estado, ult_actualizacion, hoy
         )
+        last_import_age = producto_zap.get("last_import_age_max", 0) or 0
+        cumple_ruta1 = cumple_ruta2 and last_import_age > config_estado.last_import_age_max
 
         # Si el producto ya esta en esquema LIQ y no cumple last_import (ruta 1),
         # no debe seguir avanzando por ruta 2.
@@ -0,0 +1,72 @@
+import asyncio
+from collections import deque
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+Items = Union[Iterable[T], AsyncIterable[T]]
+
+
+async def iterar_items(items: Items) -> AsyncIterator[T]:
+    """Recorre igual un iterable comun o uno async (ej. churn en streaming)."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def ejecutar_en_paralelo(
+    items: Items,
+    funcion: Callable[[T], Awaitable[R]],
+    concurrencia: int,
+) -> AsyncIterator[tuple[T, R]]:
+    """Ejecuta `funcion` sobre cada item con a lo sumo `concurrencia` llamadas
+    en vuelo y entrega los resultados en el mismo orden de entrada."""
+    concurrencia = max(concurrencia, 1)
+    semaforo = asyncio.Semaphore(concurrencia)
+    # Ventana mayor que la concurrencia para que un SKU lento al frente no
+    # deje ociosos a los demas workers mientras se espera su resultado.
+    ventana = concurrencia * 4
+    pendientes: deque = deque()
+
+    async def _limitada(item: T) -> R:
+        async with semaforo:
+            return await funcion(item)
+
+    try:
+        async for item in iterar_items(items):
+            pendientes.append((item, asyncio.ensure_future(_limitada(item))))
+            if len(pendientes) >= ventana:
+                item_listo, tarea = pendientes.popleft()
+                yield item_listo, await tarea
+
+        while pendientes:
+            item_listo, tarea = pendientes.popleft()
+            yield item_listo, await tarea
+    finally:
+        for _, tarea in pendientes:
+            tarea.cancel()
+
+
+async def hasta_cancelar(
+    items: Items,
+    cancelacion: Optional[asyncio.Event],
+) -> AsyncIterator[T]:
+    """Deja de entregar items cuando se pide cancelar; lo que ya esta en
+    vuelo termina normalmente (cancelacion cooperativa)."""
+    async for item in iterar_items(items):
+        if cancelacion is not None and cancelacion.is_set():
+            return
+        yield item
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.config import get_settings
+from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.schemas.respuestas_descuento import EstadisticasEtapa
+from app.services import metricas
+from app.services.churn_index import ProductoZap
+from app.services.cola_precios import ColaActualizacionPrecios
+from app.services.coordinacion import locks_sku
+from app.services.logs import cod_prod_var
+from .descuento_auto import (
+    aplicar_cambio,
+    armar_detalle_excepcion,
+    evaluar_sin_escribir,
+    respuesta_sin_avax,
+)
+from .descuento_helpers import cargar_producto_avax
+from .descuento_lote import Items, iterar_items
+from .descuento_plan import PlanDescuentos
+from .descuento_vectorizado import evaluar_catalogo
+
+logger = logging.getLogger(__name__)
+
+
+class TrabajoSku:
+    """Un SKU mientras recorre las etapas del pipeline."""
+
+    __slots__ = (
+        "cod_prod",
+        "producto_zap",
+        "producto_avax",
+        "evaluacion",
+        "detalle",
+        "lock",
+        "listo",
+        "inicio",
+    )
+
+    def __init__(self, cod_prod: str, producto_zap: Optional[ProductoZap]):
+        self.cod_prod = cod_prod
+        self.producto_zap = producto_zap
+        self.producto_avax: Optional[dict] = None
+        self.evaluacion: Optional[dict] = None
+        self.detalle = None
+        # Lock del SKU: se toma al leer AVAX y se suelta al terminar.
+        self.lock: Optional[AsyncExitStack] = None
+        self.listo: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.inicio = time.perf_counter()
+
+
+class EtapaPipeline:
+    """`workers` tareas que toman SKUs de una cola acotada: si la cola esta
+    llena, la etapa anterior espera (backpressure)."""
+
+    def __init__(
+        self,
+        nombre: str,
+        funcion: Callable[[TrabajoSku], Awaitable[bool]],
+        workers: int,
+        capacidad: int,
+        preparar: Optional[Callable[[list[TrabajoSku]], None]] = None,
+    ):
+        self.nombre = nombre
+        # funcion(trabajo) -> True si el SKU sigue a la etapa siguiente
+        self.funcion = funcion
+        # preparar(trabajos): trabajo comun a los SKUs que un worker toma
+        # juntos (todos los que esperan en la cola) antes de `funcion`.
+        self.preparar = preparar
+        self.workers = max(workers, 1)
+        self.cola: asyncio.Queue = asyncio.Queue(max(capacidad, 1))
+        self.siguiente: Optional["EtapaPipeline"] = None
+        self.ocupados = 0
+        self.procesados = 0
+        self.tiempo_ocupado = 0.0
+
+    async def encolar(self, trabajo: TrabajoSku) -> None:
+        await self.cola.put(trabajo)
+        metricas.PIPELINE_EN_COLA.labels(self.nombre).inc()
+
+    async def tomar(self) -> TrabajoSku:
+        trabajo = await self.cola.get()
+        metricas.PIPELINE_EN_COLA.labels(self.nombre).dec()
+        return trabajo
+
+    async def tomar_lote(self) -> list[TrabajoSku]:
+        trabajos = [await self.tomar()]
+        if self.preparar is not None:
+            while not self.cola.empty():
+                trabajos.append(self.cola.get_nowait())
+                metricas.PIPELINE_EN_COLA.labels(self.nombre).dec()
+        return trabajos
+
+    def stats(self, transcurrido: float) -> EstadisticasEtapa:
+        return EstadisticasEtapa(
+            workers=self.workers,
+            capacidad_cola=self.cola.maxsize,
+            en_cola=self.cola.qsize(),
+            ocupados=self.ocupados,
+            procesados=self.procesados,
+            throughput_por_segundo=round(self.procesados / transcurrido, 2)
+            if transcurrido > 0
+            else 0.0,
+            utilizacion=round(self.tiempo_ocupado / (transcurrido * self.workers), 3)
+            if transcurrido > 0
+            else 0.0,
+        )
+
+
+class PipelineDescuentos:
+    """Batch en etapas: lectura AVAX -> evaluacion -> escritura AVAX.
+
+    Cada etapa tiene sus propios workers, asi las lecturas de los SKUs que
+    siguen se solapan con las escrituras de los anteriores. Los SKUs que se
+    resuelven antes (no encontrado, prefiltro, excluido, no apto, plan) no
+    pasan por las etapas siguientes.
+    """
+
+    def __init__(
+        self,
+        estado_activo: EstadoLogica,
+        config_estado: ConfigEstadoLogica,
+        cola_precios: Optional[ColaActualizacionPrecios] = None,
+        plan: Optional[PlanDescuentos] = None,
+        lectores: int = 8,
+        evaluadores: int = 1,
+        escritores: int = 4,
+        capacidad_cola: int = 32,
+        lote_vectorizado: int = 256,
+    ):
+        self.estado_activo = estado_activo
+        self.config_estado = config_estado
+        self.cola_precios = cola_precios
+        self.plan = plan
+        self.lote_vectorizado = lote_vectorizado
+        self.etapas = [
+            EtapaPipeline("lectura", self._leer, lectores, capacidad_cola),
+            EtapaPipeline(
+                "evaluacion",
+                self._evaluar,
+                evaluadores,
+                capacidad_cola,
+                preparar=self._evaluar_en_lote,
+            ),
+            EtapaPipeline("escritura", self._escribir, escritores, capacidad_cola),
+        ]
+        for etapa, siguiente in zip(self.etapas, self.etapas[1:]):
+            etapa.siguiente = siguiente
+        # SKUs en vuelo: alcanza para llenar todas las colas y workers.
+        self.ventana = sum(e.workers + e.cola.maxsize for e in self.etapas)
+        self._inicio: Optional[float] = None
+        self._detenido = False
+
+    async def _leer(self, trabajo: TrabajoSku) -> bool:
+        trabajo.detalle = respuesta_sin_avax(
+            trabajo.cod_prod, trabajo.producto_zap, self.estado_activo, self.config_estado
+        )
+        if trabajo.detalle is not None:
+            return False
+
+        if self.plan is None:
+            # Mismo lock que procesar_producto_con_contexto, pero abarca las
+            # tres etapas: se suelta al terminar el SKU.
+            lock = AsyncExitStack()
+            await lock.enter_async_context(locks_sku.bloquear(trabajo.cod_prod))
+            trabajo.lock = lock
+        trabajo.producto_avax = await cargar_producto_avax(trabajo.cod_prod)
+        return True
+
+    def _evaluar_en_lote(self, trabajos: list[TrabajoSku]) -> None:
+        """Con suficientes SKUs juntos, la evaluacion de las reglas se hace
+        vectorizada y _evaluar solo arma la respuesta."""
+        aptos = [
+            t for t in trabajos if t.producto_avax.get("descuentos_automaticos", False)
+        ]
+        if len(aptos) < self.lote_vectorizado:
+            return
+        evaluaciones = evaluar_catalogo(
+            [t.producto_zap for t in aptos],
+            [t.producto_avax for t in aptos],
+            self.config_estado,
+            self.estado_activo,
+        )
+        for trabajo, evaluacion in zip(aptos, evaluaciones):
+            trabajo.evaluacion = evaluacion
+
+    async def _evaluar(self, trabajo: TrabajoSku) -> bool:
+        trabajo.detalle, trabajo.evaluacion = evaluar_sin_escribir(
+            trabajo.cod_prod,
+            trabajo.producto_zap,
+            trabajo.producto_avax,
+            self.estado_activo,
+            self.config_estado,
+            self.plan,
+            evaluacion=trabajo.evaluacion,
+        )
+        return trabajo.detalle is None
+
+    async def _escribir(self, trabajo: TrabajoSku) -> bool:
+        trabajo.detalle = await aplicar_cambio(
+            trabajo.cod_prod,
+            self.estado_activo,
+            self.config_estado,
+            trabajo.evaluacion,
+            trabajo.producto_avax,
+            self.cola_precios,
+        )
+        return False
+
+    async def _worker(self, etapa: EtapaPipeline) -> None:
+        while not self._detenido:
+            trabajos = await etapa.tomar_lote()
+            if etapa.preparar is not None:
+                try:
+                    etapa.preparar(trabajos)
+                except Exception:
+                    # Cada SKU se procesa igual por su cuenta.
+                    logger.exception("Error preparando lote", extra={"etapa": etapa.nombre})
+            for trabajo in trabajos:
+                etapa.ocupados += 1
+                metricas.PIPELINE_OCUPADOS.labels(etapa.nombre).inc()
+                inicio = time.perf_counter()
+                token = cod_prod_var.set(trabajo.cod_prod)
+                try:
+                    sigue = await etapa.funcion(trabajo)
+                except Exception as e:
+                    # Los errores del SKU se devuelven como DetalleError.
+                    trabajo.detalle = armar_detalle_excepcion(trabajo.cod_prod, e)
+                    sigue = False
+                finally:
+                    cod_prod_var.reset(token)
+                    etapa.ocupados -= 1
+                    etapa.tiempo_ocupado += time.perf_counter() - inicio
+                    metricas.PIPELINE_OCUPADOS.labels(etapa.nombre).dec()
+                if self._detenido:
+                    # Algunas librerias convierten la cancelacion en otra excepcion.
+                    return
+                etapa.procesados += 1
+                metricas.PIPELINE_PROCESADOS.labels(etapa.nombre).inc()
+
+                if sigue:
+                    await etapa.siguiente.encolar(trabajo)
+                else:
+                    await self._terminar(trabajo)
+
+    async def _terminar(self, trabajo: TrabajoSku) -> None:
+        await self._soltar_lock(trabajo)
+        if not trabajo.listo.done():
+            trabajo.listo.set_result(trabajo.detalle)
+
+    @staticmethod
+    async def _soltar_lock(trabajo: TrabajoSku) -> None:
+        if trabajo.lock is not None:
+            lock, trabajo.lock = trabajo.lock, None
+            await lock.aclose()
+
+    async def procesar(self, items: Items) -> AsyncIterator[tuple[str, object]]:
+        """Entrega (cod_prod, detalle) en el orden de entrada."""
+        self._inicio = time.perf_counter()
+        self._detenido = False
+        tareas = [
+            asyncio.ensure_future(self._worker(etapa))
+            for etapa in self.etapas
+            for _ in range(etapa.workers)
+        ]
+        pendientes: deque[TrabajoSku] = deque()
+        try:
+            async for cod_prod, producto_zap in iterar_items(items):
+                trabajo = TrabajoSku(cod_prod, producto_zap)
+                await self.etapas[0].encolar(trabajo)
+                pendientes.append(trabajo)
+                if len(pendientes) >= self.ventana:
+                    trabajo = pendientes.popleft()
+                    yield trabajo.cod_prod, await trabajo.listo
+
+            while pendientes:
+                trabajo = pendientes.popleft()
+                yield trabajo.cod_prod, await trabajo.listo
+        finally:
+            self._detenido = True
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            # SKUs abandonados a mitad de camino (ej. el consumidor corto).
+            for trabajo in pendientes:
+                await self._soltar_lock(trabajo)
+            for etapa in self.etapas:
+                metricas.PIPELINE_EN_COLA.labels(etapa.nombre).dec(etapa.cola.qsize())
+
+    def stats(self) -> dict[str, EstadisticasEtapa]:
+        transcurrido = time.perf_counter() - self._inicio if self._inicio else 0.0
+        return {etapa.nombre: etapa.stats(transcurrido) for etapa in self.etapas}
+
+
+def crear_pipeline(
+    estado_activo: EstadoLogica,
+    config_estado: ConfigEstadoLogica,
+    cola_precios: Optional[ColaActualizacionPrecios] = None,
+    plan: Optional[PlanDescuentos] = None,
+) -> PipelineDescuentos:
+    settings = get_settings()
+    return PipelineDescuentos(
+        estado_activo,
+        config_estado,
+        cola_precios=cola_precios,
+        plan=plan,
+        lectores=settings.PIPELINE_LECTORES,
+        evaluadores=settings.PIPELINE_EVALUADORES,
+        escritores=settings.PIPELINE_ESCRITORES,
+        capacidad_cola=settings.PIPELINE_COLA,
+        lote_vectorizado=settings.PIPELINE_LOTE_VECTORIZADO,
+    )
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional
+
+from app.config import get_settings
+from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.schemas.respuestas_descuento import RespPlan, RespPlanificado
+from app.services.sqlite_util import abrir_sqlite
+from .descuento_helpers import build_umbrales
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS planes (
+    plan_id TEXT PRIMARY KEY,
+    creado TEXT NOT NULL,
+    estado_activo TEXT NOT NULL,
+    config_estado TEXT NOT NULL,
+    ejecutado INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cambios (
+    plan_id TEXT NOT NULL,
+    cod_prod TEXT NOT NULL,
+    evaluacion TEXT NOT NULL,
+    producto_avax TEXT NOT NULL,
+    respuesta TEXT NOT NULL,
+    PRIMARY KEY (plan_id, cod_prod)
+);
+"""
+
+
+@dataclass
+class CambioPlanificado:
+    cod_prod: str
+    evaluacion: dict
+    producto_avax: dict
+    respuesta: RespPlanificado
+
+
+@dataclass
+class PlanDescuentos:
+    """Cambios evaluados en modo plan, listos para ejecutarse tal cual.
+
+    Guarda el documento AVAX leido al planificar para que la ejecucion
+    solo escriba (sin volver a leer ni a evaluar).
+    """
+
+    estado_activo: EstadoLogica
+    config_estado: ConfigEstadoLogica
+    plan_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    creado: datetime = field(default_factory=datetime.now)
+    cambios: dict[str, CambioPlanificado] = field(default_factory=dict)
+    ejecutado: bool = False
+    # Completo y en disco (visible para los demas workers)
+    guardado: bool = False
+
+    def agregar(self, cambio: CambioPlanificado) -> None:
+        self.cambios[cambio.cod_prod] = cambio
+
+    def resumen(self) -> RespPlan:
+        return RespPlan(
+            plan_id=self.plan_id,
+            creado=self.creado.isoformat(),
+            estado_usado=self.estado_activo.value,
+            umbrales_usados=build_umbrales(self.config_estado),
+            ejecutado=self.ejecutado,
+            total_cambios=len(self.cambios),
+            cambios=[cambio.respuesta for cambio in self.cambios.values()],
+        )
+
+
+def _evaluacion_json(evaluacion: dict) -> str:
+    return json.dumps(evaluacion, default=date.isoformat)
+
+
+def _evaluacion_desde_json(texto: str) -> dict:
+    evaluacion = json.loads(texto)
+    if evaluacion.get("ult_actualizacion"):
+        evaluacion["ult_actualizacion"] = date.fromisoformat(evaluacion["ult_actualizacion"])
+    return evaluacion
+
+
+class PlanesStore:
+    """Ultimos planes generados: LRU en memoria y SQLite compartido.
+
+    Un plan se guarda en disco cuando termina de generarse; desde ahi
+    cualquier worker lo puede ver y ejecutar, y marcar_ejecutado() es
+    atomico entre workers.
+    """
+
+    def __init__(self, ruta: str, max_planes: int):
+        self.ruta = ruta
+        self.max_planes = max_planes
+        self._planes: OrderedDict[str, PlanDescuentos] = OrderedDict()
+        self._conexion = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conexion is None:
+            self._conexion = abrir_sqlite(self.ruta)
+            self._conexion.executescript(_ESQUEMA)
+        return self._conexion
+
+    async def _en_hilo(self, funcion, *args):
+        def _ejecutar():
+            with self._lock:
+                return funcion(self._db(), *args)
+
+        return await asyncio.to_thread(_ejecutar)
+
+    def _recordar(self, plan: PlanDescuentos) -> None:
+        self._planes[plan.plan_id] = plan
+        self._planes.move_to_end(plan.plan_id)
+        while len(self._planes) > self.max_planes:
+            self._planes.popitem(last=False)
+
+    def crear(
+        self,
+        estado_activo: EstadoLogica,
+        config_estado: ConfigEstadoLogica,
+    ) -> PlanDescuentos:
+        plan = PlanDescuentos(estado_activo=estado_activo, config_estado=config_estado)
+        self._recordar(plan)
+        return plan
+
+    async def guardar(self, plan: PlanDescuentos) -> None:
+        """Persiste el plan ya completo y descarta los mas viejos."""
+
+        def _insertar(db, plan, cambios):
+            db.execute("BEGIN")
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO planes VALUES (?, ?, ?, ?, ?)",
+                    (
+                        plan.plan_id,
+                        plan.creado.isoformat(),
+                        plan.estado_activo.value,
+                        plan.config_estado.model_dump_json(),
+                        int(plan.ejecutado),
+                    ),
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO cambios VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            plan.plan_id,
+                            cambio.cod_prod,
+                            _evaluacion_json(cambio.evaluacion),
+                            json.dumps(cambio.producto_avax),
+                            cambio.respuesta.model_dump_json(),
+                        )
+                        for cambio in cambios
+                    ],
+                )
+                viejos = [
+                    fila[0]
+                    for fila in db.execute(
+                        "SELECT plan_id FROM planes ORDER BY creado DESC LIMIT -1 OFFSET ?",
+                        (self.max_planes,),
+                    )
+                ]
+                for plan_id in viejos:
+                    db.execute("DELETE FROM cambios WHERE plan_id = ?", (plan_id,))
+                    db.execute("DELETE FROM planes WHERE plan_id = ?", (plan_id,))
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+        await self._en_hilo(_insertar, plan, list(plan.cambios.values()))
+        plan.guardado = True
+
+    async def obtener(self, plan_id: str) -> Optional[PlanDescuentos]:
+        plan = self._planes.get(plan_id)
+        if plan is not None:
+            if not plan.guardado:
+                return plan
+            ejecutado = await self._en_hilo(_leer_ejecutado, plan_id)
+            if ejecutado is None:
+                # Ya se descarto del disco (quedan los PLANES_MAX mas nuevos).
+                self._planes.pop(plan_id, None)
+                return None
+            plan.ejecutado = ejecutado
+            return plan
+
+        def _leer(db, plan_id):
+            fila = db.execute(
+                "SELECT creado, estado_activo, config_estado, ejecutado "
+                "FROM planes WHERE plan_id = ?",
+                (plan_id,),
+            ).fetchone()
+            if fila is None:
+                return None
+            return fila, db.execute(
+                "SELECT cod_prod, evaluacion, producto_avax, respuesta "
+                "FROM cambios WHERE plan_id = ? ORDER BY rowid",
+                (plan_id,),
+            ).fetchall()
+
+        leido = await self._en_hilo(_leer, plan_id)
+        if leido is None:
+            return None
+        (creado, estado_activo, config_estado, ejecutado), cambios = leido
+        plan = PlanDescuentos(
+            estado_activo=EstadoLogica(estado_activo),
+            config_estado=ConfigEstadoLogica.model_validate_json(config_estado),
+            plan_id=plan_id,
+            creado=datetime.fromisoformat(creado),
+            ejecutado=bool(ejecutado),
+            guardado=True,
+        )
+        for cod_prod, evaluacion, producto_avax, respuesta in cambios:
+            plan.agregar(
+                CambioPlanificado(
+                    cod_prod=cod_prod,
+                    evaluacion=_evaluacion_desde_json(evaluacion),
+                    producto_avax=json.loads(producto_avax),
+                    respuesta=RespPlanificado.model_validate_json(respuesta),
+                )
+            )
+        self._recordar(plan)
+        return plan
+
+    async def marcar_ejecutado(self, plan: PlanDescuentos, ejecutado: bool = True) -> None:
+        """Reserva el plan para una sola ejecucion (o la libera si no se
+        pudo lanzar). Lanza ValueError si ya fue ejecutado o si todavia se
+        esta generando."""
+        if not plan.guardado:
+            raise ValueError(f"El plan {plan.plan_id} todavia se esta generando.")
+
+        def _marcar(db, plan_id, ejecutado):
+            return db.execute(
+                "UPDATE planes SET ejecutado = ? WHERE plan_id = ? AND ejecutado = ?",
+                (int(ejecutado), plan_id, int(not ejecutado)),
+            ).rowcount
+
+        if not await self._en_hilo(_marcar, plan.plan_id, ejecutado) and ejecutado:
+            plan.ejecutado = True
+            raise ValueError(f"El plan {plan.plan_id} ya fue ejecutado.")
+        plan.ejecutado = ejecutado
+
+
+def _leer_ejecutado(db, plan_id: str) -> Optional[bool]:
+    fila = db.execute("SELECT ejecutado FROM planes WHERE plan_id = ?", (plan_id,)).fetchone()
+    return None if fila is None else bool(fila[0])
+
+
+planes_store = PlanesStore(get_settings().PLANES_PATH, get_settings().PLANES_MAX)
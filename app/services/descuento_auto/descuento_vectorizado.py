@@ -0,0 +1,267 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.services.churn_index import ProductoZap
+from .descuento_logic import DescuentosService
+
+ESQ_COSTO_LIQ = ("LIQ_20M", "LIQ_30M")
+
+# Codigos de las columnas de salida
+ESQ_NINGUNO, ESQ_LIQ_20M, ESQ_LIQ_30M = 0, 1, 2
+RUTA_NINGUNA, RUTA_NINGUNA_APTA, RUTA_1, RUTA_2 = 0, 1, 2, 3
+RAZON_ACTUALIZAR, RAZON_NO_CUMPLE, RAZON_VIOLA_LIQ, RAZON_SIN_CAMBIOS = 0, 1, 2, 3
+
+_ESQ_COSTO_POR_CODIGO = (None, "LIQ_20M", "LIQ_30M")
+_RUTA_POR_CODIGO = ("ninguna", "ninguna_ruta_apta", "ruta1_last_import", "ruta2_normal")
+_RAZON_POR_CODIGO = (None, "no_cumple_condiciones", "viola_regla_liquidacion", "sin_cambios")
+
+_NIVELES = DescuentosService.NIVELES_DESCUENTO
+_NIVEL_SIN_DESCUENTO = _NIVELES.index("Sin descuento")
+_NIVEL_PUSH1 = _NIVELES.index("PUSH1")
+# Tabla de obtener_siguiente_nivel indexada por nivel actual.
+_SIGUIENTE_NIVEL = np.array(
+    [_NIVELES.index(DescuentosService.obtener_siguiente_nivel(n)) for n in _NIVELES],
+    dtype=np.int8,
+)
+
+
+@dataclass
+class ColumnasCatalogo:
+    """Entrada columnar del evaluador (una posicion por SKU).
+
+    - last_import_age_max: float64, ya con `or 0` aplicado.
+    - days_since_last_sale_min: float64, NaN cuando ZAP no lo reporta.
+    - ult_actualizacion_ordinal: int64, `date.toordinal()` o -1 sin fecha.
+    - nivel_descuento: int8, indice en NIVELES_DESCUENTO o -1 si es desconocido.
+    - esq_costo_liq: bool, el esquema actual ya es LIQ_20M/LIQ_30M.
+    - esq_costo_destino: int8, esquema LIQ al que pasaria por ruta 1.
+    """
+
+    last_import_age_max: np.ndarray
+    days_since_last_sale_min: np.ndarray
+    ult_actualizacion_ordinal: np.ndarray
+    nivel_descuento: np.ndarray
+    esq_costo_liq: np.ndarray
+    esq_costo_destino: np.ndarray
+
+
+@dataclass
+class EvaluacionColumnar:
+    ruta: np.ndarray
+    razon: np.ndarray
+    nivel_nuevo: np.ndarray
+    esq_costo_nuevo: np.ndarray
+    dias_desde_mod: np.ndarray
+
+    @property
+    def debe_actualizar(self) -> np.ndarray:
+        return self.razon == RAZON_ACTUALIZAR
+
+
+def _codigo_esq_destino(id_esq_costo) -> int:
+    destino = DescuentosService.MAPEO_ESQ_COSTO_LIQUIDACION.get(id_esq_costo) or "LIQ_20M"
+    return ESQ_LIQ_30M if destino == "LIQ_30M" else ESQ_LIQ_20M
+
+
+def _por_valor(valores: list, funcion, dtype) -> np.ndarray:
+    """Aplica `funcion` una vez por valor distinto y reparte el resultado.
+
+    Fechas, niveles y esquemas se repiten mucho en el catalogo: el costo por
+    SKU queda en un lookup en C en vez de una llamada Python.
+    """
+    try:
+        tabla = {valor: funcion(valor) for valor in dict.fromkeys(valores)}
+    except TypeError:
+        # Algun valor no es hashable: se resuelve uno por uno.
+        return np.array([funcion(valor) for valor in valores], dtype=dtype)
+    return np.fromiter(map(tabla.__getitem__, valores), dtype=dtype, count=len(valores))
+
+
+def _ordinal_fecha(valor) -> int:
+    fecha = DescuentosService.parse_fecha_modificacion(valor)
+    return fecha.toordinal() if fecha else -1
+
+
+def armar_columnas(
+    productos_zap: Sequence[ProductoZap],
+    productos_avax: Sequence[dict],
+) -> ColumnasCatalogo:
+    """Convierte documentos ZAP/AVAX alineados por posicion en columnas."""
+    n = len(productos_zap)
+    indice_nivel = {nombre: i for i, nombre in enumerate(_NIVELES)}
+    esq_costo = [avax.get("id_esq_costo", "") for avax in productos_avax]
+
+    return ColumnasCatalogo(
+        last_import_age_max=np.fromiter(
+            (zap.get("last_import_age_max", 0) or 0 for zap in productos_zap),
+            dtype=np.float64,
+            count=n,
+        ),
+        # None -> NaN
+        days_since_last_sale_min=np.array(
+            [zap.get("days_since_last_sale_min") for zap in productos_zap],
+            dtype=np.float64,
+        ).reshape(n),
+        ult_actualizacion_ordinal=_por_valor(
+            [avax.get("ult_actualizacion_descuento_automatico") for avax in productos_avax],
+            _ordinal_fecha,
+            np.int64,
+        ),
+        nivel_descuento=_por_valor(
+            [avax.get("id_descuento", "Sin descuento") for avax in productos_avax],
+            lambda id_descuento: indice_nivel.get(id_descuento, -1),
+            np.int8,
+        ),
+        esq_costo_liq=_por_valor(esq_costo, lambda esq: esq in ESQ_COSTO_LIQ, bool),
+        esq_costo_destino=_por_valor(esq_costo, _codigo_esq_destino, np.int8),
+    )
+
+
+def evaluar_columnas(
+    columnas: ColumnasCatalogo,
+    config_estado: ConfigEstadoLogica,
+    estado_logica: EstadoLogica,
+    hoy: Optional[date] = None,
+) -> EvaluacionColumnar:
+    """Version columnar de DescuentosService.evaluar_producto."""
+    hoy = hoy or date.today()
+    last_import = columnas.last_import_age_max
+    nivel = columnas.nivel_descuento
+    es_liq = columnas.esq_costo_liq
+
+    # Ruta 2: sin ventas reportadas (None/0) se usa last_import_age_max.
+    dias_venta = columnas.days_since_last_sale_min
+    dias_venta = np.where(np.isnan(dias_venta) | (dias_venta == 0), last_import, dias_venta)
+    tiene_fecha = columnas.ult_actualizacion_ordinal >= 0
+    dias_desde_mod = np.where(
+        tiene_fecha, hoy.toordinal() - columnas.ult_actualizacion_ordinal, 0
+    )
+    cumple_ruta2 = (dias_venta > config_estado.days_since_last_sale_min) & (
+        dias_desde_mod > config_estado.ult_modificacion_descuento
+    )
+    cumple_ruta1 = cumple_ruta2 & (last_import > config_estado.last_import_age_max)
+
+    bloqueado_liq = es_liq & ~cumple_ruta1
+    ninguna = ~cumple_ruta2
+    apto = ~bloqueado_liq & ~ninguna
+
+    ruta = np.where(cumple_ruta1, RUTA_1, RUTA_2).astype(np.int8)
+    ruta[ninguna] = RUTA_NINGUNA
+    ruta[bloqueado_liq] = RUTA_NINGUNA_APTA
+
+    esq_costo_nuevo = np.where(
+        cumple_ruta1 & ~es_liq, columnas.esq_costo_destino, ESQ_NINGUNO
+    ).astype(np.int8)
+    queda_en_liq = es_liq | (esq_costo_nuevo != ESQ_NINGUNO)
+    entra_a_liq = queda_en_liq & ~es_liq
+
+    conocido = nivel >= 0
+    siguiente = np.where(conocido, _SIGUIENTE_NIVEL[np.where(conocido, nivel, 0)], nivel)
+    if DescuentosService.obtener_descuento_minimo(estado_logica) == "PUSH1":
+        siguiente = np.where(nivel == _NIVEL_SIN_DESCUENTO, _NIVEL_PUSH1, siguiente)
+    nivel_nuevo = np.where(
+        (ruta == RUTA_1) & entra_a_liq, _NIVEL_PUSH1, siguiente
+    ).astype(np.int8)
+
+    viola_liq = queda_en_liq & (nivel_nuevo == _NIVEL_SIN_DESCUENTO)
+    sin_cambios = (nivel_nuevo == nivel) & (esq_costo_nuevo == ESQ_NINGUNO)
+
+    razon = np.full(len(nivel), RAZON_ACTUALIZAR, dtype=np.int8)
+    razon[apto & sin_cambios] = RAZON_SIN_CAMBIOS
+    razon[apto & viola_liq] = RAZON_VIOLA_LIQ
+    razon[~apto] = RAZON_NO_CUMPLE
+
+    return EvaluacionColumnar(
+        ruta=ruta,
+        razon=razon,
+        nivel_nuevo=nivel_nuevo,
+        esq_costo_nuevo=esq_costo_nuevo,
+        dias_desde_mod=dias_desde_mod,
+    )
+
+
+def evaluar_catalogo(
+    productos_zap: Sequence[ProductoZap],
+    productos_avax: Sequence[dict],
+    config_estado: ConfigEstadoLogica,
+    estado_logica: EstadoLogica,
+    hoy: Optional[date] = None,
+) -> list[dict]:
+    """Evalua todo el catalogo en lote y devuelve los mismos dicts que
+    DescuentosService.evaluar_producto, en el mismo orden."""
+    hoy = hoy or date.today()
+    columnas = armar_columnas(productos_zap, productos_avax)
+    evaluacion = evaluar_columnas(columnas, config_estado, estado_logica, hoy)
+
+    ordinales = columnas.ult_actualizacion_ordinal.tolist()
+    actualizar = evaluacion.debe_actualizar.tolist()
+    razon = [_RAZON_POR_CODIGO[codigo] for codigo in evaluacion.razon.tolist()]
+    ruta = [_RUTA_POR_CODIGO[codigo] for codigo in evaluacion.ruta.tolist()]
+    nivel_nuevo = evaluacion.nivel_nuevo.tolist()
+    esq_nuevo = evaluacion.esq_costo_nuevo.tolist()
+    dias_desde_mod = evaluacion.dias_desde_mod.tolist()
+    # Pocas fechas distintas: cada date se arma una vez.
+    fechas: dict[int, Optional[date]] = {}
+
+    resultados = []
+    for i, (zap, avax) in enumerate(zip(productos_zap, productos_avax)):
+        id_descuento_actual = avax.get("id_descuento", "Sin descuento")
+        if actualizar[i]:
+            nuevo_descuento = (
+                _NIVELES[nivel_nuevo[i]] if nivel_nuevo[i] >= 0 else id_descuento_actual
+            )
+            nuevo_esq_costo = _ESQ_COSTO_POR_CODIGO[esq_nuevo[i]]
+        else:
+            nuevo_descuento = None
+            nuevo_esq_costo = None
+
+        ordinal = ordinales[i]
+        if ordinal not in fechas:
+            fechas[ordinal] = date.fromordinal(ordinal) if ordinal >= 0 else None
+        resultados.append(
+            {
+                "debe_actualizar": actualizar[i],
+                "nuevo_descuento": nuevo_descuento,
+                "nuevo_esq_costo": nuevo_esq_costo,
+                "id_descuento_actual": id_descuento_actual,
+                "id_esq_costo_actual": avax.get("id_esq_costo", ""),
+                "ult_actualizacion": fechas[ordinal],
+                "dias_desde_mod": dias_desde_mod[i],
+                "last_import": zap.get("last_import_age_max") or 0,
+                "days_since_sale": DescuentosService.formatear_days_since_sale(
+                    zap.get("days_since_last_sale_min")
+                ),
+                "razon": razon[i],
+                "ruta_usada": ruta[i],
+            }
+        )
+    return resultados
+
+
+def comparar_con_escalar(
+    productos_zap: Sequence[ProductoZap],
+    productos_avax: Sequence[dict],
+    config_estado: ConfigEstadoLogica,
+    estado_logica: EstadoLogica,
+    hoy: Optional[date] = None,
+) -> list[tuple[int, dict, dict]]:
+    """Devuelve (posicion, escalar, vectorizado) de cada SKU donde ambos
+    caminos difieren. Lista vacia = equivalencia exacta."""
+    hoy = hoy or date.today()
+    vectorizado = evaluar_catalogo(
+        productos_zap, productos_avax, config_estado, estado_logica, hoy
+    )
+    diferencias = []
+    for i, (zap, avax) in enumerate(zip(productos_zap, productos_avax)):
+        escalar = DescuentosService.evaluar_producto(
+            zap, avax, config_estado, estado_logica, hoy
+        )
+        if escalar != vectorizado[i] or any(
+            type(escalar[k]) is not type(vectorizado[i][k]) for k in escalar
+        ):
+            diferencias.append((i, escalar, vectorizado[i]))
+    return diferencias
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional, Union
+
+from app.config import get_settings
+from app.schemas.respuestas_descuento import DetalleError
+from app.services.sqlite_util import abrir_sqlite
+
+logger = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    id INTEGER PRIMARY KEY,
+    fecha TEXT NOT NULL,
+    ejecucion_id TEXT,
+    tipo TEXT NOT NULL,
+    modo_plan INTEGER NOT NULL DEFAULT 0,
+    cod_prod TEXT,
+    status TEXT NOT NULL,
+    estado_usado TEXT,
+    ruta TEXT,
+    descuento_anterior TEXT,
+    descuento_nuevo TEXT,
+    esq_costo_nuevo TEXT,
+    mensaje TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_resultados_sku ON resultados (cod_prod, fecha);
+CREATE INDEX IF NOT EXISTS ix_resultados_ejecucion ON resultados (ejecucion_id, status);
+CREATE INDEX IF NOT EXISTS ix_resultados_status ON resultados (status, fecha);
+CREATE INDEX IF NOT EXISTS ix_resultados_fecha ON resultados (fecha);
+"""
+
+_COLUMNAS = (
+    "fecha",
+    "ejecucion_id",
+    "tipo",
+    "modo_plan",
+    "cod_prod",
+    "status",
+    "estado_usado",
+    "ruta",
+    "descuento_anterior",
+    "descuento_nuevo",
+    "esq_costo_nuevo",
+    "mensaje",
+)
+
+
+def fila_historial(
+    detalle,
+    ejecucion_id: Optional[str],
+    tipo: str,
+    modo_plan: bool,
+) -> tuple:
+    """Columnas de un detalle (RespAplicado, RespNoApto, ..., DetalleError)."""
+    if isinstance(detalle, DetalleError):
+        status, mensaje = "error", detalle.error
+    else:
+        status, mensaje = getattr(detalle, "status", "error"), getattr(detalle, "mensaje", None)
+    # aplicado: anterior -> nuevo; planificado/no_apto: actual (-> nuevo)
+    anterior = getattr(detalle, "descuento_anterior", None) or getattr(
+        detalle, "descuento_actual", None
+    )
+    nuevo = getattr(detalle, "descuento_nuevo", None) or getattr(
+        detalle, "nuevo_descuento", None
+    )
+    esq_costo = getattr(detalle, "esq_costo_nuevo", None) or getattr(
+        detalle, "nuevo_esq_costo", None
+    )
+    return (
+        datetime.now().isoformat(timespec="seconds"),
+        ejecucion_id,
+        tipo,
+        int(modo_plan),
+        detalle.cod_prod,
+        status,
+        getattr(detalle, "estado_usado", None),
+        getattr(detalle, "ruta_usada", None) or getattr(detalle, "ruta_evaluada", None),
+        anterior,
+        nuevo,
+        esq_costo,
+        mensaje,
+    )
+
+
+class HistorialResultados:
+    """Historial local (SQLite) de cada resultado por SKU, con indices por
+    cod_prod, status, ejecucion y fecha.
+
+    registrar() solo encola la fila; una tarea la escribe en lotes desde un
+    hilo, asi el batch no espera al disco.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        retencion_dias: int = 30,
+        lote: int = 500,
+        intervalo: float = 2.0,
+    ):
+        self.ruta = ruta
+        self.retencion_dias = retencion_dias
+        self.lote = lote
+        self.intervalo = intervalo
+        self._conexion = None
+        self._lock = threading.Lock()
+        self._pendientes: list[tuple] = []
+        self._lote_listo: Optional[asyncio.Event] = None
+        self._escritor: Optional[asyncio.Task] = None
+        self._ultima_purga: Optional[date] = None
+
+    def _db(self):
+        if self._conexion is None:
+            self._conexion = abrir_sqlite(self.ruta)
+            self._conexion.executescript(_ESQUEMA)
+        if self._ultima_purga != date.today():
+            self._purgar()
+        return self._conexion
+
+    def _purgar(self) -> None:
+        limite = (datetime.now() - timedelta(days=self.retencion_dias)).isoformat()
+        self._conexion.execute("DELETE FROM resultados WHERE fecha < ?", (limite,))
+        self._ultima_purga = date.today()
+
+    def _ejecutar(self, funcion, *args):
+        with self._lock:
+            return funcion(self._db(), *args)
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.to_thread(self._ejecutar, funcion, *args)
+
+    def registrar(
+        self,
+        detalle,
+        ejecucion_id: Optional[str] = None,
+        tipo: str = "manual",
+        modo_plan: bool = False,
+    ) -> None:
+        self._pendientes.append(fila_historial(detalle, ejecucion_id, tipo, modo_plan))
+        if self._escritor is None or self._escritor.done():
+            self._lote_listo = asyncio.Event()
+            self._escritor = asyncio.ensure_future(self._escribir_periodicamente())
+        if len(self._pendientes) >= self.lote:
+            self._lote_listo.set()
+
+    async def _escribir_periodicamente(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._lote_listo.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._lote_listo.clear()
+            await self.volcar()
+
+    async def volcar(self) -> None:
+        """Escribe ya lo pendiente (las consultas lo llaman antes de leer)."""
+        if not self._pendientes:
+            return
+        filas, self._pendientes = self._pendientes, []
+
+        def _insertar(db, filas):
+            marcadores = ", ".join("?" for _ in _COLUMNAS)
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    f"INSERT INTO resultados ({', '.join(_COLUMNAS)}) VALUES ({marcadores})",
+                    filas,
+                )
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+        try:
+            await self._en_hilo(_insertar, filas)
+        except Exception:
+            # El historial no debe frenar ni romper una corrida.
+            logger.exception("No se pudo guardar el historial", extra={"filas": len(filas)})
+
+    async def historial_producto(
+        self,
+        cod_prod: str,
+        status: Optional[str] = None,
+        descuento_nuevo: Optional[str] = None,
+        limite: int = 50,
+    ) -> list[dict]:
+        """Resultados de un SKU, del mas reciente al mas viejo."""
+        await self.volcar()
+
+        def _consultar(db, cod_prod, status, descuento_nuevo, limite):
+            condiciones, parametros = ["cod_prod = ?"], [cod_prod]
+            if status:
+                condiciones.append("status = ?")
+                parametros.append(status)
+            if descuento_nuevo:
+                condiciones.append("descuento_nuevo = ?")
+                parametros.append(descuento_nuevo)
+            return _filas_a_dicts(
+                db.execute(
+                    f"SELECT {', '.join(_COLUMNAS)} FROM resultados "
+                    f"WHERE {' AND '.join(condiciones)} ORDER BY fecha DESC, id DESC LIMIT ?",
+                    (*parametros, limite),
+                )
+            )
+
+        return await self._en_hilo(_consultar, cod_prod, status, descuento_nuevo, limite)
+
+    async def buscar(
+        self,
+        status: Optional[str] = None,
+        desde: Union[datetime, date, None] = None,
+        hasta: Union[datetime, date, None] = None,
+        limite: int = 100,
+    ) -> list[dict]:
+        """Resultados por status y/o rango de fechas, del mas reciente."""
+        await self.volcar()
+
+        def _consultar(db, status, desde, hasta, limite):
+            condiciones, parametros = [], []
+            if status:
+                condiciones.append("status = ?")
+                parametros.append(status)
+            if desde:
+                condiciones.append("fecha >= ?")
+                parametros.append(_fecha_local(desde))
+            if hasta:
+                condiciones.append("fecha < ?")
+                parametros.append(_fecha_local(hasta))
+            where = f"WHERE {' AND '.join(condiciones)} " if condiciones else ""
+            return _filas_a_dicts(
+                db.execute(
+                    f"SELECT {', '.join(_COLUMNAS)} FROM resultados {where}"
+                    "ORDER BY fecha DESC, id DESC LIMIT ?",
+                    (*parametros, limite),
+                )
+            )
+
+        return await self._en_hilo(_consultar, status, desde, hasta, limite)
+
+    async def agregados_ejecucion(self, ejecucion_id: str) -> Optional[dict]:
+        """Totales de una corrida por status y por descuento nuevo."""
+        await self.volcar()
+
+        def _consultar(db, ejecucion_id):
+            por_status = dict(
+                db.execute(
+                    "SELECT status, COUNT(*) FROM resultados "
+                    "WHERE ejecucion_id = ? GROUP BY status",
+                    (ejecucion_id,),
+                ).fetchall()
+            )
+            if not por_status:
+                return None
+            tipo, modo_plan, inicio, fin = db.execute(
+                "SELECT tipo, modo_plan, MIN(fecha), MAX(fecha) FROM resultados "
+                "WHERE ejecucion_id = ?",
+                (ejecucion_id,),
+            ).fetchone()
+            por_descuento_nuevo = dict(
+                db.execute(
+                    "SELECT COALESCE(descuento_nuevo, ''), COUNT(*) FROM resultados "
+                    "WHERE ejecucion_id = ? AND status IN ('aplicado', 'planificado') "
+                    "GROUP BY descuento_nuevo",
+                    (ejecucion_id,),
+                ).fetchall()
+            )
+            return {
+                "ejecucion_id": ejecucion_id,
+                "tipo": tipo,
+                "modo_plan": bool(modo_plan),
+                "primer_resultado": inicio,
+                "ultimo_resultado": fin,
+                "total": sum(por_status.values()),
+                "por_status": por_status,
+                "por_descuento_nuevo": por_descuento_nuevo,
+            }
+
+        return await self._en_hilo(_consultar, ejecucion_id)
+
+    async def cerrar(self) -> None:
+        if self._escritor is not None:
+            self._escritor.cancel()
+            self._escritor = None
+        await self.volcar()
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+
+def _fecha_local(fecha: Union[datetime, date]) -> str:
+    # Las filas se guardan en hora local sin zona.
+    if not isinstance(fecha, datetime):
+        fecha = datetime.combine(fecha, datetime.min.time())
+    elif fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    return fecha.isoformat(timespec="seconds")
+
+
+def _filas_a_dicts(cursor) -> list[dict]:
+    filas = []
+    for fila in cursor.fetchall():
+        registro = dict(zip(_COLUMNAS, fila))
+        registro["modo_plan"] = bool(registro["modo_plan"])
+        filas.append(registro)
+    return filas
+
+
+historial_resultados = HistorialResultados(
+    get_settings().HISTORIAL_PATH,
+    retencion_dias=get_settings().HISTORIAL_RETENCION_DIAS,
+    lote=get_settings().HISTORIAL_LOTE,
+    intervalo=get_settings().HISTORIAL_INTERVALO_SEGUNDOS,
+)
@@ -0,0 +1,34 @@
+from typing import Optional
+
+import httpx
+
+
+def crear_cliente_http(
+    timeout: float,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool = False,
+    headers: Optional[dict] = None,
+) -> httpx.AsyncClient:
+    """Cliente httpx de larga vida con pool de conexiones (keep-alive)."""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    if http2:
+        # Se valida al crear el cliente (en el arranque) con un error claro.
+        try:
+            import h2  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(
+                "AVAX_HTTP2/ZAP_HTTP2=true requiere el paquete h2: "
+                "pip install 'httpx[http2]'"
+            ) from e
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=http2,
+        headers=headers,
+    )
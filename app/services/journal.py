@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import get_settings
+from app.services.sqlite_util import abrir_sqlite
+
+logger = logging.getLogger(__name__)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS corridas (
+    corrida_id TEXT PRIMARY KEY,
+    clave TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    inicio TEXT NOT NULL,
+    fin TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_corridas_clave ON corridas (clave, estado);
+CREATE TABLE IF NOT EXISTS skus (
+    corrida_id TEXT NOT NULL,
+    cod_prod TEXT NOT NULL,
+    status TEXT NOT NULL,
+    actualizado TEXT NOT NULL,
+    PRIMARY KEY (corrida_id, cod_prod)
+);
+"""
+
+# Resultados que no se repiten al reanudar (los errores si se reintentan).
+STATUS_TERMINADOS = ("aplicado", "no_apto", "error_validacion", "excluido", "no_encontrado")
+
+
+class JournalEjecuciones:
+    """Bitacora local (SQLite) de las corridas batch y los SKUs ya hechos.
+
+    Una corrida queda `en_curso` hasta terminar completa; si el proceso se
+    cae o se cancela, la siguiente corrida con la misma clave la retoma.
+
+    registrar() solo encola el SKU; una tarea los escribe en lotes (una
+    transaccion por lote). Si el proceso muere, lo no escrito se vuelve a
+    procesar al retomar.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        retencion_dias: int = 7,
+        lote: int = 500,
+        intervalo: float = 1.0,
+    ):
+        self.ruta = ruta
+        self.retencion_dias = retencion_dias
+        self.lote = lote
+        self.intervalo = intervalo
+        self._conexion = None
+        self._lock = threading.Lock()
+        self._pendientes: list[tuple] = []
+        self._lote_listo: Optional[asyncio.Event] = None
+        self._escritor: Optional[asyncio.Task] = None
+
+    def _db(self):
+        if self._conexion is None:
+            self._conexion = abrir_sqlite(self.ruta)
+            self._conexion.executescript(_ESQUEMA)
+            self._purgar()
+        return self._conexion
+
+    def _purgar(self) -> None:
+        limite = (datetime.now() - timedelta(days=self.retencion_dias)).isoformat()
+        viejas = "SELECT corrida_id FROM corridas WHERE inicio < ?"
+        self._conexion.execute(f"DELETE FROM skus WHERE corrida_id IN ({viejas})", (limite,))
+        self._conexion.execute("DELETE FROM corridas WHERE inicio < ?", (limite,))
+
+    def _ejecutar(self, funcion, *args):
+        with self._lock:
+            return funcion(self._db(), *args)
+
+    async def _en_hilo(self, funcion, *args):
+        return await asyncio.to_thread(self._ejecutar, funcion, *args)
+
+    async def iniciar_corrida(self, clave: str) -> tuple[str, set[str]]:
+        """Devuelve (corrida_id, skus_terminados); retoma la ultima corrida
+        sin terminar con la misma clave si existe."""
+
+        def _iniciar(db, clave):
+            fila = db.execute(
+                "SELECT corrida_id FROM corridas WHERE clave = ? AND estado = 'en_curso' "
+                "ORDER BY inicio DESC LIMIT 1",
+                (clave,),
+            ).fetchone()
+            if fila is None:
+                corrida_id = uuid.uuid4().hex
+                db.execute(
+                    "INSERT INTO corridas (corrida_id, clave, estado, inicio) "
+                    "VALUES (?, ?, 'en_curso', ?)",
+                    (corrida_id, clave, datetime.now().isoformat()),
+                )
+                return corrida_id, set()
+
+            corrida_id = fila[0]
+            marcadores = ", ".join("?" for _ in STATUS_TERMINADOS)
+            terminados = db.execute(
+                f"SELECT cod_prod FROM skus WHERE corrida_id = ? AND status IN ({marcadores})",
+                (corrida_id, *STATUS_TERMINADOS),
+            ).fetchall()
+            return corrida_id, {cod_prod for (cod_prod,) in terminados}
+
+        return await self._en_hilo(_iniciar, clave)
+
+    def registrar(self, corrida_id: str, cod_prod: str, status: str) -> None:
+        self._pendientes.append((corrida_id, cod_prod, status, datetime.now().isoformat()))
+        if self._escritor is None or self._escritor.done():
+            self._lote_listo = asyncio.Event()
+            self._escritor = asyncio.ensure_future(self._escribir_periodicamente())
+        if len(self._pendientes) >= self.lote:
+            self._lote_listo.set()
+
+    async def _escribir_periodicamente(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._lote_listo.wait(), timeout=self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self._lote_listo.clear()
+            try:
+                await self.volcar()
+            except Exception:
+                # Esos SKUs se reprocesan si hay que retomar; la corrida sigue.
+                logger.exception("No se pudo escribir la bitacora")
+
+    async def volcar(self) -> None:
+        """Escribe ya los SKUs pendientes (al terminar o cortar una corrida)."""
+        if not self._pendientes:
+            return
+        filas, self._pendientes = self._pendientes, []
+
+        def _insertar(db, filas):
+            db.execute("BEGIN")
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO skus (corrida_id, cod_prod, status, actualizado) "
+                    "VALUES (?, ?, ?, ?)",
+                    filas,
+                )
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+        await self._en_hilo(_insertar, filas)
+
+    async def finalizar(self, corrida_id: str, estado: str = "completada") -> None:
+        await self.volcar()
+
+        def _finalizar(db, corrida_id, estado):
+            db.execute(
+                "UPDATE corridas SET estado = ?, fin = ? WHERE corrida_id = ?",
+                (estado, datetime.now().isoformat(), corrida_id),
+            )
+
+        await self._en_hilo(_finalizar, corrida_id, estado)
+
+    async def cerrar(self) -> None:
+        if self._escritor is not None:
+            self._escritor.cancel()
+            self._escritor = None
+        await self.volcar()
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+
+def clave_corrida(estado_logica: str, dia: Optional[datetime] = None) -> str:
+    # Solo se retoma una corrida del mismo dia y estado logico.
+    return f"{(dia or datetime.now()).date().isoformat()}:{estado_logica}"
+
+
+journal_ejecuciones = JournalEjecuciones(
+    get_settings().JOURNAL_PATH,
+    retencion_dias=get_settings().JOURNAL_RETENCION_DIAS,
+    lote=get_settings().JOURNAL_LOTE,
+    intervalo=get_settings().JOURNAL_INTERVALO_SEGUNDOS,
+)
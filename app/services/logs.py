@@ -0,0 +1,161 @@
+import contextvars
+import copy
+import json
+import logging
+import queue
+import sys
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import get_settings
+
+# Contexto que se agrega a cada linea de log
+ejecucion_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "ejecucion_id", default=None
+)
+cod_prod_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "cod_prod", default=None
+)
+
+_ATRIBUTOS_RECORD = set(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "ejecucion_id", "cod_prod", "contexto"}
+
+_listener: Optional[QueueListener] = None
+_formatter_base = logging.Formatter()
+
+
+class FiltroContexto(logging.Filter):
+    """Copia ejecucion_id/cod_prod al record en el hilo que loguea (antes
+    de pasar por la cola, donde los contextvars ya no estan)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "ejecucion_id", None) is None:
+            record.ejecucion_id = ejecucion_id_var.get()
+        if getattr(record, "cod_prod", None) is None:
+            record.cod_prod = cod_prod_var.get()
+        return True
+
+
+class FiltroMuestreoSku(logging.Filter):
+    """Deja pasar solo una fraccion de los SKUs en logs por SKU bajo ERROR.
+
+    El muestreo es por SKU (crc32), asi un SKU muestreado trae todas sus lineas.
+    """
+
+    def __init__(self, fraccion: float):
+        super().__init__()
+        self.umbral = int(max(0.0, min(fraccion, 1.0)) * 10_000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        cod_prod = getattr(record, "cod_prod", None)
+        if cod_prod is None or record.levelno >= logging.ERROR:
+            return True
+        return zlib.crc32(str(cod_prod).encode()) % 10_000 < self.umbral
+
+
+class HandlerCola(QueueHandler):
+    """QueueHandler que no mete el traceback en el mensaje: lo deja en
+    exc_text para que el formatter lo escriba en su propio campo."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # Texto y no exc_info: el traceback retiene los frames vivos.
+            if not record.exc_text:
+                record.exc_text = _formatter_base.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class FormatterJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        linea = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if getattr(record, "ejecucion_id", None):
+            linea["ejecucion_id"] = record.ejecucion_id
+        if getattr(record, "cod_prod", None):
+            linea["cod_prod"] = record.cod_prod
+        linea.update(_campos_extra(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            linea["excepcion"] = record.exc_text
+        if record.stack_info:
+            linea["stack"] = record.stack_info
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+def _campos_extra(record: logging.LogRecord) -> dict:
+    return {
+        clave: valor
+        for clave, valor in record.__dict__.items()
+        if clave not in _ATRIBUTOS_RECORD and not clave.startswith("_")
+    }
+
+
+class FormatterTexto(logging.Formatter):
+    """Formato legible para desarrollo local (LOG_JSON=false)."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(contexto)s%(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        partes = [
+            f"{clave}={valor}"
+            for clave in ("ejecucion_id", "cod_prod")
+            if (valor := getattr(record, clave, None))
+        ]
+        record.contexto = f"[{' '.join(partes)}] " if partes else ""
+        texto = super().format(record)
+        extra = _campos_extra(record)
+        if extra:
+            texto += " " + " ".join(f"{clave}={valor}" for clave, valor in extra.items())
+        return texto
+
+
+def configurar_logging() -> None:
+    """Logging no bloqueante: los handlers de la app solo encolan y un hilo
+    (QueueListener) formatea y escribe en stdout."""
+    global _listener
+    if _listener is not None:
+        return
+
+    settings = get_settings()
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatterJSON() if settings.LOG_JSON else FormatterTexto())
+
+    cola: queue.SimpleQueue = queue.SimpleQueue()
+    handler = HandlerCola(cola)
+    handler.addFilter(FiltroContexto())
+    handler.addFilter(FiltroMuestreoSku(settings.LOG_MUESTREO_SKU))
+
+    logger_app = logging.getLogger("app")
+    logger_app.setLevel(settings.LOG_LEVEL.upper())
+    logger_app.addHandler(handler)
+    logger_app.propagate = False
+
+    _listener = QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+
+
+def detener_logging() -> None:
+    """Vacia la cola pendiente y detiene el hilo de escritura."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    logger_app = logging.getLogger("app")
+    for handler in [h for h in logger_app.handlers if isinstance(h, QueueHandler)]:
+        logger_app.removeHandler(handler)
+    logger_app.propagate = True
@@ -0,0 +1,207 @@
+import os
+import time
+from typing import Optional
+
+import httpx
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.services.resiliencia import CircuitoAbierto
+
+PREFIJO = "descuentos_auto"
+
+# Con varios workers cada proceso tiene su propio registro: con
+# PROMETHEUS_MULTIPROC_DIR (variable de entorno definida antes de lanzar
+# los workers, con un directorio vacio) /metrics agrega los de todos. Sin
+# ella las metricas son solo del worker que atiende el scrape.
+DIRECTORIO_MULTIPROCESO = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCIA_UPSTREAM = Histogram(
+    f"{PREFIJO}_upstream_request_duration_seconds",
+    "Latencia de cada intento de request a AVAX/ZAP",
+    ["upstream", "operacion"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+ERRORES_UPSTREAM = Counter(
+    f"{PREFIJO}_upstream_errors_total",
+    "Intentos fallidos por tipo (status HTTP, timeout, transporte)",
+    ["upstream", "operacion", "tipo"],
+)
+REQUESTS_EN_VUELO = Gauge(
+    f"{PREFIJO}_upstream_requests_in_flight",
+    "Requests a AVAX/ZAP en curso",
+    ["upstream"],
+    multiprocess_mode="livesum",
+)
+PRODUCTOS = Counter(
+    f"{PREFIJO}_productos_total",
+    "SKUs procesados por tipo de ejecucion y status de resultado",
+    ["tipo", "status"],
+)
+ULTIMA_EJECUCION_PRODUCTOS = Gauge(
+    f"{PREFIJO}_ultima_ejecucion_productos",
+    "SKUs por status en la ultima ejecucion terminada de cada tipo",
+    ["tipo", "status"],
+    multiprocess_mode="mostrecent",
+)
+DURACION_ETAPA = Histogram(
+    f"{PREFIJO}_etapa_duration_seconds",
+    "Duracion de cada etapa del proceso batch",
+    ["etapa"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200),
+)
+DURACION_EJECUCION = Histogram(
+    f"{PREFIJO}_ejecucion_duration_seconds",
+    "Duracion total de cada ejecucion",
+    ["tipo", "estado"],
+    buckets=(1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 14400),
+)
+EJECUCIONES_ACTIVAS = Gauge(
+    f"{PREFIJO}_ejecuciones_activas",
+    "Ejecuciones batch en curso",
+    multiprocess_mode="livesum",
+)
+ULTIMA_PROGRAMADA_EXITOSA = Gauge(
+    f"{PREFIJO}_ultima_ejecucion_programada_exitosa_timestamp_seconds",
+    "Unix time en que termino la ultima ejecucion programada completada",
+    multiprocess_mode="max",
+)
+TASA_LIMITADOR = Gauge(
+    f"{PREFIJO}_limitador_tasa_por_segundo",
+    "Tasa actual del limitador adaptativo de AVAX",
+    ["limitador"],
+    multiprocess_mode="liveall",
+)
+CIRCUITO_ABIERTO = Gauge(
+    f"{PREFIJO}_circuito_abierto",
+    "1 si el circuit breaker no esta cerrado",
+    ["upstream"],
+    multiprocess_mode="livemax",
+)
+CIRCUITO_RECHAZADAS = Gauge(
+    f"{PREFIJO}_circuito_rechazadas",
+    "Llamadas rechazadas por el circuito abierto desde el arranque",
+    ["upstream"],
+    multiprocess_mode="livesum",
+)
+PIPELINE_EN_COLA = Gauge(
+    f"{PREFIJO}_pipeline_en_cola",
+    "SKUs esperando en la cola de cada etapa del pipeline batch",
+    ["etapa"],
+    multiprocess_mode="livesum",
+)
+PIPELINE_OCUPADOS = Gauge(
+    f"{PREFIJO}_pipeline_workers_ocupados",
+    "Workers de cada etapa del pipeline procesando un SKU",
+    ["etapa"],
+    multiprocess_mode="livesum",
+)
+PIPELINE_PROCESADOS = Counter(
+    f"{PREFIJO}_pipeline_procesados_total",
+    "SKUs que salieron de cada etapa del pipeline",
+    ["etapa"],
+)
+
+STATUS_RESULTADO = (
+    "aplicado",
+    "planificado",
+    "no_apto",
+    "error_validacion",
+    "excluido",
+    "no_encontrado",
+    "error",
+)
+
+
+class MedicionRequest:
+    """Mide un intento de request: en vuelo, latencia y tipo de error.
+
+        with MedicionRequest("avax", "get_producto") as medicion:
+            response = await client.get(...)
+            medicion.status(response.status_code)
+    """
+
+    def __init__(self, upstream: str, operacion: str):
+        self.upstream = upstream
+        self.operacion = operacion
+        self._status: Optional[int] = None
+        self._inicio = 0.0
+
+    def status(self, status_code: int) -> None:
+        self._status = status_code
+
+    def __enter__(self) -> "MedicionRequest":
+        REQUESTS_EN_VUELO.labels(self.upstream).inc()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_exc, exc, tb) -> None:
+        REQUESTS_EN_VUELO.labels(self.upstream).dec()
+        if tipo_exc is not None and issubclass(tipo_exc, CircuitoAbierto):
+            # Rechazo local: no llego al upstream (se cuenta en circuito_rechazadas).
+            return
+        LATENCIA_UPSTREAM.labels(self.upstream, self.operacion).observe(
+            time.perf_counter() - self._inicio
+        )
+        if tipo_exc is not None:
+            if issubclass(tipo_exc, httpx.TimeoutException):
+                self._error("timeout")
+            elif issubclass(tipo_exc, httpx.RequestError):
+                self._error("transporte")
+        elif self._status is not None and self._status >= 400:
+            self._error(str(self._status))
+
+    def _error(self, tipo: str) -> None:
+        ERRORES_UPSTREAM.labels(self.upstream, self.operacion, tipo).inc()
+
+
+def registrar_producto(tipo: str, status: str) -> None:
+    PRODUCTOS.labels(tipo, status).inc()
+
+
+def registrar_fin_ejecucion(
+    tipo: str,
+    estado: str,
+    duracion: float,
+    por_status: dict[str, int],
+) -> None:
+    DURACION_EJECUCION.labels(tipo, estado).observe(duracion)
+    for status in set(STATUS_RESULTADO) | set(por_status):
+        ULTIMA_EJECUCION_PRODUCTOS.labels(tipo, status).set(por_status.get(status, 0))
+    if tipo == "programada" and estado == "completada":
+        ULTIMA_PROGRAMADA_EXITOSA.set_to_current_time()
+
+
+def actualizar_estado_clientes() -> None:
+    """Copia al registro el estado de limitadores y circuitos (al scrapear).
+    En multiproceso cada worker lo actualiza cuando atiende un scrape."""
+    from app.services.avax_client import avax_client
+    from app.services.zap_client import zap_client
+
+    TASA_LIMITADOR.labels("lectura").set(avax_client.limitador_lectura.tasa)
+    TASA_LIMITADOR.labels("escritura").set(avax_client.limitador_escritura.tasa)
+    for nombre, circuito in (("avax", avax_client.circuito), ("zap", zap_client.circuito)):
+        CIRCUITO_ABIERTO.labels(nombre).set(0 if circuito.estado == "cerrado" else 1)
+        CIRCUITO_RECHAZADAS.labels(nombre).set(circuito.rechazadas)
+
+
+def exportar() -> bytes:
+    """Metricas en el formato de texto de Prometheus."""
+    actualizar_estado_clientes()
+    if not DIRECTORIO_MULTIPROCESO:
+        return generate_latest()
+    registro = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registro)
+    return generate_latest(registro)
+
+
+def marcar_proceso_terminado() -> None:
+    """Saca al worker de los gauges `live*` (al apagar)."""
+    if DIRECTORIO_MULTIPROCESO:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class LimitadorAdaptativo:
+    """Token bucket con ajuste AIMD de la tasa.
+
+    Mientras el upstream responde bien la tasa sube de forma aditiva
+    (~`incremento` req/s por segundo); ante 429/5xx, errores de red o una
+    latencia promedio sobre `latencia_objetivo` se multiplica por
+    `factor_reduccion` (como mucho una vez por `enfriamiento` segundos).
+    """
+
+    CODIGOS_SATURACION = {429, 502, 503, 504}
+
+    def __init__(
+        self,
+        nombre: str,
+        tasa_inicial: float,
+        tasa_min: float,
+        tasa_max: float,
+        rafaga: int = 1,
+        incremento: float = 1.0,
+        factor_reduccion: float = 0.5,
+        latencia_objetivo: float = 2.0,
+        enfriamiento: float = 1.0,
+    ):
+        self.nombre = nombre
+        self.tasa = tasa_inicial
+        self.tasa_min = tasa_min
+        self.tasa_max = tasa_max
+        self.rafaga = max(rafaga, 1)
+        self.incremento = incremento
+        self.factor_reduccion = factor_reduccion
+        self.latencia_objetivo = latencia_objetivo
+        self.enfriamiento = enfriamiento
+
+        self._tokens = float(self.rafaga)
+        self._ultima_recarga = time.monotonic()
+        self._ultima_reduccion = 0.0
+        self._pausa_hasta = 0.0
+        self._lock = asyncio.Lock()
+
+        self.latencia_ewma: Optional[float] = None
+        self.llamadas = 0
+        self.esperando = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.reducciones = 0
+
+    def _recargar(self, ahora: float) -> None:
+        transcurrido = ahora - self._ultima_recarga
+        self._tokens = min(self.rafaga, self._tokens + transcurrido * self.tasa)
+        self._ultima_recarga = ahora
+
+    async def adquirir(self) -> float:
+        """Espera un token; devuelve los segundos esperados."""
+        inicio = time.monotonic()
+        self.esperando += 1
+        try:
+            # El lock mantiene el orden FIFO entre quienes esperan.
+            async with self._lock:
+                while True:
+                    ahora = time.monotonic()
+                    if ahora < self._pausa_hasta:
+                        await asyncio.sleep(self._pausa_hasta - ahora)
+                        continue
+                    self._recargar(ahora)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self._tokens) / self.tasa)
+        finally:
+            self.esperando -= 1
+
+        espera = time.monotonic() - inicio
+        self.llamadas += 1
+        self.espera_total += espera
+        self.espera_max = max(self.espera_max, espera)
+        return espera
+
+    def registrar(
+        self,
+        status_code: Optional[int],
+        latencia: float,
+        retry_after: Optional[str] = None,
+    ) -> None:
+        """Ajusta la tasa segun el resultado de una llamada (None = error de red)."""
+        self.latencia_ewma = (
+            latencia
+            if self.latencia_ewma is None
+            else 0.8 * self.latencia_ewma + 0.2 * latencia
+        )
+        saturado = (
+            status_code is None
+            or status_code in self.CODIGOS_SATURACION
+            or status_code >= 500
+            or self.latencia_ewma > self.latencia_objetivo
+        )
+
+        ahora = time.monotonic()
+        if status_code == 429 and retry_after:
+            try:
+                self._pausa_hasta = max(self._pausa_hasta, ahora + float(retry_after))
+            except ValueError:
+                pass
+
+        if saturado:
+            if ahora - self._ultima_reduccion >= self.enfriamiento:
+                self.tasa = max(self.tasa_min, self.tasa * self.factor_reduccion)
+                self._ultima_reduccion = ahora
+                self.reducciones += 1
+            return
+
+        self.tasa = min(self.tasa_max, self.tasa + self.incremento / max(self.tasa, 1.0))
+
+    def stats(self) -> dict:
+        return {
+            "nombre": self.nombre,
+            "tasa_por_segundo": round(self.tasa, 3),
+            "tasa_min": self.tasa_min,
+            "tasa_max": self.tasa_max,
+            "latencia_ewma": round(self.latencia_ewma, 4)
+            if self.latencia_ewma is not None
+            else None,
+            "llamadas": self.llamadas,
+            "esperando": self.esperando,
+            "espera_promedio": round(self.espera_total / self.llamadas, 4)
+            if self.llamadas
+            else 0.0,
+            "espera_max": round(self.espera_max, 4),
+            "reducciones": self.reducciones,
+        }
@@ -0,0 +1,156 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import httpx
+
+CODIGOS_REINTENTABLES = {429, 502, 503, 504}
+# El upstream responde pero pide bajar el ritmo: ni falla ni exito.
+CODIGOS_NEUTROS = {408, 429}
+
+
+class CircuitoAbierto(httpx.RequestError):
+    """El upstream se considera caido: se falla sin llamar."""
+
+
+class CircuitBreaker:
+    """Circuit breaker por upstream (cerrado -> abierto -> semi_abierto).
+
+    Cuenta como falla un error de transporte o un 5xx; un 408/429 no cuenta
+    ni como falla ni como exito (no corta una racha de fallas). Tras
+    `umbral_fallas` fallas seguidas se abre por `tiempo_apertura` segundos;
+    luego deja pasar una sola llamada de prueba que lo cierra o lo reabre.
+    """
+
+    def __init__(self, nombre: str, umbral_fallas: int, tiempo_apertura: float):
+        self.nombre = nombre
+        self.umbral_fallas = umbral_fallas
+        self.tiempo_apertura = tiempo_apertura
+        self.estado = "cerrado"
+        self.fallas_consecutivas = 0
+        self.aperturas = 0
+        self.rechazadas = 0
+        self._abierto_hasta = 0.0
+        self._prueba_en_curso = False
+
+    def verificar(self) -> None:
+        if self.estado == "cerrado":
+            return
+        if self.estado == "abierto" and time.monotonic() >= self._abierto_hasta:
+            self.estado = "semi_abierto"
+            self._prueba_en_curso = False
+        if self.estado == "semi_abierto" and not self._prueba_en_curso:
+            self._prueba_en_curso = True
+            return
+        self.rechazadas += 1
+        raise CircuitoAbierto(f"Circuito {self.nombre} abierto: upstream no disponible")
+
+    def rechazar_si_abierto(self) -> None:
+        """Chequeo barato para llamadas que esperaron (ej. un token) y
+        mientras tanto el circuito se abrio."""
+        if self.estado == "abierto":
+            self.rechazadas += 1
+            raise CircuitoAbierto(f"Circuito {self.nombre} abierto: upstream no disponible")
+
+    def registrar_exito(self) -> None:
+        self.fallas_consecutivas = 0
+        self.estado = "cerrado"
+        self._prueba_en_curso = False
+
+    def registrar_falla(self) -> None:
+        self.fallas_consecutivas += 1
+        if self.estado == "semi_abierto" or self.fallas_consecutivas >= self.umbral_fallas:
+            if self.estado != "abierto":
+                self.aperturas += 1
+            self.estado = "abierto"
+            self._abierto_hasta = time.monotonic() + self.tiempo_apertura
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self) -> None:
+        # La llamada de prueba se cancelo sin resultado: otra puede probar.
+        self._prueba_en_curso = False
+
+    def stats(self) -> dict:
+        return {
+            "estado": self.estado,
+            "fallas_consecutivas": self.fallas_consecutivas,
+            "aperturas": self.aperturas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+@dataclass
+class PoliticaReintentos:
+    intentos: int
+    timeout: float
+    deadline: float
+    backoff_base: float = 0.5
+    backoff_max: float = 10.0
+
+    @classmethod
+    def sin_reintentos(cls, timeout: float) -> "PoliticaReintentos":
+        return cls(intentos=1, timeout=timeout, deadline=timeout)
+
+
+async def esperar_reintento(
+    intento: int,
+    politica: PoliticaReintentos,
+    limite: float,
+) -> bool:
+    """Backoff exponencial con full jitter; False si ya no hay margen."""
+    if intento >= politica.intentos:
+        return False
+    espera = random.uniform(0, min(politica.backoff_max, politica.backoff_base * 2 ** (intento - 1)))
+    if time.monotonic() + espera >= limite:
+        return False
+    await asyncio.sleep(espera)
+    return True
+
+
+async def enviar_con_resiliencia(
+    enviar: Callable[[float], Awaitable[httpx.Response]],
+    circuito: CircuitBreaker,
+    politica: PoliticaReintentos,
+    confirmar_exito: bool = True,
+) -> httpx.Response:
+    """Llama a `enviar(timeout)` respetando el circuito, reintentando errores
+    transitorios (transporte, 429, 502-504) dentro del deadline total.
+
+    Con `confirmar_exito=False` (respuestas en streaming) un 2xx no cierra
+    el circuito: el llamador registra el exito o la falla al leer el body.
+    """
+    limite = time.monotonic() + politica.deadline
+    intento = 0
+    while True:
+        intento += 1
+        circuito.verificar()
+        restante = limite - time.monotonic()
+        timeout = max(min(politica.timeout, restante), 0.001)
+
+        try:
+            response = await enviar(timeout)
+        except httpx.TransportError:
+            circuito.registrar_falla()
+            if await esperar_reintento(intento, politica, limite):
+                continue
+            raise
+        except BaseException:
+            circuito.liberar_prueba()
+            raise
+
+        if response.status_code >= 500:
+            circuito.registrar_falla()
+        elif response.status_code in CODIGOS_NEUTROS:
+            circuito.liberar_prueba()
+        elif confirmar_exito or response.is_error:
+            circuito.registrar_exito()
+
+        if response.status_code in CODIGOS_REINTENTABLES and await esperar_reintento(
+            intento, politica, limite
+        ):
+            # Libera la conexion si el body no se leyo (respuestas en streaming).
+            await response.aclose()
+            continue
+        return response
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from array import array
+from typing import Iterator, Optional
+
+from app.config import get_settings
+
+_BLOQUE_LECTURA = 256 * 1024
+
+
+class ResultadosCorrida:
+    """Detalles por SKU de una corrida, volcados a un NDJSON local a medida
+    que se producen (una linea por detalle, ya serializada).
+
+    En memoria solo quedan los offsets de cada linea (8 bytes por SKU) por
+    status, para paginar sin releer el archivo.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._archivo = None
+        self._tamano = 0
+        self._offsets: dict[Optional[str], array] = {None: array("q")}
+
+    def agregar(self, detalle, status: str) -> None:
+        # Escritura con buffer: no bloquea el event loop mas que un append.
+        if self._archivo is None:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            self._archivo = open(self.ruta, "ab", buffering=1 << 16)
+        linea = detalle.model_dump_json().encode() + b"\n"
+        self._archivo.write(linea)
+        self._offsets[None].append(self._tamano)
+        self._offsets.setdefault(status, array("q")).append(self._tamano)
+        self._tamano += len(linea)
+
+    def _volcar(self) -> None:
+        if self._archivo is not None:
+            self._archivo.flush()
+
+    def cerrar(self) -> None:
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def total(self, status: Optional[str] = None) -> int:
+        return len(self._offsets.get(status, ()))
+
+    async def pagina(
+        self,
+        status: Optional[str],
+        desde: int,
+        limite: int,
+    ) -> tuple[list[bytes], int]:
+        """Lineas JSON [desde, desde+limite) del status pedido (None = todos)
+        y el indice siguiente."""
+        # Se toma la seleccion en el event loop, despues de volcar el buffer:
+        # el hilo de lectura nunca ve offsets de lineas a medio escribir.
+        self._volcar()
+        offsets = self._offsets.get(status, array("q"))[desde:desde + limite]
+        if not offsets:
+            return [], desde
+        lineas = await asyncio.to_thread(self._leer_lineas, offsets)
+        return lineas, desde + len(offsets)
+
+    def _leer_lineas(self, offsets: array) -> list[bytes]:
+        lineas = []
+        with open(self.ruta, "rb") as archivo:
+            for offset in offsets:
+                archivo.seek(offset)
+                lineas.append(archivo.readline().rstrip(b"\n"))
+        return lineas
+
+    def array_json(self) -> Iterator[bytes]:
+        """Todos los detalles escritos hasta ahora como un array JSON, en
+        bloques (para una respuesta en streaming sin cargarlos en memoria)."""
+        self._volcar()
+        tamano = self._tamano
+        return self._bloques_array(tamano)
+
+    def _bloques_array(self, tamano: int) -> Iterator[bytes]:
+        yield b"["
+        if tamano:
+            # Cada linea termina en "\n" y model_dump_json nunca emite uno
+            # literal: basta cambiarlos por "," y quitar el ultimo.
+            with open(self.ruta, "rb") as archivo:
+                restante = tamano
+                while restante > 0:
+                    bloque = archivo.read(min(_BLOQUE_LECTURA, restante))
+                    if not bloque:
+                        break
+                    restante -= len(bloque)
+                    if restante == 0:
+                        bloque = bloque[:-1]
+                    yield bloque.replace(b"\n", b",")
+        yield b"]"
+
+    def eliminar(self) -> None:
+        self.cerrar()
+        try:
+            os.remove(self.ruta)
+        except FileNotFoundError:
+            pass
+
+
+class ResultadosStore:
+    """Directorio con el NDJSON de resultados de cada corrida."""
+
+    def __init__(self, directorio: str, retencion_horas: float = 48):
+        self.directorio = directorio
+        self.retencion_horas = retencion_horas
+        self._purgado = False
+
+    def crear(self, ejecucion_id: str) -> ResultadosCorrida:
+        if not self._purgado:
+            self._purgado = True
+            self._purgar()
+        return ResultadosCorrida(os.path.join(self.directorio, f"{ejecucion_id}.ndjson"))
+
+    def _purgar(self) -> None:
+        # Archivos de corridas de procesos anteriores (ya no consultables).
+        # Por antiguedad: el directorio puede ser compartido por varios workers.
+        limite = time.time() - self.retencion_horas * 3600
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return
+        for nombre in nombres:
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                if nombre.endswith(".ndjson") and os.stat(ruta).st_mtime < limite:
+                    os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+
+resultados_store = ResultadosStore(
+    get_settings().RESULTADOS_DIR,
+    retencion_horas=get_settings().RESULTADOS_RETENCION_HORAS,
+)
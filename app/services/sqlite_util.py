@@ -0,0 +1,16 @@
+import os
+import sqlite3
+
+
+def abrir_sqlite(ruta: str) -> sqlite3.Connection:
+    """Conexion SQLite en modo WAL, compartible entre hilos (el llamador
+    serializa el acceso)."""
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA synchronous=NORMAL")
+    conexion.execute("PRAGMA busy_timeout=5000")
+    return conexion
@@ -1,20 +1,76 @@
+import asyncio
+import time
+from dataclasses import replace
+
 import httpx
 from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
 from app.config import get_settings
+from app.services.cache import CacheTTL
+from app.services.churn_index import ChurnIndex, RegistroChurn
+from app.services.http_pool import crear_cliente_http
+from app.services.metricas import MedicionRequest
+from app.services.resiliencia import (
+    CircuitBreaker,
+    PoliticaReintentos,
+    enviar_con_resiliencia,
+    esperar_reintento,
+)
+from app.services.zap_stream import ParserAgingProducts
 
 class ZapClient:
     def __init__(self):
         self.settings = get_settings()
         self.base_url = self.settings.ZAP_BASE_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        # Cache por ventana/parametros + descargas en vuelo compartidas
+        self._cache_churn = CacheTTL(ttl=self.settings.ZAP_CHURN_CACHE_TTL, max_items=8)
+        self._churn_en_vuelo: dict[tuple, asyncio.Future] = {}
+        self._generacion_churn = 0
+        self.circuito = CircuitBreaker(
+            "zap",
+            umbral_fallas=self.settings.CIRCUITO_UMBRAL_FALLAS,
+            tiempo_apertura=self.settings.CIRCUITO_APERTURA,
+        )
+        self._politica = PoliticaReintentos(
+            intentos=self.settings.ZAP_REINTENTOS + 1,
+            timeout=self.settings.ZAP_TIMEOUT,
+            deadline=self.settings.ZAP_DEADLINE,
+            backoff_base=self.settings.REINTENTO_BACKOFF_BASE,
+            backoff_max=self.settings.REINTENTO_BACKOFF_MAX,
+        )
+
+    def _crear_cliente(self) -> httpx.AsyncClient:
+        return crear_cliente_http(
+            timeout=self.settings.ZAP_TIMEOUT,
+            max_connections=self.settings.ZAP_MAX_CONNECTIONS,
+            max_keepalive_connections=self.settings.ZAP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=self.settings.ZAP_KEEPALIVE_EXPIRY,
+            http2=self.settings.ZAP_HTTP2,
+            headers={"Authorization": f"Bearer {self.settings.ZAP_TOKEN}"},
+        )
+
+    async def iniciar(self) -> None:
+        if self._client is None:
+            self._client = self._crear_cliente()
+
+    async def cerrar(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-    async def get_product_churn(self) -> list[dict]:
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._crear_cliente()
+        return self._client
+
+    def _params_churn(self) -> dict:
         # Rango de 2 días 
         today = datetime.now()
         yesterday = (today - timedelta(days=10)).strftime("%Y-%m-%d")
         today_str = today.strftime("%Y-%m-%d")
 
-        url = f"{self.base_url}/kpi/product-churn"
-        params = {
+        return {
             "start_date": yesterday,
             "end_date": today_str,
             "granularity": 1,
@@ -24,17 +80,215 @@ class ZapClient:
             "include_credit": "true",
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url,
-                params=params,
-                headers={"Authorization": f"Bearer {self.settings.ZAP_TOKEN}"},
-                timeout=60.0,
-            )
-            response.raise_for_status()
-            data = response.json()
-            # Los productos están en aging_products según la documentación
-            return data.get("aging_products", [])
+    async def get_product_churn(self, usar_cache: bool = True) -> list[RegistroChurn]:
+        indice = await self.get_churn_index(usar_cache=usar_cache)
+        return indice.productos
+
+    async def get_churn_index(self, usar_cache: bool = True) -> ChurnIndex:
+        params = self._params_churn()
+        clave = tuple(sorted(params.items()))
+
+        if usar_cache:
+            indice = self._cache_churn.get(clave)
+            if indice is not None:
+                return indice
+
+        # Single-flight: llamadas concurrentes comparten la misma descarga.
+        descarga = self._churn_en_vuelo.get(clave)
+        if descarga is None:
+            descarga = asyncio.ensure_future(self._descargar_churn(clave, params))
+            self._publicar_descarga(clave, descarga)
+
+        # shield: si un llamador se cancela, la descarga sigue para los demas.
+        return await asyncio.shield(descarga)
+
+    def _publicar_descarga(self, clave: tuple, descarga: asyncio.Future) -> None:
+        self._churn_en_vuelo[clave] = descarga
+        descarga.add_done_callback(
+            lambda d: self._churn_en_vuelo.pop(clave, None)
+            if self._churn_en_vuelo.get(clave) is d
+            else None
+        )
+
+    async def iterar_churn(self, usar_cache: bool = True) -> AsyncIterator[RegistroChurn]:
+        """Productos del churn a medida que llegan, para empezar a procesar
+        antes de que termine la descarga. Al terminar, el indice queda en cache.
+
+        Con cache vigente (o una descarga ya en vuelo) entrega esos productos.
+        """
+        params = self._params_churn()
+        clave = tuple(sorted(params.items()))
+        indice = self._cache_churn.get(clave) if usar_cache else None
+        if indice is None and (
+            clave in self._churn_en_vuelo or not self.settings.ZAP_CHURN_STREAMING
+        ):
+            indice = await self.get_churn_index(usar_cache=usar_cache)
+        if indice is not None:
+            for producto in indice.productos:
+                yield producto
+            return
+
+        # La descarga en streaming tambien queda en vuelo: get_churn_index
+        # concurrente espera este indice en vez de bajar el churn otra vez.
+        descarga = asyncio.get_running_loop().create_future()
+        self._publicar_descarga(clave, descarga)
+        generacion = self._generacion_churn
+        productos = []
+        try:
+            async for producto in self._stream_churn(params):
+                productos.append(producto)
+                yield producto
+        except Exception as e:
+            if not descarga.done():
+                descarga.set_exception(e)
+                descarga.exception()  # sin esperas: no avisar "never retrieved"
+            raise
+        except BaseException:
+            # El consumidor corto la iteracion: quienes esperan reciben una
+            # descarga completa nueva.
+            if not descarga.done():
+                self._encadenar(descarga, self._descargar_churn(clave, params))
+            raise
+        indice = ChurnIndex(productos)
+        if generacion == self._generacion_churn:
+            self._cache_churn.set(clave, indice)
+        if not descarga.done():
+            descarga.set_result(indice)
+
+    @staticmethod
+    def _encadenar(descarga: asyncio.Future, coro) -> None:
+        tarea = asyncio.ensure_future(coro)
+
+        def _copiar(t: asyncio.Task) -> None:
+            if descarga.done():
+                return
+            if t.cancelled():
+                descarga.cancel()
+            elif t.exception() is not None:
+                descarga.set_exception(t.exception())
+                descarga.exception()
+            else:
+                descarga.set_result(t.result())
+
+        tarea.add_done_callback(_copiar)
+
+    async def _descargar_churn(self, clave: tuple, params: dict) -> ChurnIndex:
+        generacion = self._generacion_churn
+        if self.settings.ZAP_CHURN_STREAMING:
+            # Nadie consume los productos antes de terminar: un corte a mitad
+            # del body se reintenta desde cero.
+            limite = time.monotonic() + self._politica.deadline
+            intento = 0
+            while True:
+                intento += 1
+                try:
+                    productos = [
+                        producto
+                        async for producto in self._stream_churn_intento(params, limite)
+                    ]
+                    break
+                except httpx.TransportError:
+                    if not await esperar_reintento(intento, self._politica, limite):
+                        raise
+            indice = ChurnIndex(productos)
+        else:
+            indice = ChurnIndex(await self._descargar_churn_completo(params))
+        # Si se invalido durante la descarga, no se guarda un resultado viejo.
+        if generacion == self._generacion_churn:
+            self._cache_churn.set(clave, indice)
+        return indice
+
+    async def _descargar_churn_completo(self, params: dict) -> list[RegistroChurn]:
+        url = f"{self.base_url}/kpi/product-churn"
+
+        async def _enviar(timeout: float) -> httpx.Response:
+            with MedicionRequest("zap", "product_churn") as medicion:
+                response = await self._get_client().get(url, params=params, timeout=timeout)
+                medicion.status(response.status_code)
+            return response
+
+        response = await enviar_con_resiliencia(_enviar, self.circuito, self._politica)
+        response.raise_for_status()
+        data = response.json()
+        # Los productos están en aging_products según la documentación
+        return [
+            RegistroChurn.desde_dict(producto)
+            for producto in data.get("aging_products", [])
+            if isinstance(producto, dict)
+        ]
+
+    async def _stream_churn(self, params: dict) -> AsyncIterator[RegistroChurn]:
+        """Parsea aging_products item por item mientras llegan los bytes y
+        guarda solo los campos que usan las reglas (RegistroChurn).
+
+        Un corte del body se reintenta solo si todavia no se entrego ningun
+        producto (el consumidor ya no puede descartarlos).
+        """
+        limite = time.monotonic() + self._politica.deadline
+        intento = 0
+        entregados = 0
+        while True:
+            intento += 1
+            try:
+                async for producto in self._stream_churn_intento(params, limite):
+                    entregados += 1
+                    yield producto
+                return
+            except httpx.TransportError:
+                if entregados or not await esperar_reintento(intento, self._politica, limite):
+                    raise
+
+    async def _stream_churn_intento(
+        self, params: dict, limite: float
+    ) -> AsyncIterator[RegistroChurn]:
+        url = f"{self.base_url}/kpi/product-churn"
+        client = self._get_client()
+
+        async def _enviar(timeout: float) -> httpx.Response:
+            # La latencia medida es hasta los headers; el body se lee despues.
+            with MedicionRequest("zap", "product_churn") as medicion:
+                request = client.build_request("GET", url, params=params, timeout=timeout)
+                response = await client.send(request, stream=True)
+                medicion.status(response.status_code)
+            return response
+
+        politica = replace(self._politica, deadline=max(limite - time.monotonic(), 0.001))
+        response = await enviar_con_resiliencia(
+            _enviar, self.circuito, politica, confirmar_exito=False
+        )
+        try:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            parser = ParserAgingProducts()
+            try:
+                async for chunk in response.aiter_bytes():
+                    for producto in parser.alimentar(chunk):
+                        yield producto
+            except httpx.TransportError:
+                # El corte del body cuenta como falla del upstream, igual que
+                # en el GET sin streaming.
+                self.circuito.registrar_falla()
+                raise
+            except BaseException:
+                self.circuito.liberar_prueba()
+                raise
+            self.circuito.registrar_exito()
+            for producto in parser.terminar():
+                yield producto
+        finally:
+            await response.aclose()
+
+    def invalidar_cache_churn(self) -> int:
+        self._generacion_churn += 1
+        self._churn_en_vuelo.clear()
+        return self._cache_churn.limpiar()
+
+    def stats_cache_churn(self) -> dict:
+        return {
+            **self._cache_churn.stats(),
+            "descargas_en_vuelo": len(self._churn_en_vuelo),
+        }
 
 
 zap_client = ZapClient()
@@ -0,0 +1,226 @@
+import codecs
+import json
+import re
+from typing import Callable, Optional
+
+from app.services.churn_index import RegistroChurn
+
+_ESPACIOS = " \t\n\r"
+_ESTRUCTURA = re.compile(r'[\[\]{}"]')
+_CADENA = re.compile(r'["\\]')
+_FIN_ESCALAR = re.compile(r"[,\]}\s]")
+
+
+class ParserAgingProducts:
+    """Parser incremental de `{"aging_products": [...], ...}`.
+
+    alimentar(bytes) devuelve los productos ya completos (como RegistroChurn,
+    solo con los campos que usan las reglas), sin esperar al resto del body.
+    Las demas claves del objeto se descartan sin decodificarlas.
+
+    Cada valor se decodifica directo si ya esta completo en el buffer. Si
+    llego partido, su fin se busca con un escaneo (profundidad de llaves y
+    corchetes, dentro/fuera de string) que continua donde quedo en el chunk
+    anterior, en vez de reintentar la decodificacion desde el principio con
+    cada chunk (costo cuadratico en valores grandes).
+    """
+
+    def __init__(
+        self,
+        clave: str = "aging_products",
+        construir: Callable[[dict], RegistroChurn] = RegistroChurn.desde_dict,
+    ):
+        self.clave = clave
+        self.construir = construir
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        # Escaneo del valor en curso: posicion, profundidad y si esta en un string
+        self._escaneo: Optional[int] = None
+        self._profundidad = 0
+        self._en_cadena = False
+        self._estado = "inicio"
+        self._clave_actual: Optional[str] = None
+        self.encontrada = False
+
+    def alimentar(self, datos: bytes) -> list[RegistroChurn]:
+        self._recortar(self._decoder.decode(datos))
+        return self._avanzar(final=False)
+
+    def terminar(self) -> list[RegistroChurn]:
+        self._recortar(self._decoder.decode(b"", final=True))
+        productos = self._avanzar(final=True)
+        if self._estado != "fin":
+            raise ValueError("Respuesta de ZAP incompleta o invalida")
+        return productos
+
+    def _recortar(self, texto: str) -> None:
+        # Se descarta lo ya consumido; el escaneo en curso se corre igual.
+        if self._escaneo is not None:
+            self._escaneo -= self._pos
+        self._buffer = self._buffer[self._pos:] + texto
+        self._pos = 0
+
+    def _saltar_espacios(self) -> Optional[str]:
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _ESPACIOS:
+            pos += 1
+        self._pos = pos
+        return buffer[pos] if pos < len(buffer) else None
+
+    def _fin_valor(self, final: bool) -> Optional[int]:
+        """Posicion donde termina el valor JSON que empieza en self._pos, o
+        None si todavia faltan bytes."""
+        buffer = self._buffer
+        if self._escaneo is None:
+            caracter = buffer[self._pos]
+            if caracter in "{[":
+                self._profundidad, self._en_cadena = 1, False
+            elif caracter == '"':
+                self._profundidad, self._en_cadena = 0, True
+            else:
+                # Numero o literal: un numero al final del buffer puede
+                # seguir en el proximo chunk.
+                fin = _FIN_ESCALAR.search(buffer, self._pos)
+                if fin is not None:
+                    return fin.start()
+                return len(buffer) if final else None
+            self._escaneo = self._pos + 1
+
+        pos = self._escaneo
+        while True:
+            if self._en_cadena:
+                encontrado = _CADENA.search(buffer, pos)
+                if encontrado is None:
+                    self._escaneo = len(buffer)
+                    return None
+                if encontrado.group() == "\\":
+                    if encontrado.end() >= len(buffer):
+                        # Escape partido entre chunks: se reescanea desde la barra.
+                        self._escaneo = encontrado.start()
+                        return None
+                    pos = encontrado.end() + 1
+                    continue
+                self._en_cadena = False
+                pos = encontrado.end()
+            else:
+                encontrado = _ESTRUCTURA.search(buffer, pos)
+                if encontrado is None:
+                    self._escaneo = len(buffer)
+                    return None
+                caracter = encontrado.group()
+                pos = encontrado.end()
+                if caracter == '"':
+                    self._en_cadena = True
+                    continue
+                self._profundidad += 1 if caracter in "{[" else -1
+            if self._profundidad == 0:
+                self._escaneo = None
+                return pos
+
+    def _completo(self) -> Optional[tuple]:
+        """(valor, fin) si el valor ya esta entero en el buffer. Solo se
+        intenta al empezar el valor; despues sigue el escaneo."""
+        # Numeros y literales se delimitan por el escaneo: "2" al final del
+        # chunk puede ser el comienzo de "2.5".
+        if self._escaneo is not None or self._buffer[self._pos] not in '{["':
+            return None
+        try:
+            valor, fin = self._json.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            return None
+        return valor, fin
+
+    def _decodificar(self, final: bool):
+        """Siguiente valor JSON completo, o None si faltan bytes."""
+        completo = self._completo()
+        if completo is not None:
+            self._pos = completo[1]
+            return (completo[0],)
+        fin = self._fin_valor(final)
+        if fin is None:
+            return None
+        try:
+            valor = json.loads(self._buffer[self._pos:fin])
+        except json.JSONDecodeError:
+            raise ValueError("Respuesta de ZAP invalida") from None
+        self._pos = fin
+        return (valor,)
+
+    def _saltar_valor(self, final: bool) -> bool:
+        """Avanza sobre un valor que no se usa, sin decodificarlo ni
+        retenerlo en el buffer mientras llega. False si faltan bytes."""
+        completo = self._completo()
+        if completo is not None:
+            self._pos = completo[1]
+            return True
+        fin = self._fin_valor(final)
+        if fin is None:
+            if self._escaneo is not None:
+                self._pos = self._escaneo
+            return False
+        self._pos = fin
+        return True
+
+    def _avanzar(self, final: bool) -> list[RegistroChurn]:
+        productos = []
+        while True:
+            caracter = self._saltar_espacios()
+            if caracter is None:
+                return productos
+            estado = self._estado
+
+            if estado == "inicio":
+                if caracter != "{":
+                    raise ValueError("Respuesta de ZAP invalida: se esperaba un objeto")
+                self._pos += 1
+                self._estado = "clave"
+
+            elif estado == "clave":
+                if caracter == ",":
+                    self._pos += 1
+                elif caracter == "}":
+                    self._pos += 1
+                    self._estado = "fin"
+                else:
+                    leido = self._decodificar(final)
+                    if leido is None:
+                        return productos
+                    self._clave_actual = leido[0]
+                    self._estado = "dos_puntos"
+
+            elif estado == "dos_puntos":
+                if caracter != ":":
+                    raise ValueError("Respuesta de ZAP invalida: se esperaba ':'")
+                self._pos += 1
+                self._estado = "valor"
+
+            elif estado == "valor":
+                # _escaneo: ya se esta saltando este valor (llego partido).
+                if self._escaneo is None and self._clave_actual == self.clave and caracter == "[":
+                    self._pos += 1
+                    self.encontrada = True
+                    self._estado = "lista"
+                else:
+                    if not self._saltar_valor(final):
+                        return productos
+                    self._estado = "clave"
+
+            elif estado == "lista":
+                if caracter == ",":
+                    self._pos += 1
+                elif caracter == "]":
+                    self._pos += 1
+                    self._estado = "clave"
+                else:
+                    leido = self._decodificar(final)
+                    if leido is None:
+                        return productos
+                    producto = leido[0]
+                    if isinstance(producto, dict):
+                        productos.append(self.construir(producto))
+
+            else:  # fin: se ignora lo que venga despues
+                self._pos = len(self._buffer)
+                return productos
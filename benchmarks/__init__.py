@@ -0,0 +1 @@
+"""Benchmarks del motor de reglas y del lote completo contra mock_upstream."""
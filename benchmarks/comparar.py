@@ -0,0 +1,76 @@
+"""Compara dos reportes JSON de benchmarks (base vs actual).
+
+    python -m benchmarks.comparar resultados/base.json resultados/actual.json --umbral 0.10
+
+Sale con codigo 1 si alguna metrica empeora mas que el umbral.
+"""
+import argparse
+import json
+import sys
+
+# Metrica -> True si "mas alto es mejor"
+METRICAS = {
+    "items_por_segundo": True,
+    "skus_por_segundo": True,
+    "latencia_sku_p50_ms": False,
+    "latencia_sku_p99_ms": False,
+    "rss_pico_mb": False,
+    "bytes_por_item": False,
+}
+
+
+def _clave(resultado: dict) -> tuple:
+    return resultado["nombre"], resultado.get("tamano"), resultado.get("modo_plan")
+
+
+def comparar(base: dict, actual: dict, umbral: float) -> list[dict]:
+    previos = {_clave(r): r for r in base["resultados"]}
+    filas = []
+    for resultado in actual["resultados"]:
+        previo = previos.get(_clave(resultado))
+        if previo is None:
+            continue
+        for metrica, mayor_es_mejor in METRICAS.items():
+            antes, despues = previo.get(metrica), resultado.get(metrica)
+            if not antes or despues is None:
+                continue
+            cambio = (despues - antes) / antes
+            empeora = -cambio if mayor_es_mejor else cambio
+            filas.append(
+                {
+                    "nombre": resultado["nombre"],
+                    "tamano": resultado.get("tamano"),
+                    "metrica": metrica,
+                    "antes": antes,
+                    "despues": despues,
+                    "cambio": round(cambio, 4),
+                    "regresion": empeora > umbral,
+                }
+            )
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("actual")
+    parser.add_argument("--umbral", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.actual, encoding="utf-8") as f:
+        actual = json.load(f)
+
+    filas = comparar(base, actual, args.umbral)
+    for fila in filas:
+        marca = "REGRESION" if fila["regresion"] else ""
+        print(
+            f"{fila['nombre']:<40} {str(fila['tamano'] or ''):>7} {fila['metrica']:<22} "
+            f"{fila['antes']:>12} -> {fila['despues']:>12} {fila['cambio']:+.1%} {marca}"
+        )
+    sys.exit(1 if any(f["regresion"] for f in filas) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Benchmark end-to-end de procesar_descuentos_automaticos contra mock_upstream.
+
+    python -m benchmarks.end_to_end --productos 5000 --latencia-ms 20 --salida resultados/e2e.json
+
+El mock corre en un hilo del mismo proceso; el RSS pico incluye ambos.
+Los limitadores y la concurrencia se ajustan con las variables de entorno
+de Settings (AVAX_RATE_LECTURA_INICIAL, PIPELINE_LECTORES, ...).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import uvicorn
+
+from mock_upstream import crear_app
+from mock_upstream.fallas import ConfigFallas
+
+from .util import guardar_resultados, percentil, rss_pico_mb
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_mock(app, puerto: int) -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning", lifespan="off")
+    )
+    hilo = threading.Thread(target=server.run, daemon=True)
+    hilo.start()
+    while not server.started:
+        if not hilo.is_alive():
+            raise RuntimeError("No se pudo iniciar mock_upstream")
+        time.sleep(0.05)
+    return server
+
+
+async def correr(args) -> dict:
+    # Importar despues de configurar el entorno: Settings y clientes se crean al importar.
+    from app.scheduler.jobs import procesar_descuentos_automaticos
+    from app.services.avax_client import avax_client
+    from app.services.descuento_auto import descuento_auto
+    from app.services.zap_client import zap_client
+
+    from app.services.descuento_auto.descuento_pipeline import PipelineDescuentos
+
+    latencias = []
+    procesar_original = descuento_auto.procesar_producto_seguro
+    terminar_original = PipelineDescuentos._terminar
+
+    async def procesar_medido(*a, **kw):
+        inicio = time.perf_counter()
+        try:
+            return await procesar_original(*a, **kw)
+        finally:
+            latencias.append(time.perf_counter() - inicio)
+
+    async def terminar_medido(self, trabajo):
+        # En el pipeline, la latencia incluye la espera en las colas.
+        latencias.append(time.perf_counter() - trabajo.inicio)
+        await terminar_original(self, trabajo)
+
+    descuento_auto.procesar_producto_seguro = procesar_medido
+    PipelineDescuentos._terminar = terminar_medido
+    await avax_client.iniciar()
+    await zap_client.iniciar()
+    try:
+        inicio = time.perf_counter()
+        resultado = await procesar_descuentos_automaticos(modo_plan=args.modo_plan)
+        duracion = time.perf_counter() - inicio
+    finally:
+        descuento_auto.procesar_producto_seguro = procesar_original
+        PipelineDescuentos._terminar = terminar_original
+        await avax_client.cerrar()
+        await zap_client.cerrar()
+
+    return {
+        "nombre": "procesar_descuentos_automaticos",
+        "modo_plan": args.modo_plan,
+        "segundos": round(duracion, 3),
+        "skus": resultado.productos_evaluados,
+        "skus_por_segundo": round(resultado.productos_evaluados / duracion, 1) if duracion else None,
+        "latencia_sku_p50_ms": _ms(percentil(latencias, 50)),
+        "latencia_sku_p99_ms": _ms(percentil(latencias, 99)),
+        "latencia_sku_max_ms": _ms(max(latencias) if latencias else None),
+        "modificados": resultado.productos_modificados,
+        "planificados": resultado.productos_planificados,
+        "no_aptos": resultado.productos_no_aptos,
+        "excluidos": resultado.productos_excluidos,
+        "errores": resultado.errores,
+        "error_general": resultado.error_general,
+        "rss_pico_mb": rss_pico_mb(),
+        "etapas": {
+            nombre: etapa.model_dump() for nombre, etapa in resultado.etapas.items()
+        }
+        if resultado.etapas
+        else None,
+    }
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3) if segundos is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--productos", type=int, default=2000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--latencia-ms", type=float, default=10)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--tasa-error", type=float, default=0)
+    parser.add_argument("--tasa-429", type=float, default=0)
+    parser.add_argument("--modo-plan", action="store_true")
+    parser.add_argument(
+        "--concurrencia",
+        type=int,
+        default=None,
+        help="Con pipeline: lectores (escritores = la mitad); "
+        "con --sin-pipeline: BATCH_CONCURRENCIA",
+    )
+    parser.add_argument(
+        "--sin-pipeline",
+        action="store_true",
+        help="Un SKU completo por tarea (PIPELINE_ACTIVO=false)",
+    )
+    parser.add_argument(
+        "--request-delay",
+        type=int,
+        default=0,
+        help="REQUEST_DELAY del servicio (0 para no medir la espera fija de precios)",
+    )
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    fallas = ConfigFallas(
+        latencia_ms=args.latencia_ms,
+        latencia_jitter_ms=args.jitter_ms,
+        tasa_error=args.tasa_error,
+        tasa_429=args.tasa_429,
+    )
+    app = crear_app(
+        productos=args.productos,
+        semilla=args.semilla,
+        fallas={"avax": fallas, "zap": ConfigFallas(latencia_ms=args.latencia_ms)},
+    )
+    puerto = _puerto_libre()
+    server = iniciar_mock(app, puerto)
+
+    directorio = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ.setdefault("AVAX_TOKEN", "bench")
+    os.environ.setdefault("ZAP_TOKEN", "bench")
+    os.environ["AVAX_BASE_URL"] = f"http://127.0.0.1:{puerto}/v1"
+    os.environ["ZAP_BASE_URL"] = f"http://127.0.0.1:{puerto}"
+    # Todo el estado local va al directorio temporal: ni se mezcla con el
+    # de data/ ni queda un lock o una corrida a medias entre benchmarks.
+    for variable, nombre in (
+        ("CONFIG_PATH", "configuracion.json"),
+        ("LOCKS_DIR", "locks"),
+        ("JOURNAL_PATH", "journal.sqlite3"),
+        ("HISTORIAL_PATH", "historial.sqlite3"),
+        ("RESULTADOS_DIR", "resultados"),
+        ("PLANES_PATH", "planes.sqlite3"),
+    ):
+        os.environ[variable] = os.path.join(directorio, nombre)
+    os.environ["REQUEST_DELAY"] = str(args.request_delay)
+    if args.sin_pipeline:
+        os.environ["PIPELINE_ACTIVO"] = "false"
+    if args.concurrencia:
+        # BATCH_CONCURRENCIA solo rige sin pipeline (y al ejecutar un plan).
+        os.environ["BATCH_CONCURRENCIA"] = str(args.concurrencia)
+        if not args.sin_pipeline:
+            os.environ["PIPELINE_LECTORES"] = str(args.concurrencia)
+            os.environ["PIPELINE_ESCRITORES"] = str(max(args.concurrencia // 2, 1))
+
+    try:
+        resultado = asyncio.run(correr(args))
+        resultado["llamadas_upstream"] = app.state.registro.resumen()
+    finally:
+        server.should_exit = True
+
+    guardar_resultados(
+        args.salida,
+        "end_to_end",
+        [resultado],
+        {k: v for k, v in vars(args).items() if k != "salida"},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Micro-benchmarks del motor de reglas, la serializacion y la memoria del churn.
+
+La equivalencia del evaluador vectorizado con el escalar la cubre
+tests/test_descuento_vectorizado.py.
+
+    python -m benchmarks.micro --tamanos 1000,10000,100000 --salida resultados/micro.json
+"""
+import argparse
+import json
+from datetime import date
+
+from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.schemas.respuestas_descuento import RespProcesarProductos
+from app.services.churn_index import ChurnIndex, RegistroChurn
+from app.services.descuento_auto.descuento_helpers import (
+    armar_resp_aplicado,
+    armar_resp_no_apto,
+    armar_resp_no_apto_prefiltro,
+    armar_resp_planificado,
+    build_umbrales,
+)
+from app.services.descuento_auto.descuento_logic import DescuentosService
+from app.services.descuento_auto.descuento_vectorizado import evaluar_catalogo
+from mock_upstream.catalogo import CatalogoSintetico
+
+from .util import catalogo_alineado, guardar_resultados, medir, medir_memoria
+
+CONFIG = ConfigEstadoLogica(
+    last_import_age_max=500,
+    days_since_last_sale_min=80,
+    ult_modificacion_descuento=80,
+)
+ESTADO = EstadoLogica.REGULAR
+
+
+def _formatos_fecha(avax: list[dict]) -> list:
+    """Mezcla de formatos reales: ISO, RFC 1123 (GMT) y vacio."""
+    fechas = []
+    for i, producto in enumerate(avax):
+        fecha = producto["ult_actualizacion_descuento_automatico"]
+        if fecha and i % 2:
+            fecha = date.fromisoformat(fecha).strftime("%a, %d %b %Y 00:00:00 GMT")
+        fechas.append(fecha)
+    return fechas
+
+
+def benchmarks_tamano(tamano: int, repeticiones: int) -> list[dict]:
+    zap, avax = catalogo_alineado(tamano)
+    n = len(zap)
+    hoy = date.today()
+    fechas = _formatos_fecha(avax)
+    evaluaciones = [
+        DescuentosService.evaluar_producto(z, a, CONFIG, ESTADO, hoy)
+        for z, a in zip(zap, avax)
+    ]
+    pares = list(zip(zap, avax, evaluaciones))
+    # aplicado/planificado solo se arman para SKUs que cambian
+    cambios = [par for par in pares if par[2]["debe_actualizar"]]
+
+    resultados = [
+        medir(
+            "evaluar_producto",
+            n,
+            lambda: [
+                DescuentosService.evaluar_producto(z, a, CONFIG, ESTADO, hoy)
+                for z, a in zip(zap, avax)
+            ],
+            repeticiones,
+        ),
+        medir(
+            "evaluar_catalogo_vectorizado",
+            n,
+            lambda: evaluar_catalogo(zap, avax, CONFIG, ESTADO, hoy),
+            repeticiones,
+        ),
+        medir(
+            "parse_fecha_modificacion",
+            n,
+            lambda: [DescuentosService.parse_fecha_modificacion(f) for f in fechas],
+            repeticiones,
+        ),
+        medir(
+            "build_umbrales",
+            n,
+            lambda: [build_umbrales(CONFIG) for _ in range(n)],
+            repeticiones,
+        ),
+        medir(
+            "armar_resp_no_apto",
+            n,
+            lambda: [
+                armar_resp_no_apto(a["cod_prod"], ESTADO, e, CONFIG, a)
+                for _, a, e in pares
+            ],
+            repeticiones,
+        ),
+        medir(
+            "armar_resp_no_apto_prefiltro",
+            n,
+            lambda: [
+                armar_resp_no_apto_prefiltro(z.sku, ESTADO, z, CONFIG)
+                for z, _, _ in pares
+            ],
+            repeticiones,
+        ),
+        medir(
+            "armar_resp_aplicado",
+            len(cambios),
+            lambda: [
+                armar_resp_aplicado(
+                    a["cod_prod"], ESTADO, e, CONFIG, a, {"categoria_liquidacion_agregada": True}
+                )
+                for _, a, e in cambios
+            ],
+            repeticiones,
+        ),
+        medir(
+            "armar_resp_planificado",
+            len(cambios),
+            lambda: [
+                armar_resp_planificado(
+                    "bench", a["cod_prod"], ESTADO, e, CONFIG, a,
+                    {"categoria_agregada": False, "actualiza_precio": False},
+                )
+                for _, a, e in cambios
+            ],
+            repeticiones,
+        ),
+    ]
+
+    detalles = [
+        armar_resp_no_apto(a["cod_prod"], ESTADO, e, CONFIG, a) for _, a, e in pares
+    ]
+    respuesta = RespProcesarProductos(
+        estado_ejecutado=ESTADO.value,
+        umbrales_usados=build_umbrales(CONFIG),
+        productos_evaluados=n,
+        productos_no_aptos=n,
+        detalle_resultados=detalles,
+    )
+    resultados.append(
+        medir("RespProcesarProductos.model_dump_json", n, respuesta.model_dump_json, repeticiones)
+    )
+    resultados.append(
+        medir(
+            "RespProcesarProductos.model_validate",
+            n,
+            lambda: RespProcesarProductos.model_validate(respuesta.model_dump()),
+            repeticiones,
+        )
+    )
+    resultados.extend(benchmarks_memoria_churn(tamano))
+    return resultados
+
+
+def benchmarks_memoria_churn(tamano: int) -> list[dict]:
+    """Indice del churn con el dict crudo de ZAP por SKU vs RegistroChurn."""
+    catalogo = CatalogoSintetico(productos=tamano, semilla=42, fraccion_sin_avax=0)
+    # Copia via JSON: strings propios, como si vinieran de la respuesta HTTP.
+    crudo = json.dumps(catalogo.churn)
+    del catalogo
+    return [
+        medir_memoria(
+            "churn_indice_dicts",
+            tamano,
+            lambda: ChurnIndex(json.loads(crudo)),
+        ),
+        medir_memoria(
+            "churn_indice_registros",
+            tamano,
+            lambda: ChurnIndex(
+                [RegistroChurn.desde_dict(fila) for fila in json.loads(crudo)]
+            ),
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tamanos", default="1000,10000,100000")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--salida", default=None, help="Archivo JSON de resultados")
+    args = parser.parse_args()
+
+    tamanos = [int(t) for t in args.tamanos.split(",") if t]
+    resultados = []
+    for tamano in tamanos:
+        resultados.extend(benchmarks_tamano(tamano, args.repeticiones))
+    guardar_resultados(
+        args.salida,
+        "micro",
+        resultados,
+        {"tamanos": tamanos, "repeticiones": args.repeticiones},
+    )
+
+
+if __name__ == "__main__":
+    main()
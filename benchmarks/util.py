@@ -0,0 +1,113 @@
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.services.churn_index import RegistroChurn
+from mock_upstream.catalogo import CatalogoSintetico
+
+
+def catalogo_alineado(
+    productos: int, semilla: int = 42
+) -> tuple[list[RegistroChurn], list[dict]]:
+    """Pares (zap, avax) del catalogo sintetico, solo SKUs presentes en ambos.
+    El churn va como RegistroChurn, igual que lo entrega ZapClient."""
+    catalogo = CatalogoSintetico(productos=productos, semilla=semilla, fraccion_sin_avax=0)
+    filas = [fila for fila in catalogo.churn if fila["sku"] in catalogo.avax]
+    zap = [RegistroChurn.desde_dict(fila) for fila in filas]
+    avax = [catalogo.avax[fila["sku"]] for fila in filas]
+    return zap, avax
+
+
+def medir(
+    nombre: str,
+    tamano: int,
+    funcion: Callable[[], object],
+    repeticiones: int = 3,
+) -> dict:
+    """Mejor tiempo de `repeticiones` corridas de funcion() sobre `tamano` items."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    mejor = min(tiempos)
+    return {
+        "nombre": nombre,
+        "tamano": tamano,
+        "segundos": round(mejor, 6),
+        "items_por_segundo": round(tamano / mejor, 1) if mejor else None,
+        "ns_por_item": round(mejor / tamano * 1e9, 1) if tamano else None,
+    }
+
+
+def medir_memoria(nombre: str, tamano: int, construir: Callable[[], object]) -> dict:
+    """Bytes que retiene lo que devuelve construir() (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        antes = tracemalloc.get_traced_memory()[0]
+        objeto = construir()
+        retenidos = tracemalloc.get_traced_memory()[0] - antes
+    finally:
+        tracemalloc.stop()
+    del objeto
+    return {
+        "nombre": nombre,
+        "tamano": tamano,
+        "bytes": retenidos,
+        "bytes_por_item": round(retenidos / tamano, 1) if tamano else None,
+    }
+
+
+def percentil(valores: list[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def rss_pico_mb() -> float:
+    # ru_maxrss esta en KB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(rss / divisor, 1)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def guardar_resultados(ruta: Optional[str], suite: str, resultados: list[dict], parametros: dict) -> dict:
+    reporte = {
+        "suite": suite,
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "rss_pico_mb": rss_pico_mb(),
+        },
+        "parametros": parametros,
+        "resultados": resultados,
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if ruta:
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        Path(ruta).write_text(texto + "\n", encoding="utf-8")
+    print(texto)
+    return reporte
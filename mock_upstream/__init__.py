@@ -0,0 +1,5 @@
+"""Servidor local que imita AVAX y ZAP para pruebas de rendimiento."""
+
+from .server import crear_app
+
+__all__ = ["crear_app"]
@@ -0,0 +1,47 @@
+import argparse
+
+import uvicorn
+
+from .fallas import ConfigFallas
+from .server import crear_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local de AVAX y ZAP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--productos", type=int, default=1000)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--fraccion-sin-avax", type=float, default=0.02)
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--tasa-error", type=float, default=0)
+    parser.add_argument("--tasa-429", type=float, default=0)
+    parser.add_argument("--limite-rps", type=float, default=0)
+    args = parser.parse_args()
+
+    # Los flags aplican a AVAX; ZAP se ajusta luego con PUT /_mock/fallas/zap
+    fallas = {
+        "avax": ConfigFallas(
+            latencia_ms=args.latencia_ms,
+            latencia_jitter_ms=args.jitter_ms,
+            tasa_error=args.tasa_error,
+            tasa_429=args.tasa_429,
+            limite_rps=args.limite_rps,
+        )
+    }
+    app = crear_app(
+        productos=args.productos,
+        semilla=args.semilla,
+        fraccion_sin_avax=args.fraccion_sin_avax,
+        fallas=fallas,
+    )
+    print(
+        f"AVAX_BASE_URL=http://{args.host}:{args.port}/v1 "
+        f"ZAP_BASE_URL=http://{args.host}:{args.port}"
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import random
+from datetime import date, timedelta
+from typing import Optional
+
+DESCUENTOS = ["Sin descuento", "PUSH1", "PUSH2", "LIQUIDACION"]
+ESQ_COSTOS = ["DA_35R_T0", "DA_35R_T1", "NDA_25M_T0", "NDA_25M_T1", "LIQ_20M", "LIQ_30M"]
+
+
+class CatalogoSintetico:
+    """Catalogo AVAX + filas de product-churn de ZAP generados con semilla.
+
+    - fraccion_sin_avax: SKUs que aparecen en ZAP pero dan 404 en AVAX.
+    - fraccion_sin_auto: SKUs con descuentos_automaticos = False.
+    """
+
+    def __init__(
+        self,
+        productos: int = 1000,
+        semilla: int = 42,
+        fraccion_sin_avax: float = 0.02,
+        fraccion_sin_auto: float = 0.1,
+        hoy: Optional[date] = None,
+    ):
+        self.productos = productos
+        self.semilla = semilla
+        self.fraccion_sin_avax = fraccion_sin_avax
+        self.fraccion_sin_auto = fraccion_sin_auto
+        self.hoy = hoy or date.today()
+        self.avax: dict[str, dict] = {}
+        self.churn: list[dict] = []
+        self.generar()
+
+    def generar(self) -> None:
+        rnd = random.Random(self.semilla)
+        self.avax = {}
+        self.churn = []
+        for i in range(self.productos):
+            cod_prod = f"MK{i:07d}"
+            self.churn.append(self._fila_churn(rnd, cod_prod))
+            if rnd.random() >= self.fraccion_sin_avax:
+                self.avax[cod_prod] = self._producto_avax(rnd, cod_prod)
+
+    def _fila_churn(self, rnd: random.Random, cod_prod: str) -> dict:
+        dias_venta = rnd.choice([None, 0, rnd.randint(1, 60), rnd.randint(61, 400)])
+        return {
+            "sku": cod_prod,
+            "last_import_age_max": rnd.choice([None, 0, rnd.randint(1, 1200)]),
+            "days_since_last_sale_min": dias_venta,
+            "stock": rnd.randint(0, 300),
+            "units_sold": rnd.randint(0, 50),
+        }
+
+    def _producto_avax(self, rnd: random.Random, cod_prod: str) -> dict:
+        dias_mod = rnd.choice([None, rnd.randint(0, 60), rnd.randint(61, 500)])
+        ult_mod = (
+            (self.hoy - timedelta(days=dias_mod)).isoformat() if dias_mod is not None else None
+        )
+        return {
+            "cod_prod": cod_prod,
+            "nombre": f"Producto {cod_prod}",
+            "id_marca": rnd.randint(1, 40),
+            "id_genero": rnd.choice(["H", "M", "U"]),
+            "id_tipo_producto": rnd.randint(1, 15),
+            "id_subtipo_producto": rnd.randint(1, 60),
+            "valid_web": True,
+            "retail_val": round(rnd.uniform(20, 600), 2),
+            "retail_mto": round(rnd.uniform(20, 600), 2),
+            "penalizacion_orden": 0,
+            "descuentos_automaticos": rnd.random() >= self.fraccion_sin_auto,
+            "id_descuento": rnd.choice(DESCUENTOS),
+            "id_esq_costo": rnd.choice(ESQ_COSTOS),
+            "ult_actualizacion_descuento_automatico": ult_mod,
+            "generos": [{"id_genero": "U"}],
+            "productos_listas_precios": [{"id_lista_precio": "WEB"}],
+            "conjunto_categorias": [{"id_conjunto_categoria": rnd.randint(1, 9)}],
+            "siluetas": [{"id_silueta": rnd.randint(1, 20)}],
+            "categorias": [{"id_categoria": rnd.choice(["Calzado", "Ropa", "Accesorios"])}],
+        }
+
+    def aplicar_patch(self, cod_prod: str, payload: dict) -> dict:
+        producto = self.avax[cod_prod]
+        for campo in (
+            "id_descuento",
+            "id_esq_costo",
+            "valid_web",
+            "ult_actualizacion_descuento_automatico",
+        ):
+            if campo in payload:
+                producto[campo] = payload[campo]
+        return producto
+
+    def aplicar_categorias(self, cod_prod: str, categorias: list[str]) -> dict:
+        producto = self.avax[cod_prod]
+        producto["categorias"] = [{"id_categoria": c} for c in categorias]
+        return producto
+
+    def resumen(self) -> dict:
+        return {
+            "productos_zap": len(self.churn),
+            "productos_avax": len(self.avax),
+            "semilla": self.semilla,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class ConfigFallas(BaseModel):
+    """Inyeccion de latencia y errores para un upstream."""
+
+    latencia_ms: float = Field(0, ge=0)
+    latencia_jitter_ms: float = Field(0, ge=0)
+    # Probabilidad de cola lenta: latencia_cola_ms en vez de latencia_ms
+    tasa_lenta: float = Field(0, ge=0, le=1)
+    latencia_cola_ms: float = Field(0, ge=0)
+    tasa_error: float = Field(0, ge=0, le=1)
+    status_error: int = 503
+    tasa_429: float = Field(0, ge=0, le=1)
+    retry_after: Optional[float] = 1.0
+    # Limite duro de requests/s (0 = sin limite); el exceso recibe 429
+    limite_rps: float = Field(0, ge=0)
+
+
+class InyectorFallas:
+    def __init__(self, semilla: Optional[int] = None):
+        self.config: dict[str, ConfigFallas] = {
+            "avax": ConfigFallas(),
+            "zap": ConfigFallas(),
+        }
+        self._random = random.Random(semilla)
+        self._ventanas: dict[str, deque] = {}
+
+    def configurar(self, upstream: str, config: ConfigFallas) -> None:
+        self.config[upstream] = config
+        self._ventanas.pop(upstream, None)
+
+    async def demorar(self, upstream: str) -> None:
+        cfg = self.config[upstream]
+        if cfg.tasa_lenta and self._random.random() < cfg.tasa_lenta:
+            base = cfg.latencia_cola_ms
+        else:
+            base = cfg.latencia_ms
+        demora = base + self._random.uniform(0, cfg.latencia_jitter_ms)
+        if demora > 0:
+            await asyncio.sleep(demora / 1000)
+
+    def falla(self, upstream: str) -> Optional[tuple[int, dict]]:
+        """(status, headers) si el request debe fallar, o None."""
+        cfg = self.config[upstream]
+        if cfg.limite_rps and self._excede_limite(upstream, cfg.limite_rps):
+            return 429, self._headers_429(cfg)
+        if cfg.tasa_429 and self._random.random() < cfg.tasa_429:
+            return 429, self._headers_429(cfg)
+        if cfg.tasa_error and self._random.random() < cfg.tasa_error:
+            return cfg.status_error, {}
+        return None
+
+    def _excede_limite(self, upstream: str, limite_rps: float) -> bool:
+        ahora = time.monotonic()
+        ventana = self._ventanas.setdefault(upstream, deque())
+        while ventana and ahora - ventana[0] >= 1.0:
+            ventana.popleft()
+        if len(ventana) >= limite_rps:
+            return True
+        ventana.append(ahora)
+        return False
+
+    @staticmethod
+    def _headers_429(cfg: ConfigFallas) -> dict:
+        if cfg.retry_after is None:
+            return {}
+        return {"Retry-After": f"{cfg.retry_after:g}"}
+
+
+class RegistroLlamadas:
+    """Llamadas recibidas (ultimas max_items) y contadores acumulados."""
+
+    def __init__(self, max_items: int = 100_000):
+        self.llamadas: deque = deque(maxlen=max_items)
+        self.por_operacion: Counter = Counter()
+        self.por_status: Counter = Counter()
+        self.en_vuelo = 0
+        self.max_en_vuelo = 0
+
+    def entrar(self) -> None:
+        self.en_vuelo += 1
+        self.max_en_vuelo = max(self.max_en_vuelo, self.en_vuelo)
+
+    def salir(
+        self,
+        upstream: str,
+        operacion: str,
+        metodo: str,
+        ruta: str,
+        status: int,
+        inicio: float,
+        latencia: float,
+    ) -> None:
+        self.en_vuelo -= 1
+        self.llamadas.append(
+            {
+                "ts": inicio,
+                "upstream": upstream,
+                "operacion": operacion,
+                "metodo": metodo,
+                "ruta": ruta,
+                "status": status,
+                "latencia_ms": round(latencia * 1000, 3),
+            }
+        )
+        self.por_operacion[operacion] += 1
+        self.por_status[str(status)] += 1
+
+    def resumen(self) -> dict:
+        return {
+            "total": sum(self.por_operacion.values()),
+            "por_operacion": dict(self.por_operacion),
+            "por_status": dict(self.por_status),
+            "en_vuelo": self.en_vuelo,
+            "max_en_vuelo": self.max_en_vuelo,
+        }
+
+    def limpiar(self) -> None:
+        self.llamadas.clear()
+        self.por_operacion.clear()
+        self.por_status.clear()
+        self.max_en_vuelo = self.en_vuelo
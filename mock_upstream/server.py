@@ -0,0 +1,165 @@
+import re
+import time
+from typing import Optional
+
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+
+from .catalogo import CatalogoSintetico
+from .fallas import ConfigFallas, InyectorFallas, RegistroLlamadas
+
+AVAX_PREFIJO = "/v1"
+
+_OPERACIONES = [
+    ("avax", "actualizar_precio", re.compile(r"^/v1/empleados/productos/[^/]+/actions/actualizar_precio$")),
+    ("avax", "actualizar_categorias", re.compile(r"^/v1/empleados/categorias_productos/[^/]+$")),
+    ("avax", "producto", re.compile(r"^/v1/empleados/productos/[^/]+$")),
+    ("zap", "product_churn", re.compile(r"^/kpi/product-churn$")),
+]
+
+
+def clasificar(metodo: str, ruta: str) -> Optional[tuple[str, str]]:
+    """(upstream, operacion) de una ruta imitada, o None (rutas /_mock)."""
+    for upstream, operacion, patron in _OPERACIONES:
+        if patron.match(ruta):
+            if operacion == "producto":
+                operacion = "get_producto" if metodo == "GET" else "patch_producto"
+            return upstream, operacion
+    return None
+
+
+def crear_app(
+    productos: int = 1000,
+    semilla: int = 42,
+    fraccion_sin_avax: float = 0.02,
+    fallas: Optional[dict[str, ConfigFallas]] = None,
+) -> FastAPI:
+    """App con AVAX en /v1, ZAP en /kpi y control en /_mock.
+
+    Apuntar el servicio con AVAX_BASE_URL=http://host:port/v1 y
+    ZAP_BASE_URL=http://host:port.
+    """
+    app = FastAPI(title="Mock AVAX/ZAP")
+    app.state.catalogo = CatalogoSintetico(
+        productos=productos, semilla=semilla, fraccion_sin_avax=fraccion_sin_avax
+    )
+    app.state.fallas = InyectorFallas(semilla=semilla)
+    app.state.registro = RegistroLlamadas()
+    for upstream, config in (fallas or {}).items():
+        app.state.fallas.configurar(upstream, config)
+
+    @app.middleware("http")
+    async def inyectar_y_registrar(request: Request, call_next):
+        clasificacion = clasificar(request.method, request.url.path)
+        if clasificacion is None:
+            return await call_next(request)
+
+        upstream, operacion = clasificacion
+        registro: RegistroLlamadas = app.state.registro
+        fallas: InyectorFallas = app.state.fallas
+        inicio = time.time()
+        t0 = time.perf_counter()
+        registro.entrar()
+        status = 500
+        try:
+            await fallas.demorar(upstream)
+            falla = fallas.falla(upstream)
+            if falla is not None:
+                status, headers = falla
+                return JSONResponse(
+                    {"error": "falla inyectada", "status": status},
+                    status_code=status,
+                    headers=headers,
+                )
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            registro.salir(
+                upstream,
+                operacion,
+                request.method,
+                request.url.path,
+                status,
+                inicio,
+                time.perf_counter() - t0,
+            )
+
+    def obtener_producto(cod_prod: str) -> dict:
+        producto = app.state.catalogo.avax.get(cod_prod)
+        if producto is None:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        return producto
+
+    # ===================== AVAX =====================
+
+    @app.get(AVAX_PREFIJO + "/empleados/productos/{cod_prod}")
+    async def get_producto(cod_prod: str):
+        return {"data": obtener_producto(cod_prod)}
+
+    @app.patch(AVAX_PREFIJO + "/empleados/productos/{cod_prod}")
+    async def patch_producto(cod_prod: str, payload: dict = Body(...)):
+        obtener_producto(cod_prod)
+        return {"data": app.state.catalogo.aplicar_patch(cod_prod, payload)}
+
+    @app.post(AVAX_PREFIJO + "/empleados/productos/{cod_prod}/actions/actualizar_precio")
+    async def actualizar_precio(cod_prod: str):
+        obtener_producto(cod_prod)
+        return {"ok": True, "cod_prod": cod_prod}
+
+    @app.put(AVAX_PREFIJO + "/empleados/categorias_productos/{cod_prod}")
+    async def actualizar_categorias(cod_prod: str, payload: dict = Body(...)):
+        obtener_producto(cod_prod)
+        producto = app.state.catalogo.aplicar_categorias(
+            cod_prod, payload.get("id_categorias", [])
+        )
+        return {"data": producto["categorias"]}
+
+    # ===================== ZAP =====================
+
+    @app.get("/kpi/product-churn")
+    async def product_churn():
+        return {"aging_products": app.state.catalogo.churn}
+
+    # ===================== CONTROL =====================
+
+    @app.get("/_mock/fallas")
+    async def ver_fallas():
+        return app.state.fallas.config
+
+    @app.put("/_mock/fallas/{upstream}")
+    async def configurar_fallas(upstream: str, config: ConfigFallas):
+        if upstream not in app.state.fallas.config:
+            raise HTTPException(status_code=404, detail=f"Upstream desconocido: {upstream}")
+        app.state.fallas.configurar(upstream, config)
+        return config
+
+    @app.get("/_mock/llamadas")
+    async def ver_llamadas(ultimas: int = Query(0, ge=0)):
+        registro: RegistroLlamadas = app.state.registro
+        respuesta = registro.resumen()
+        if ultimas:
+            respuesta["llamadas"] = list(registro.llamadas)[-ultimas:]
+        return respuesta
+
+    @app.delete("/_mock/llamadas")
+    async def limpiar_llamadas():
+        app.state.registro.limpiar()
+        return {"ok": True}
+
+    @app.get("/_mock/catalogo")
+    async def ver_catalogo():
+        return app.state.catalogo.resumen()
+
+    @app.post("/_mock/catalogo")
+    async def regenerar_catalogo(
+        productos: int = Query(..., ge=0),
+        semilla: int = Query(42),
+        fraccion_sin_avax: float = Query(0.02, ge=0, le=1),
+    ):
+        app.state.catalogo = CatalogoSintetico(
+            productos=productos, semilla=semilla, fraccion_sin_avax=fraccion_sin_avax
+        )
+        return app.state.catalogo.resumen()
+
+    return app
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Settings exige los tokens; los archivos de estado van a un directorio temporal.
+_DATOS = tempfile.mkdtemp(prefix="avax_descuentos_tests_")
+os.environ.setdefault("AVAX_TOKEN", "token-tests")
+os.environ.setdefault("ZAP_TOKEN", "token-tests")
+os.environ.setdefault("REQUEST_DELAY", "0")
+os.environ.setdefault("CONFIG_PATH", os.path.join(_DATOS, "configuracion.json"))
+os.environ.setdefault("LOCKS_DIR", os.path.join(_DATOS, "locks"))
+os.environ.setdefault("JOURNAL_PATH", os.path.join(_DATOS, "journal.sqlite3"))
+os.environ.setdefault("HISTORIAL_PATH", os.path.join(_DATOS, "historial.sqlite3"))
+os.environ.setdefault("RESULTADOS_DIR", os.path.join(_DATOS, "resultados"))
+os.environ.setdefault("PLANES_PATH", os.path.join(_DATOS, "planes.sqlite3"))
@@ -0,0 +1,61 @@
+import pytest
+
+from app.services import cache as cache_modulo
+from app.services.cache import CacheTTL
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_modulo.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+def test_hit_y_miss():
+    cache = CacheTTL(ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b", "default") == "default"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_expira_por_entrada(reloj):
+    cache = CacheTTL(ttl=10)
+    cache.set("corto", 1, ttl=1)
+    cache.set("largo", 2)
+    reloj[0] += 5
+    assert cache.get("corto") is None
+    assert cache.get("largo") == 2
+    reloj[0] += 5
+    assert cache.get("largo") is None
+    assert cache.stats()["entradas"] == 0
+
+
+def test_descarta_el_menos_usado():
+    cache = CacheTTL(ttl=60, max_items=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+@pytest.mark.parametrize("ttl, max_items", [(0, 10), (60, 0)])
+def test_desactivado(ttl, max_items):
+    cache = CacheTTL(ttl=ttl, max_items=max_items)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_invalidar_y_limpiar():
+    cache = CacheTTL(ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.invalidar("a") is True
+    assert cache.invalidar("a") is False
+    assert cache.limpiar() == 1
+    assert cache.get("b") is None
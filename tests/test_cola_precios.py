@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.cola_precios import ColaActualizacionPrecios
+
+
+def _cola(demoras: dict[str, float], fallan: tuple = ()) -> ColaActualizacionPrecios:
+    async def actualizar(cod_prod: str) -> dict:
+        await asyncio.sleep(demoras.get(cod_prod, 0))
+        if cod_prod in fallan:
+            raise RuntimeError(f"fallo {cod_prod}")
+        return {}
+
+    return ColaActualizacionPrecios(actualizar, concurrencia=4)
+
+
+def test_drena_todo():
+    async def correr():
+        cola = _cola({}, fallan=("B",))
+        cola.programar("A", 0)
+        cola.programar("B", 0.01)
+        cola.programar("C", 0.02)
+        return await cola.drenar(timeout=5)
+
+    resultado = asyncio.run(correr())
+    assert sorted(resultado["completadas"]) == ["A", "C"]
+    assert resultado["fallidas"] == {"B": "fallo B"}
+    assert resultado["pendientes"] == []
+
+
+def test_timeout_reporta_en_vuelo_y_programados():
+    async def correr():
+        cola = _cola({"LENTO": 10})
+        cola.programar("RAPIDO", 0)
+        cola.programar("LENTO", 0)
+        cola.programar("FUTURO", 60)
+        await asyncio.sleep(0.05)
+        inicio = asyncio.get_running_loop().time()
+        resultado = await cola.drenar(timeout=0.2)
+        return resultado, asyncio.get_running_loop().time() - inicio, cola
+
+    resultado, duracion, cola = asyncio.run(correr())
+    assert resultado["completadas"] == ["RAPIDO"]
+    assert sorted(resultado["pendientes"]) == ["FUTURO", "LENTO"]
+    # Un solo deadline para todo el drenaje.
+    assert duracion < 1
+    assert cola.pendientes == 0
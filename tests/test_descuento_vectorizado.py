@@ -0,0 +1,86 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.schemas.descuento_auto import ConfigEstadoLogica, EstadoLogica
+from app.services.churn_index import RegistroChurn
+from app.services.descuento_auto.descuento_logic import DescuentosService
+from app.services.descuento_auto.descuento_vectorizado import (
+    armar_columnas,
+    comparar_con_escalar,
+)
+from mock_upstream.catalogo import CatalogoSintetico
+
+
+def catalogo_variado(tamano: int, semilla: int) -> tuple[list, list[dict]]:
+    """Catalogo sintetico con los casos borde de AVAX/ZAP: fechas ISO,
+    ISO con hora, RFC 1123, invalidas o vacias; id_descuento desconocido o
+    ausente; y churn mezclando RegistroChurn con el dict crudo."""
+    rnd = random.Random(semilla)
+    hoy = date.today()
+    catalogo = CatalogoSintetico(productos=tamano, semilla=semilla, fraccion_sin_avax=0)
+    zap, avax = [], []
+    for fila in catalogo.churn:
+        producto = dict(catalogo.avax[fila["sku"]])
+        fecha = hoy - timedelta(days=rnd.randint(-5, 500))
+        producto["ult_actualizacion_descuento_automatico"] = rnd.choice(
+            [
+                fecha.isoformat(),
+                f"{fecha.isoformat()}T10:30:00",
+                fecha.strftime("%a, %d %b %Y 00:00:00 GMT"),
+                "no-es-fecha",
+                "",
+                None,
+            ]
+        )
+        eleccion = rnd.random()
+        if eleccion < 0.05:
+            producto["id_descuento"] = "PROMO_DESCONOCIDA"
+        elif eleccion < 0.08:
+            del producto["id_descuento"]
+        if rnd.random() < 0.05:
+            producto["id_esq_costo"] = "ESQ_DESCONOCIDO"
+        zap.append(RegistroChurn.desde_dict(fila) if rnd.random() < 0.5 else dict(fila))
+        avax.append(producto)
+    return zap, avax
+
+
+@pytest.mark.parametrize("semilla", range(12))
+def test_vectorizado_igual_al_escalar(semilla):
+    rnd = random.Random(semilla)
+    zap, avax = catalogo_variado(500, semilla)
+    config = ConfigEstadoLogica(
+        last_import_age_max=rnd.randint(0, 1200),
+        days_since_last_sale_min=rnd.randint(0, 400),
+        ult_modificacion_descuento=rnd.randint(0, 120),
+    )
+    for estado in EstadoLogica:
+        diferencias = comparar_con_escalar(zap, avax, config, estado)
+        assert diferencias == [], (
+            f"{len(diferencias)} SKUs difieren (estado={estado.value}); "
+            f"primero: {diferencias[:1]}"
+        )
+
+
+def test_columnas_fechas_como_parse_fecha_modificacion():
+    hoy = date(2024, 3, 15)
+    valores = [
+        "2024-03-01",
+        "2024-03-01T10:30:00",
+        "Fri, 01 Mar 2024 00:00:00 GMT",
+        hoy,
+        "no-es-fecha",
+        "",
+        None,
+        ["no", "hashable"],
+    ]
+    avax = [{"ult_actualizacion_descuento_automatico": v} for v in valores]
+    columnas = armar_columnas([{}] * len(avax), avax)
+
+    esperado = [
+        fecha.toordinal() if fecha else -1
+        for fecha in map(DescuentosService.parse_fecha_modificacion, valores)
+    ]
+    assert columnas.ult_actualizacion_ordinal.tolist() == esperado
+    assert columnas.nivel_descuento.tolist() == [0] * len(avax)
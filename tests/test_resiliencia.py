@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import resiliencia
+from app.services.resiliencia import (
+    CircuitBreaker,
+    CircuitoAbierto,
+    PoliticaReintentos,
+    enviar_con_resiliencia,
+)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(resiliencia.time, "monotonic", lambda: ahora[0])
+    return ahora
+
+
+def _abrir(circuito: CircuitBreaker) -> None:
+    for _ in range(circuito.umbral_fallas):
+        circuito.verificar()
+        circuito.registrar_falla()
+
+
+def test_se_abre_tras_el_umbral_de_fallas(reloj):
+    circuito = CircuitBreaker("t", umbral_fallas=3, tiempo_apertura=30)
+    circuito.registrar_falla()
+    circuito.registrar_falla()
+    assert circuito.estado == "cerrado"
+    circuito.registrar_falla()
+    assert circuito.estado == "abierto"
+    assert circuito.aperturas == 1
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+    with pytest.raises(CircuitoAbierto):
+        circuito.rechazar_si_abierto()
+    assert circuito.rechazadas == 2
+
+
+def test_un_exito_corta_la_racha():
+    circuito = CircuitBreaker("t", umbral_fallas=3, tiempo_apertura=30)
+    circuito.registrar_falla()
+    circuito.registrar_falla()
+    circuito.registrar_exito()
+    circuito.registrar_falla()
+    assert circuito.estado == "cerrado"
+    assert circuito.fallas_consecutivas == 1
+
+
+def test_semi_abierto_deja_pasar_una_prueba(reloj):
+    circuito = CircuitBreaker("t", umbral_fallas=2, tiempo_apertura=30)
+    _abrir(circuito)
+    reloj[0] += 31
+    circuito.verificar()
+    assert circuito.estado == "semi_abierto"
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+
+    circuito.registrar_exito()
+    assert circuito.estado == "cerrado"
+    circuito.verificar()
+
+
+def test_prueba_fallida_reabre(reloj):
+    circuito = CircuitBreaker("t", umbral_fallas=2, tiempo_apertura=30)
+    _abrir(circuito)
+    reloj[0] += 31
+    circuito.verificar()
+    circuito.registrar_falla()
+    assert circuito.estado == "abierto"
+    assert circuito.aperturas == 2
+    reloj[0] += 10
+    with pytest.raises(CircuitoAbierto):
+        circuito.verificar()
+
+
+def test_prueba_liberada_permite_otra(reloj):
+    circuito = CircuitBreaker("t", umbral_fallas=2, tiempo_apertura=30)
+    _abrir(circuito)
+    reloj[0] += 31
+    circuito.verificar()
+    circuito.liberar_prueba()
+    circuito.verificar()
+    assert circuito.estado == "semi_abierto"
+
+
+def _enviar_secuencia(codigos: list[int]):
+    pendientes = list(codigos)
+
+    async def enviar(timeout: float) -> httpx.Response:
+        return httpx.Response(pendientes.pop(0))
+
+    return enviar
+
+
+@pytest.mark.parametrize("neutro", [408, 429])
+def test_throttling_no_corta_la_racha(neutro):
+    circuito = CircuitBreaker("t", umbral_fallas=3, tiempo_apertura=30)
+    politica = PoliticaReintentos.sin_reintentos(1)
+
+    async def correr():
+        for codigo in (503, 503, neutro, 503):
+            await enviar_con_resiliencia(_enviar_secuencia([codigo]), circuito, politica)
+
+    asyncio.run(correr())
+    assert circuito.estado == "abierto"
+
+
+def test_error_de_cliente_confirma_que_el_upstream_responde():
+    circuito = CircuitBreaker("t", umbral_fallas=3, tiempo_apertura=30)
+    politica = PoliticaReintentos.sin_reintentos(1)
+
+    async def correr():
+        for codigo in (503, 503, 404, 503):
+            await enviar_con_resiliencia(_enviar_secuencia([codigo]), circuito, politica)
+
+    asyncio.run(correr())
+    assert circuito.estado == "cerrado"
+    assert circuito.fallas_consecutivas == 1
+
+
+def test_reintenta_transitorios_dentro_del_deadline():
+    circuito = CircuitBreaker("t", umbral_fallas=10, tiempo_apertura=30)
+    politica = PoliticaReintentos(intentos=4, timeout=1, deadline=5, backoff_base=0.001)
+    response = asyncio.run(
+        enviar_con_resiliencia(_enviar_secuencia([503, 429, 200]), circuito, politica)
+    )
+    assert response.status_code == 200
+    assert circuito.fallas_consecutivas == 0
+
+
+def test_streaming_no_confirma_exito_con_los_headers():
+    circuito = CircuitBreaker("t", umbral_fallas=3, tiempo_apertura=30)
+    circuito.registrar_falla()
+    asyncio.run(
+        enviar_con_resiliencia(
+            _enviar_secuencia([200]),
+            circuito,
+            PoliticaReintentos.sin_reintentos(1),
+            confirmar_exito=False,
+        )
+    )
+    assert circuito.fallas_consecutivas == 1
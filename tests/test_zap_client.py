@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.zap_client import ZapClient
+
+PRODUCTOS = [
+    {"sku": f"MK{i:07d}", "last_import_age_max": i, "days_since_last_sale_min": i % 90}
+    for i in range(200)
+]
+
+
+def _zap(streaming: bool) -> tuple[ZapClient, list]:
+    llamadas = []
+
+    async def responder(request: httpx.Request) -> httpx.Response:
+        llamadas.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=json.dumps({"aging_products": PRODUCTOS}).encode())
+
+    zap = ZapClient()
+    zap.settings = zap.settings.model_copy(update={"ZAP_CHURN_STREAMING": streaming})
+    zap._client = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+    return zap, llamadas
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_llamadas_concurrentes_comparten_la_descarga(streaming):
+    zap, llamadas = _zap(streaming)
+
+    async def correr():
+        indices = await asyncio.gather(*(zap.get_churn_index() for _ in range(5)))
+        await zap.cerrar()
+        return indices
+
+    indices = asyncio.run(correr())
+    assert len(llamadas) == 1
+    assert all(indice is indices[0] for indice in indices)
+    assert len(indices[0].productos) == len(PRODUCTOS)
+
+
+def test_cache_evita_la_segunda_descarga():
+    zap, llamadas = _zap(streaming=True)
+
+    async def correr():
+        await zap.get_churn_index()
+        await zap.get_churn_index()
+        await zap.get_churn_index(usar_cache=False)
+        await zap.cerrar()
+
+    asyncio.run(correr())
+    assert len(llamadas) == 2
+
+
+def test_get_churn_index_espera_la_descarga_en_streaming():
+    zap, llamadas = _zap(streaming=True)
+
+    async def correr():
+        iterados = []
+
+        async def iterar():
+            async for producto in zap.iterar_churn():
+                iterados.append(producto.sku)
+
+        tarea = asyncio.ensure_future(iterar())
+        await asyncio.sleep(0.01)
+        indice = await zap.get_churn_index()
+        await tarea
+        await zap.cerrar()
+        return iterados, indice
+
+    iterados, indice = asyncio.run(correr())
+    assert len(llamadas) == 1
+    assert iterados == [p["sku"] for p in PRODUCTOS]
+    assert len(indice.productos) == len(PRODUCTOS)
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from app.services.zap_stream import ParserAgingProducts
+
+CUERPO = json.dumps(
+    {
+        "meta": {"filtros": ["a", {"b": [1, 2]}], "nota": 'llaves {} y "comillas" \\ ]'},
+        "aging_products": [
+            {
+                "sku": "MK0000001",
+                "cod_prod": "MK0000001",
+                "last_import_age_max": 2.5,
+                "days_since_last_sale_min": None,
+                "nombre": "Ñandú \"especial\" [x] {y}",
+                "extra": {"anidado": [1, {"z": -1e3}], "ok": True},
+            },
+            {"sku": "MK0000002", "last_import_age_max": 700, "days_since_last_sale_min": 0},
+            {"sku": "MK0000003", "cod_prod": "OTRO", "days_since_last_sale_min": 12345678},
+        ],
+        "total": 3,
+        "final": "áé",
+    },
+    ensure_ascii=False,
+).encode()
+
+
+def _esperado() -> list[tuple]:
+    return [
+        (p.get("sku"), p.get("cod_prod"), p.get("last_import_age_max"), p.get("days_since_last_sale_min"))
+        for p in json.loads(CUERPO)["aging_products"]
+    ]
+
+
+def _parsear(chunks: list[bytes]) -> list[tuple]:
+    parser = ParserAgingProducts()
+    productos = []
+    for chunk in chunks:
+        productos.extend(parser.alimentar(chunk))
+    productos.extend(parser.terminar())
+    assert parser.encontrada
+    return [
+        (p.sku, p.cod_prod, p.last_import_age_max, p.days_since_last_sale_min)
+        for p in productos
+    ]
+
+
+def test_un_solo_chunk():
+    assert _parsear([CUERPO]) == _esperado()
+
+
+def test_corte_en_cada_posicion():
+    # Incluye cortes dentro de strings, escapes, numeros y caracteres UTF-8.
+    esperado = _esperado()
+    for corte in range(1, len(CUERPO)):
+        assert _parsear([CUERPO[:corte], CUERPO[corte:]]) == esperado, corte
+
+
+@pytest.mark.parametrize("tamano", [1, 2, 3, 7, 64])
+def test_chunks_chicos(tamano):
+    chunks = [CUERPO[i : i + tamano] for i in range(0, len(CUERPO), tamano)]
+    assert _parsear(chunks) == _esperado()
+
+
+def test_entrega_cada_producto_apenas_esta_completo():
+    parser = ParserAgingProducts()
+    fin_primero = CUERPO.index(b'"sku": "MK0000002"')
+    assert [p.sku for p in parser.alimentar(CUERPO[:fin_primero])] == ["MK0000001"]
+
+
+def test_cuerpo_incompleto():
+    parser = ParserAgingProducts()
+    parser.alimentar(CUERPO[:-10])
+    with pytest.raises(ValueError):
+        parser.terminar()
+
+
+def test_json_invalido():
+    parser = ParserAgingProducts()
+    with pytest.raises(ValueError):
+        parser.alimentar(b'{"aging_products": [{"sku": nope}]}')
+        parser.terminar()